@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Group, Follow, Post
 
 
@@ -12,6 +13,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # ищем по обратному индексу вместо LIKE по всей таблице
+        if not search_term:
+            return queryset, False
+        found = search.ranked(search_term).values("post")
+        return queryset.filter(pk__in=found), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("title", "slug", "description")
@@ -0,0 +1,375 @@
+"""Нагрузочный прогон всех адресов posts/urls.py.
+
+Каждый сценарий - запрос к одному представлению от имени анонимного или
+вошедшего пользователя. Запросы идут через тестовый клиент Django, то
+есть через всю цепочку middleware, но без сети. Для каждого сценария
+считаются перцентили времени ответа, число SQL-запросов и размер ответа,
+а для всего прогона - пропускная способность, в том числе при
+параллельных запросах из нескольких потоков. Результат сохраняется в
+JSON и сравнивается с сохранённым эталоном.
+"""
+import tempfile
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connections
+from django.template import Context, Engine, engines
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image
+
+from . import cards, images, thumbnails, writebehind
+from .fragments import CARD_TEMPLATE
+from .models import Comment, Group, Post, TimelineEntry, User
+from .pagination import encode_cursor
+
+PERCENTILES = (50, 95, 99)
+
+Scenario = namedtuple("Scenario", "name url method data user",
+                      defaults=("get", None, None))
+
+
+def scenarios():
+    """Сценарии для каждого адреса posts/urls.py на текущих данных."""
+    # читатель, у которого есть лента подписок
+    reader = User.objects.get(pk=TimelineEntry.objects.values_list(
+        "user", flat=True).first())
+    post = Post.objects.exclude(author=reader).select_related(
+        "author").first()
+    author = post.author
+    group = Group.objects.filter(posts__isnull=False).first()
+    older = Post.objects.all()[settings.POST_PER_PAGE - 1]
+    post_url = reverse("post", args=[author.username, post.pk])
+    word = post.text.split()[-1]
+    return [
+        Scenario("index", reverse("index")),
+        Scenario("index page 2", reverse("index") + "?page=2"),
+        Scenario("index cursor", reverse("index") + "?cursor="
+                 + encode_cursor(older)),
+        Scenario("index logged in", reverse("index"), user=reader),
+        Scenario("group_posts", reverse("group_posts", args=[group.slug])),
+        Scenario("search", reverse("search") + "?q=" + word),
+        Scenario("trending", reverse("trending")),
+        Scenario("new_post", reverse("new_post"), user=author),
+        Scenario("follow_index", reverse("follow_index"), user=reader),
+        Scenario("profile", reverse("profile", args=[author.username])),
+        Scenario("post", post_url),
+        Scenario("post_comments", reverse(
+            "post_comments", args=[author.username, post.pk])),
+        Scenario("post_edit", reverse(
+            "post_edit", args=[author.username, post.pk]), user=author),
+        Scenario("add_comment", reverse(
+            "add_comment", args=[author.username, post.pk]), method="post",
+            data={"text": "Комментарий из нагрузочного прогона"},
+            user=reader),
+        # подписка и отписка чередуются, поэтому обе меняют данные
+        Scenario("profile_follow", reverse(
+            "profile_follow", args=[author.username]), user=reader),
+        Scenario("profile_unfollow", reverse(
+            "profile_unfollow", args=[author.username]), user=reader),
+    ]
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[rank - 1]
+
+
+@contextmanager
+def count_queries():
+    """Список SQL-запросов ко всем базам, в том числе к соединению только
+    для чтения, выполненных внутри блока."""
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield queries
+
+
+def _clients(plan):
+    clients = {}
+    for scenario in plan:
+        if scenario.user not in clients:
+            client = Client(HTTP_HOST="localhost")
+            if scenario.user is not None:
+                client.force_login(scenario.user)
+            clients[scenario.user] = client
+    return clients
+
+
+def _rounds(plan, clients, rounds, warmup=0):
+    """Гоняет сценарии по кругу; возвращает замеры по именам."""
+    samples = {scenario.name: [] for scenario in plan}
+    for round_number in range(warmup + rounds):
+        # сценарии идут по кругу, чтобы кэш не прогревался одним адресом
+        for scenario in plan:
+            client = clients[scenario.user]
+            with count_queries() as queries:
+                started = time.perf_counter()
+                try:
+                    response = getattr(client, scenario.method)(
+                        scenario.url, scenario.data)
+                    size, status = len(response.content), response.status_code
+                except DatabaseError:
+                    # например, блокировка SQLite при параллельной записи:
+                    # сервер ответил бы 500
+                    size, status = 0, 500
+                elapsed = time.perf_counter() - started
+            if round_number >= warmup:
+                samples[scenario.name].append(
+                    (elapsed, len(queries), size, status))
+    return samples
+
+
+def _worker(plan, clients, rounds):
+    try:
+        return _rounds(plan, clients, rounds)
+    finally:
+        # у каждого потока своё соединение с базой
+        connections.close_all()
+
+
+def run(requests=50, warmup=1, concurrency=1):
+    """Выполняет ``requests`` запросов на каждый сценарий и возвращает
+    сводку по сценариям и общую пропускную способность.
+
+    При ``concurrency`` > 1 запросы идут из стольких потоков сразу, как
+    у WSGI-сервера с пулом потоков; потоки открывают свои соединения,
+    поэтому данные должны быть сохранены в базе, а не в транзакции.
+    """
+    plan = scenarios()
+    # у каждого потока свои клиенты; вход выполняется заранее, чтобы
+    # запись сессий не попала в замеры
+    clients = [_clients(plan) for _ in range(concurrency)]
+    if warmup:
+        # прогрев кэшей не входит в замеры и в пропускную способность
+        _rounds(plan, clients[0], 0, warmup)
+    started = time.perf_counter()
+    if concurrency == 1:
+        parts = [_rounds(plan, clients[0], requests)]
+    else:
+        # запросы делятся между потоками поровну
+        shares = [requests // concurrency + (index < requests % concurrency)
+                  for index in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            parts = list(executor.map(
+                lambda args: _worker(plan, *args), zip(clients, shares)))
+    elapsed = time.perf_counter() - started
+    samples = {scenario.name: [] for scenario in plan}
+    for part in parts:
+        for name, rows in part.items():
+            samples[name].extend(rows)
+    total = sum(len(rows) for rows in samples.values())
+    views = {name: summary(rows) for name, rows in samples.items() if rows}
+    return views, round(total / elapsed, 1)
+
+
+def summary(rows):
+    timings = [row[0] * 1000 for row in rows]
+    result = {f"p{percent}_ms": round(percentile(timings, percent), 3)
+              for percent in PERCENTILES}
+    result.update({
+        "requests": len(rows),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "queries": max(row[1] for row in rows),
+        "bytes": max(row[2] for row in rows),
+        "status": sorted({row[3] for row in rows}),
+        "errors": sum(row[3] >= 500 for row in rows),
+    })
+    return result
+
+
+def photo(size, seed=0):
+    """JPEG, похожий на снимок с камеры: шум на градиенте, высокое
+    качество и EXIF."""
+    width, height = size
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 30 + seed)
+    image = Image.merge("RGB", (gradient, noise,
+                                gradient.transpose(Image.ROTATE_180)))
+    exif = Image.Exif()
+    exif[0x010F] = "Benchmark camera"  # Make
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def image_pipeline(count=3, size=(4000, 3000)):
+    """Сравнивает исходные снимки с обработанными posts.images: размер
+    файла, который отдаётся посетителям, и время нарезки миниатюр."""
+    rows = {"original": [], "processed": []}
+    with tempfile.TemporaryDirectory() as media, \
+            override_settings(MEDIA_ROOT=media):
+        for index in range(count):
+            data = photo(size, index)
+            processed, _, _ = images.process(
+                SimpleUploadedFile("photo.jpg", data))
+            # уникальные имена: sorl помнит уже нарезанные файлы
+            prefix = f"benchmark/{uuid.uuid4().hex}"
+            names = {
+                "original": default_storage.save(
+                    f"{prefix}.jpg", ContentFile(data)),
+                "processed": default_storage.save(
+                    f"{prefix}-{processed.name}", processed),
+            }
+            for kind, name in names.items():
+                started = time.perf_counter()
+                thumbnails.generate(name)
+                elapsed = time.perf_counter() - started
+                rows[kind].append((default_storage.size(name), elapsed))
+    return {kind: {
+        "bytes": round(sum(row[0] for row in found) / len(found)),
+        "thumbnail_ms": round(
+            sum(row[1] for row in found) / len(found) * 1000, 1),
+    } for kind, found in rows.items()}
+
+
+def _template_page(engine, posts, user):
+    # шаблон запрашивается на каждую страницу, как в fragments.render_cards
+    template = engine.get_template(CARD_TEMPLATE)
+    context = Context({"user": user})
+    parts = []
+    for post in posts:
+        with context.push(post=post):
+            parts.append(template.render(context))
+    return "".join(parts)
+
+
+def card_rendering(pages=50, user=None):
+    """Среднее время отрисовки страницы карточек без кэша фрагментов.
+
+    Сравниваются шаблон post_item.html, который на каждой странице
+    ищется по каталогам и компилируется заново (как без cached.Loader),
+    тот же шаблон из cached.Loader и ``cards.render_card``.
+    """
+    posts = list(Post.objects.for_feed()[:settings.POST_PER_PAGE])
+    # каталоги и библиотеки тегов - как у настроенного движка
+    base = engines["django"].engine
+    options = {"dirs": base.dirs, "libraries": base.libraries}
+    loaders = ["django.template.loaders.filesystem.Loader",
+               "django.template.loaders.app_directories.Loader"]
+    uncached = Engine(loaders=loaders, **options)
+    cached = Engine(loaders=[
+        ("django.template.loaders.cached.Loader", loaders)], **options)
+    renderers = {
+        "template": lambda: _template_page(uncached, posts, user),
+        "cached template": lambda: _template_page(cached, posts, user),
+        "python": lambda: "".join(
+            cards.render_card(post, user) for post in posts),
+    }
+    results = {}
+    for name, render in renderers.items():
+        # первая страница прогревает кэш шаблонов и адреса миниатюр
+        render()
+        started = time.perf_counter()
+        for _ in range(pages):
+            render()
+        elapsed = time.perf_counter() - started
+        results[name] = {"page_ms": round(elapsed / pages * 1000, 3),
+                         "bytes": len(render().encode())}
+    return results
+
+
+def _burst(url, client, count):
+    timings = []
+    try:
+        for index in range(count):
+            started = time.perf_counter()
+            try:
+                status = client.post(
+                    url, {"text": f"Комментарий {index}"}).status_code
+            except DatabaseError:
+                status = 500
+            timings.append((time.perf_counter() - started, status))
+    finally:
+        connections.close_all()
+    return timings
+
+
+def comment_burst(requests=200, concurrency=8):
+    """Всплеск комментариев к одному посту из ``concurrency`` потоков:
+    запись в базу из запроса против отложенной записи posts.writebehind.
+
+    Для отложенной записи считается и время, за которое фоновый поток
+    сохранил все комментарии после последнего ответа. Данные должны быть
+    сохранены в базе, как для ``run`` с несколькими потоками.
+    """
+    post = Post.objects.select_related("author").first()
+    url = reverse("add_comment", args=[post.author.username, post.pk])
+    clients = []
+    for user in User.objects.exclude(pk=post.author_id)[:concurrency]:
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(user)
+        clients.append(client)
+    shares = [requests // concurrency + (index < requests % concurrency)
+              for index in range(concurrency)]
+    results = {}
+    for name, enabled in (("direct", False), ("write-behind", True)):
+        before = Comment.objects.filter(post=post).count()
+        with tempfile.TemporaryDirectory() as journal, override_settings(
+                WRITE_BEHIND=enabled, WRITE_BEHIND_DIR=journal):
+            if enabled:
+                writebehind.start()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                parts = list(executor.map(
+                    lambda args: _burst(url, *args), zip(clients, shares)))
+            elapsed = time.perf_counter() - started
+            if enabled:
+                writebehind.stop()
+            drained = time.perf_counter() - started
+        timings = [row for part in parts for row in part]
+        results[name] = {
+            "per_second": round(len(timings) / elapsed, 1),
+            "p95_ms": round(percentile(
+                [row[0] * 1000 for row in timings], 95), 3),
+            "errors": sum(row[1] >= 500 for row in timings),
+            "saved": Comment.objects.filter(post=post).count() - before,
+            "saved_after_s": round(drained, 3),
+        }
+    return results
+
+
+def throughput_regression(current, baseline, tolerance=0.2):
+    """Замечание о падении пропускной способности или None."""
+    if baseline and current < baseline * (1 - tolerance):
+        return f"пропускная способность {current} против {baseline} запр/с"
+    return None
+
+
+def regressions(results, baseline, tolerance=0.2):
+    """Сравнивает результаты с эталоном и возвращает список замечаний:
+    p95 хуже более чем на ``tolerance``, запросов к БД стало больше или
+    сценарий начал отвечать с другим кодом."""
+    found = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            found.append(f"{name}: сценарий пропал")
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {current['p95_ms']} мс "
+                         f"против {base['p95_ms']} мс")
+        if current["queries"] > base["queries"]:
+            found.append(f"{name}: {current['queries']} SQL-запросов "
+                         f"против {base['queries']}")
+        if current["status"] != base["status"]:
+            found.append(f"{name}: коды ответа {current['status']} "
+                         f"против {base['status']}")
+    return found
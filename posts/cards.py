@@ -0,0 +1,81 @@
+"""Карточка поста без шаблонизатора.
+
+``render_card`` строит ту же разметку, что и ``post_item.html``, обычным
+кодом на Python: без поиска шаблона, разбора контекста, вложенного
+шаблона картинки и загрузки библиотек тегов на каждую карточку. Ленты
+показывают по ``settings.POST_PER_PAGE`` карточек на странице, и при
+``settings.POST_CARD_RENDERER = "python"`` они рисуются этой функцией.
+Шаблон остаётся для страницы поста и как образец разметки: тест
+сравнивает результат обоих способов, поэтому менять их нужно вместе.
+"""
+from django.template.defaultfilters import linebreaksbr
+from django.urls import reverse
+from django.utils.formats import localize
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from django.utils.timezone import template_localtime
+
+from . import thumbnails
+
+CARD = (
+    '<div class="card mb-3 mt-1 shadow-sm">{image}'
+    '<div class="card-body"><p class="card-text">'
+    '<a name="post_{id}" href="{profile_url}">'
+    '<strong class="d-block text-gray-dark">@{author}</strong></a>'
+    '{text}</p>{group}'
+    '<div class="d-flex justify-content-between align-items-center">'
+    '<div class="btn-group">{comments}'
+    '<a class="btn btn-sm btn-primary" href="{post_url}" role="button">'
+    'Добавить комментарий</a>{edit}</div>'
+    '<small class="text-muted">{pub_date}</small></div></div></div>'
+)
+GROUP = ('<a class="card-link muted" href="{}">'
+         '<strong class="d-block text-gray-dark">#{}</strong></a>')
+COMMENTS = "<div>Комментариев: {}</div>"
+EDIT = ('<a class="btn btn-sm btn-info" href="{}" role="button">'
+        'Редактировать</a>')
+
+
+def render_image(post, alias="card"):
+    """Тег ``<img>`` как в ``post_image.html`` или пустая строка."""
+    attrs = thumbnails.image_attrs(post, alias)
+    if not attrs.get("src"):
+        return ""
+    html = format_html('<img class="card-img" style="height: auto" '
+                       'src="{}"', attrs["src"])
+    if attrs.get("srcset"):
+        html += format_html(' srcset="{}" sizes="{}"',
+                            attrs["srcset"], attrs["sizes"])
+    if attrs.get("width"):
+        html += format_html(' width="{}" height="{}"',
+                            attrs["width"], attrs["height"])
+    return html + mark_safe(" />")
+
+
+def render_card(post, user=None):
+    """Разметка карточки поста для пользователя ``user``."""
+    author = post.author
+    group = post.group
+    username = author.username
+    group_html = edit_html = comments_html = ""
+    if group is not None:
+        group_html = format_html(
+            GROUP, reverse("group_posts", args=[group.slug]), group.title)
+    if post.comment_count:
+        comments_html = format_html(COMMENTS, post.comment_count)
+    if user == author:
+        edit_html = format_html(
+            EDIT, reverse("post_edit", args=[username, post.pk]))
+    return format_html(
+        CARD,
+        image=render_image(post),
+        id=post.pk,
+        profile_url=reverse("profile", args=[username]),
+        author=author,
+        text=linebreaksbr(post.text, autoescape=True),
+        group=group_html,
+        comments=comments_html,
+        post_url=reverse("post", args=[username, post.pk]),
+        edit=edit_html,
+        pub_date=localize(template_localtime(post.pub_date)),
+    )
@@ -0,0 +1,162 @@
+"""Условные GET-запросы и кэш страниц для лент и страниц поста.
+
+Валидаторы строятся из поколений posts.fragments, которые сигналы
+увеличивают при каждом изменении, и времени последнего такого изменения.
+Id объектов по адресу страницы тоже берутся из кэша, поэтому повторный
+визит получает ``304 Not Modified`` без SQL-запросов и отрисовки
+шаблонов. Ответы анонимам помечаются ``Cache-Control:
+public``, чтобы их мог хранить обратный прокси, перепроверяя по ETag.
+
+Сами анонимные ответы тоже кэшируются целиком по пути, номеру страницы
+и курсору. Запись помечена теми же поколениями, поэтому изменение
+сбрасывает только страницы, которые от него зависят: ленту, профиль
+автора, сообщество и страницу поста. Вошедшие пользователи и запросы с
+CSRF-cookie кэш страниц не используют.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from yatube.cache import get_or_compute
+from yatube.sqlite import replica
+
+from . import fragments
+
+
+def known_id(key):
+    """Id объекта по адресу страницы, если представление его запомнило.
+
+    Пока id неизвестен, страница отдаётся без валидаторов: лишнего
+    запроса к базе ради них не делается.
+    """
+    return cache.get(key)
+
+
+def remember_id(key, pk):
+    # связь slug/имя -> id неизменна; при удалении ключ удаляют сигналы
+    cache.set(key, pk, None)
+
+
+def slug_key(slug):
+    return f"group-id:{slug}"
+
+
+def username_key(username):
+    return f"user-id:{username}"
+
+
+class _Uncacheable(Exception):
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+def _state(request, names_for, viewer_names, kwargs):
+    """Поколения, ETag и Last-Modified страницы, один раз на запрос."""
+    if not hasattr(request, "_validators"):
+        names = names_for(**kwargs)
+        request._validators = (None, None, None)
+        if names is not None:
+            user = request.user
+            names = [*names, fragments.ALL_FEEDS]
+            if viewer_names is not None and user.is_authenticated:
+                names.extend(viewer_names(user, **kwargs))
+            versions = tuple(sorted(fragments.generations(names).items()))
+            # страница зависит и от того, кто её смотрит, и от
+            # CSRF-токена в её формах: после входа он новый, и старая
+            # копия страницы не должна отдаваться через 304
+            parts = (versions, user.pk, request.get_full_path(),
+                     request.META.get("CSRF_COOKIE"))
+            etag = hashlib.md5(repr(parts).encode()).hexdigest()
+            modified = None
+            if not user.is_authenticated:
+                # у вошедшего пользователя время не учитывает вход и
+                # выход, поэтому для него остаётся только ETag
+                modified = fragments.last_changed(names)
+            request._validators = (versions, etag, modified)
+    return request._validators
+
+
+def _anonymous_read(request):
+    return (request.method in ("GET", "HEAD")
+            and not request.user.is_authenticated
+            and settings.CSRF_COOKIE_NAME not in request.COOKIES)
+
+
+def page_key(request):
+    """Ключ страницы в кэше: путь, номер страницы и курсор."""
+    parts = (request.path, request.GET.get("page"),
+             request.GET.get("cursor"))
+    return "page:" + hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def _cacheable(response):
+    if response.status_code != 200 or response.cookies:
+        raise _Uncacheable(response)
+    return response
+
+
+def _cached_page(request, versions, render):
+    try:
+        # запись другой версии - страница, которую уже изменили
+        return get_or_compute(
+            page_key(request), lambda: _cacheable(render()),
+            version=versions,
+            timeout=replica.cache_timeout(settings.PAGE_CACHE_TIMEOUT))
+    except _Uncacheable as error:
+        return error.response
+
+
+def _cache_headers(request, response):
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=0,
+                            must_revalidate=True)
+    patch_vary_headers(response, ("Cookie",))
+
+
+def conditional(names_for, viewer_names=None):
+    """Декоратор представления с условным GET и кэшем страниц анонимов.
+
+    ``names_for`` получает именованные аргументы представления и
+    возвращает поколения, от которых зависит страница, или None, если
+    объекта нет (тогда представление само ответит 404).
+    ``viewer_names`` получает вошедшего пользователя и те же аргументы и
+    возвращает поколения частей страницы, которые видит только он:
+    кэш страниц анонимов и ETag остальных от них не зависят.
+    """
+    def etag(request, *args, **kwargs):
+        return _state(request, names_for, viewer_names, kwargs)[1]
+
+    def last_modified(request, *args, **kwargs):
+        modified = _state(request, names_for, viewer_names, kwargs)[2]
+        if modified is not None:
+            return datetime.fromtimestamp(modified, timezone.utc)
+        return None
+
+    def decorator(view):
+        @wraps(view)
+        def cached_view(request, *args, **kwargs):
+            versions = _state(request, names_for, viewer_names, kwargs)[0]
+            if versions is None or not _anonymous_read(request):
+                return view(request, *args, **kwargs)
+            return _cached_page(request, versions,
+                                lambda: view(request, *args, **kwargs))
+
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified)(cached_view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            _cache_headers(request, response)
+            return response
+        return wrapper
+    return decorator
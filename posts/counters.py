@@ -0,0 +1,92 @@
+"""Хранимые счётчики постов, комментариев и подписок.
+
+Счётчики меняются F()-выражениями в обработчиках сигналов, поэтому
+страницы профиля и поста не выполняют COUNT-запросов. Если счётчики
+разошлись с данными, их пересчитывает команда ``rebuild_counters``.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def count_of(queryset, field, outer="pk"):
+    """Подзапрос с числом строк queryset, у которых field = outer."""
+    counts = queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+        field).annotate(total=Count("pk")).values("total")
+    return Coalesce(Subquery(counts), 0)
+
+
+def user_counts(outer="pk"):
+    return {
+        "posts_count": count_of(Post.objects.all(), "author", outer),
+        "followers_count": count_of(Follow.objects.all(), "author", outer),
+        "following_count": count_of(Follow.objects.all(), "user", outer),
+    }
+
+
+def bump_user(user_id, **deltas):
+    UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F("comment_count") + delta)
+
+
+def stats_for(user):
+    """Возвращает счётчики пользователя, при необходимости создавая их."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        counts = User.objects.filter(pk=user.pk).values(
+            **user_counts()).get()
+        stats, _ = UserStats.objects.get_or_create(user=user,
+                                                   defaults=counts)
+        return stats
+
+
+def recount(user_ids=(), post_ids=()):
+    """Пересчитывает счётчики только указанных пользователей и постов,
+    создавая недостающие строки ``UserStats``."""
+    user_ids = list(user_ids)
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id) for user_id in user_ids),
+        ignore_conflicts=True)
+    UserStats.objects.filter(user_id__in=user_ids).update(
+        **user_counts("user_id"))
+    Post.objects.filter(pk__in=list(post_ids)).update(
+        comment_count=count_of(Comment.objects.all(), "post"))
+
+
+def rebuild(dry_run=False):
+    """Сверяет счётчики с данными и исправляет расхождения.
+
+    Возвращает словарь с числом исправленных (или найденных при
+    ``dry_run``) строк для каждой таблицы.
+    """
+    missing = User.objects.filter(stats__isnull=True)
+    drift = {"missing_stats": missing.count()}
+    if not dry_run:
+        UserStats.objects.bulk_create(
+            UserStats(user_id=user_id)
+            for user_id in missing.values_list("pk", flat=True).iterator())
+
+    stale_stats = UserStats.objects.annotate(
+        **{f"actual_{field}": value
+           for field, value in user_counts("user_id").items()}
+    ).exclude(
+        posts_count=F("actual_posts_count"),
+        followers_count=F("actual_followers_count"),
+        following_count=F("actual_following_count"))
+    stale_posts = Post.objects.annotate(
+        actual=count_of(Comment.objects.all(), "post")).exclude(
+        comment_count=F("actual"))
+    drift["user_stats"] = stale_stats.count()
+    drift["posts"] = stale_posts.count()
+    if not dry_run:
+        UserStats.objects.update(**user_counts("user_id"))
+        Post.objects.filter(pk__in=stale_posts.values("pk")).update(
+            comment_count=count_of(Comment.objects.all(), "post"))
+    return drift
@@ -1,5 +1,8 @@
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.forms.models import ModelForm
 from django.forms import Textarea
+from . import images
 from .models import Comment, Post
 
 
@@ -8,6 +11,37 @@ class PostForm(ModelForm):
         model = Post
         fields = ["group", "text", "image"]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_error = None
+        name = self.add_prefix("image")
+        upload = self.files.get(name)
+        if isinstance(upload, UploadedFile):
+            try:
+                images.check_size(upload)
+            except ValidationError as error:
+                # ImageField открыл бы большой файл в Pillow, поэтому
+                # поле его не получает, а ошибка добавляется в clean
+                self.upload_error = error
+                self.files = self.files.copy()
+                del self.files[name]
+
+    def clean(self):
+        if self.upload_error is not None:
+            self.add_error("image", self.upload_error)
+        return super().clean()
+
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        if isinstance(image, UploadedFile):
+            # новая картинка: уменьшаем и пересохраняем
+            image, width, height = images.process(image)
+            self.instance.image_width = width
+            self.instance.image_height = height
+        elif not image:
+            self.instance.image_width = self.instance.image_height = None
+        return image
+
 
 class CommentForm(ModelForm):
     class Meta:
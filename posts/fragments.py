@@ -0,0 +1,162 @@
+"""Кэш отрисованных карточек постов и страниц лент.
+
+Ключ карточки строится из версии поста и того, что карточка показывает
+кроме самого поста (автор, группа, кнопка редактирования), поэтому одна и
+та же карточка переиспользуется на главной, в группе, профиле и ленте
+подписок. Версии и поколения лент хранятся в кэше и увеличиваются
+сигналами моделей, так что устаревшая запись просто перестаёт
+запрашиваться, а не живёт до конца TTL.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from yatube.cache import get_or_compute
+from yatube.sqlite import replica
+
+from . import cards
+
+CARD_TEMPLATE = "post_item.html"
+# общее поколение: меняется, когда устаревают сразу все ленты
+ALL_FEEDS = "feeds"
+# поколение ленты популярного, меняется при каждой пересборке рейтинга
+TRENDING = "trending"
+# поколение рекомендаций, меняется после каждого пакетного расчёта
+SUGGESTIONS = "suggestions"
+
+
+def _gen_key(name):
+    return f"gen:{name}"
+
+
+def _changed_key(name):
+    return f"changed:{name}"
+
+
+def _now():
+    # заголовок Last-Modified точен до секунды: округляем вверх, чтобы
+    # изменение в ту же секунду, что и прошлый ответ, не дало 304
+    return math.ceil(time.time())
+
+
+def bump(*names):
+    """Увеличивает поколения, делая недействительными зависящие ключи."""
+    for name in names:
+        try:
+            cache.incr(_gen_key(name))
+        except ValueError:
+            # отсутствующее поколение начинается с нового значения
+            cache.add(_gen_key(name), time.time_ns(), None)
+    cache.set_many({_changed_key(name): _now() for name in names}, None)
+
+
+def generations(names):
+    """Возвращает текущие поколения для списка имён одним запросом."""
+    keys = {_gen_key(name): name for name in names}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        # после вытеснения счётчик нельзя начинать с нуля, иначе снова
+        # совпадут ключи уже устаревших записей
+        cache.add(key, time.time_ns(), None)
+        found[key] = cache.get(key)
+    return {keys[key]: value for key, value in found.items()}
+
+
+def last_changed(names):
+    """Время (timestamp) последнего изменения среди поколений ``names``.
+
+    Если отметка вытеснена из кэша, изменением считается текущий момент.
+    """
+    keys = [_changed_key(name) for name in names]
+    found = cache.get_many(keys)
+    for key in set(keys) - found.keys():
+        cache.add(key, _now(), None)
+        found[key] = cache.get(key) or _now()
+    return max(found.values())
+
+
+def post_name(post_id):
+    return f"post:{post_id}"
+
+
+def user_name(user_id):
+    """Поколение шапки профиля: счётчики и кнопка подписки."""
+    return f"user:{user_id}"
+
+
+def feeds_of(author_id, group_id):
+    """Ленты, на страницах которых показывается пост."""
+    feeds = ["index", f"profile:{author_id}"]
+    if group_id is not None:
+        feeds.append(f"group:{group_id}")
+    return feeds
+
+
+def card_key(post, version, is_author):
+    group = post.group
+    parts = (post.pk, version, post.author.username,
+             group and (group.slug, group.title), is_author,
+             settings.POST_CARD_RENDERER)
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f"post_card:{digest}"
+
+
+def card_renderer(context):
+    """Функция, рисующая карточку поста, по
+    ``settings.POST_CARD_RENDERER``: шаблон или ``cards.render_card``."""
+    if settings.POST_CARD_RENDERER == "python":
+        user = context.get("user")
+        return lambda post: cards.render_card(post, user)
+    template = context.template.engine.get_template(CARD_TEMPLATE)
+
+    def render(post):
+        with context.push(post=post):
+            return template.render(context)
+    return render
+
+
+def render_cards(context, posts):
+    """Отрисовывает карточки постов, беря готовые из кэша."""
+    posts = list(posts)
+    user = context.get("user")
+    versions = generations(post_name(post.pk) for post in posts)
+    keys = [card_key(post, versions[post_name(post.pk)],
+                     user == post.author)
+            for post in posts]
+    cached = cache.get_many(keys)
+    render = card_renderer(context)
+    rendered, missing = [], {}
+    for post, key in zip(posts, keys):
+        if key not in cached:
+            missing[key] = render(post)
+        rendered.append(cached.get(key) or missing[key])
+    if missing:
+        cache.set_many(missing, replica.cache_timeout(
+            settings.POST_CARD_CACHE_TIMEOUT))
+    return rendered
+
+
+def render_feed_page(context, page, feed, separator=""):
+    """Отрисовывает карточки страницы ленты.
+
+    Для анонимных посетителей вся страница ленты кэшируется целиком и
+    помечается поколением ленты: ни запроса за постами, ни отрисовки
+    карточек. После смены поколения страницу пересобирает один процесс,
+    остальные до конца пересборки отдают предыдущую версию.
+    """
+    user = context.get("user")
+    if feed is None or (user is not None and user.is_authenticated):
+        return mark_safe(separator.join(render_cards(context, page)))
+    versions = generations([feed, ALL_FEEDS])
+    # repr страницы содержит пробелы и курсор, недопустимые для memcached
+    digest = hashlib.md5(f"{feed}:{page!r}".encode()).hexdigest()
+    html = get_or_compute(
+        f"feed_page:{digest}",
+        lambda: separator.join(render_cards(context, page)),
+        version=(versions[feed], versions[ALL_FEEDS]),
+        timeout=replica.cache_timeout(settings.POST_CARD_CACHE_TIMEOUT))
+    return mark_safe(html)
@@ -0,0 +1,151 @@
+"""Граф подписок в кэше.
+
+Для каждого пользователя в кэше лежат два списка id: на кого он подписан
+и кто подписан на него. Список хранится как отсортированный
+``array("I")`` в байтах - 4 байта на связь, и проверка «подписан ли»
+идёт двоичным поиском по нему, без запроса к ``Follow``. Отсутствующий
+в кэше список читается из базы одним запросом.
+
+Подписка и отписка не правят закэшированные списки, а удаляют их
+(сигналы вызывают ``added`` и ``removed``): правка «прочитать -
+изменить - записать» теряла бы связи при одновременных подписках на
+одного автора, а сделанная до фиксации - оставляла бы связь после
+отката. Списки удаляются сразу и ещё раз после фиксации транзакции,
+потому что параллельный запрос - или чтение в той же транзакции - мог
+успеть положить в кэш состояние до неё. Срок
+``settings.FOLLOW_GRAPH_TIMEOUT`` - страховка.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from yatube.sqlite import replica
+
+from .models import Follow
+
+# на кого подписан пользователь и кто подписан на него
+FOLLOWING = "following"
+FOLLOWERS = "followers"
+# поле Follow с id владельца списка и поле с id в самом списке
+COLUMNS = {FOLLOWING: ("user_id", "author_id"),
+           FOLLOWERS: ("author_id", "user_id")}
+# сколько id подставляется в один запрос IN (в SQLite не больше 999)
+CHUNK = 500
+
+
+def _key(kind, user_id):
+    return f"graph:{kind}:{user_id}"
+
+
+def _pack(ids):
+    return array("I", sorted(ids)).tobytes()
+
+
+def _unpack(raw):
+    ids = array("I")
+    ids.frombytes(raw)
+    return ids
+
+
+def _from_db(kind, user_ids):
+    owner, other = COLUMNS[kind]
+    adjacency = {user_id: [] for user_id in user_ids}
+    for start in range(0, len(user_ids), CHUNK):
+        rows = Follow.objects.filter(
+            **{f"{owner}__in": user_ids[start:start + CHUNK]}).values_list(
+            owner, other)
+        for user_id, other_id in rows:
+            adjacency[user_id].append(other_id)
+    return adjacency
+
+
+def load(kind, user_ids):
+    """Списки ``{id пользователя: массив id}`` одним чтением кэша;
+    недостающие читаются из базы и кладутся в кэш."""
+    keys = {_key(kind, user_id): user_id for user_id in user_ids}
+    found = {keys[key]: _unpack(raw)
+             for key, raw in cache.get_many(keys).items()}
+    missing = [user_id for user_id in keys.values() if user_id not in found]
+    if missing:
+        packed = {user_id: _pack(ids)
+                  for user_id, ids in _from_db(kind, missing).items()}
+        cache.set_many(
+            {_key(kind, user_id): raw for user_id, raw in packed.items()},
+            replica.cache_timeout(settings.FOLLOW_GRAPH_TIMEOUT))
+        found.update((user_id, _unpack(raw))
+                     for user_id, raw in packed.items())
+    return found
+
+
+def following(user_id):
+    """Отсортированные id авторов, на которых подписан пользователь."""
+    return load(FOLLOWING, [user_id])[user_id]
+
+
+def followers(user_id):
+    """Отсортированные id подписчиков пользователя."""
+    return load(FOLLOWERS, [user_id])[user_id]
+
+
+def contains(ids, value):
+    """Есть ли ``value`` в отсортированном массиве ``ids``."""
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def is_following(user_id, author_id):
+    return contains(following(user_id), author_id)
+
+
+def mutual(user_id):
+    """Отсортированные id пользователей, с которыми подписка взаимная."""
+    return sorted(set(following(user_id)).intersection(followers(user_id)))
+
+
+def _changed(user_id, author_id):
+    keys = [_key(FOLLOWING, user_id), _key(FOLLOWERS, author_id)]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def added(user_id, author_id):
+    """Учитывает новую подписку; вызывается сигналом."""
+    _changed(user_id, author_id)
+
+
+def removed(user_id, author_id):
+    """Учитывает отписку; вызывается сигналом."""
+    _changed(user_id, author_id)
+
+
+def forget(user_ids):
+    """Удаляет списки пользователей из кэша, например после
+    ``bulk_create``, при котором сигналы не срабатывают."""
+    cache.delete_many([_key(kind, user_id) for user_id in user_ids
+                       for kind in COLUMNS])
+
+
+def follow(user_id, author_id):
+    """Подписывает пользователя на автора; True, если подписки не было.
+
+    Запись всегда идёт в базу, а не сверяется с кэшем: устаревший
+    список в кэше не должен мешать подписаться.
+    """
+    if user_id == author_id:
+        return False
+    _, created = Follow.objects.get_or_create(user_id=user_id,
+                                              author_id=author_id)
+    return created
+
+
+def unfollow(user_id, author_id):
+    """Отписывает пользователя от автора; True, если подписка была."""
+    # удаление выбирает подписку и удаляет её в одной транзакции на
+    # запись, иначе две параллельные отписки обе вычтут счётчики
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(
+            user_id=user_id, author_id=author_id).delete()
+    return deleted > 0
@@ -0,0 +1,94 @@
+"""Обработка картинок постов при загрузке.
+
+Загруженный файл больше ``settings.FILE_UPLOAD_MAX_MEMORY_SIZE`` Django
+пишет во временный файл на диске, и обработка читает его оттуда, не
+загружая целиком в память. Размер файла проверяет поле формы ещё до того,
+как Pillow откроет файл, а число пикселей проверяется по заголовку до
+декодирования. Картинка уменьшается до ``settings.IMAGE_MAX_SIDE``
+по большей стороне, поворачивается по EXIF и пересохраняется в
+``settings.IMAGE_FORMAT`` (WebP или прогрессивный JPEG) без
+метаданных. Ширина и высота результата записываются в пост, чтобы
+шаблоны не открывали файл ради атрибутов ``<img>``.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# расширение файла и параметры сохранения для каждого формата
+FORMATS = {
+    "WEBP": ("webp", {"quality": 80, "method": 4}),
+    "JPEG": ("jpg", {"quality": 85, "progressive": True, "optimize": True}),
+}
+
+
+def check_size(upload):
+    """Проверяет размер загруженного файла, не читая его."""
+    if upload.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ValidationError(
+            "Файл больше %(limit)s",
+            params={"limit": filesizeformat(settings.IMAGE_UPLOAD_MAX_BYTES)},
+            code="file_too_large")
+
+
+def open_checked(upload):
+    """Открывает картинку, прочитав только заголовок, и проверяет её
+    размер."""
+    check_size(upload)
+    upload.seek(0)
+    image = Image.open(upload)
+    if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Картинка больше %(limit)s мегапикселей",
+            params={"limit": settings.IMAGE_MAX_PIXELS // 10 ** 6},
+            code="image_too_large")
+    return image
+
+
+def _mode(image, fmt):
+    if fmt == "WEBP" and ("A" in image.getbands()
+                          or "transparency" in image.info):
+        return "RGBA"
+    return "RGB"
+
+
+def _reencode(image, output, fmt, options):
+    side = settings.IMAGE_MAX_SIDE
+    # JPEG сразу декодируется в уменьшенном масштабе, а не целиком
+    image.draft("RGB", (side, side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((side, side), Image.LANCZOS)
+    image = image.convert(_mode(image, fmt))
+    # exif и icc_profile не передаются, поэтому метаданные не попадают
+    # в новый файл
+    image.save(output, fmt, **options)
+    return image
+
+
+def process(upload):
+    """Уменьшает и пересохраняет картинку.
+
+    Возвращает файл для ``Post.image`` (во временном файле на диске),
+    его ширину и высоту. Обрезанный или испорченный файл, который
+    прошёл ``verify()`` поля формы, отклоняется ``ValidationError``.
+    """
+    fmt = settings.IMAGE_FORMAT
+    extension, options = FORMATS[fmt]
+    output = tempfile.TemporaryFile()
+    try:
+        image = _reencode(open_checked(upload), output, fmt, options)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as error:
+        output.close()
+        raise ValidationError(
+            "Файл повреждён или не является картинкой",
+            code="invalid_image") from error
+    except ValidationError:
+        output.close()
+        raise
+    output.seek(0)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return File(output, name=f"{name}.{extension}"), image.width, image.height
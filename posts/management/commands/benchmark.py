@@ -0,0 +1,99 @@
+import json
+import platform
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import benchmark
+from posts.seed import seed
+
+
+class Command(BaseCommand):
+    help = ("Наполняет базу данными заданного объёма, прогоняет запросы ко "
+            "всем адресам posts/urls.py и сохраняет p50/p95/p99, число "
+            "SQL-запросов и размер ответа в JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=40000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument("--requests", type=int, default=50,
+                            help="Запросов на каждый сценарий")
+        parser.add_argument("--warmup", type=int, default=1,
+                            help="Прогревочных кругов без замеров")
+        parser.add_argument(
+            "--concurrency", type=int, default=1,
+            help="Потоков, шлющих запросы одновременно; больше одного "
+                 "требует --keep, потому что потоки видят только "
+                 "сохранённые данные")
+        parser.add_argument("--output", default="benchmark.json",
+                            help="Куда сохранить результаты")
+        parser.add_argument("--baseline",
+                            help="JSON прошлого прогона для сравнения")
+        parser.add_argument("--tolerance", type=float, default=0.2,
+                            help="Допустимое ухудшение p95, доля")
+        parser.add_argument(
+            "--keep", action="store_true",
+            help="Не откатывать сгенерированные данные")
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"]
+        if concurrency > 1 and not options["keep"]:
+            raise CommandError("Для --concurrency больше 1 нужен --keep")
+        with transaction.atomic():
+            sizes = seed(users=options["users"], groups=options["groups"],
+                         posts=options["posts"],
+                         comments=options["comments"],
+                         follows=options["follows"])
+            if concurrency == 1:
+                results, throughput = benchmark.run(
+                    options["requests"], options["warmup"])
+                if not options["keep"]:
+                    transaction.set_rollback(True)
+        if concurrency > 1:
+            results, throughput = benchmark.run(
+                options["requests"], options["warmup"], concurrency)
+
+        report = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "data": sizes,
+            "requests": options["requests"],
+            "concurrency": concurrency,
+            "throughput_rps": throughput,
+            "views": results,
+        }
+        with open(options["output"], "w") as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<18} p50 {row['p50_ms']:>8.2f}  "
+                f"p95 {row['p95_ms']:>8.2f}  p99 {row['p99_ms']:>8.2f} мс  "
+                f"{row['queries']:>3} SQL  {row['bytes']:>7} байт  "
+                f"{row['errors']} ошибок")
+        self.stdout.write(f"Пропускная способность: {throughput} запр/с "
+                          f"в {concurrency} поток(а)")
+        self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+        if options["baseline"]:
+            self.compare(options["baseline"], results, throughput,
+                         concurrency, options["tolerance"])
+
+    def compare(self, path, results, throughput, concurrency, tolerance):
+        with open(path) as baseline:
+            base = json.load(baseline)
+        found = benchmark.regressions(results, base["views"], tolerance)
+        if base.get("concurrency", 1) == concurrency:
+            slower = benchmark.throughput_regression(
+                throughput, base.get("throughput_rps"), tolerance)
+            if slower:
+                found.append(slower)
+        for line in found:
+            self.stdout.write(self.style.ERROR(line))
+        if found:
+            raise CommandError("Есть регрессии относительно эталона")
+        self.stdout.write(self.style.SUCCESS("Регрессий нет"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает снимки как есть и после обработки при загрузке: "
+            "размер файла и время нарезки миниатюр")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=3,
+                            help="Сколько снимков сгенерировать")
+        parser.add_argument("--width", type=int, default=4000)
+        parser.add_argument("--height", type=int, default=3000)
+
+    def handle(self, *args, **options):
+        results = benchmark.image_pipeline(
+            options["count"], (options["width"], options["height"]))
+        for kind, row in results.items():
+            self.stdout.write(f"{kind:<10} {row['bytes']:>10} байт  "
+                              f"миниатюры за {row['thumbnail_ms']:>8} мс")
+        original, processed = results["original"], results["processed"]
+        self.stdout.write(
+            f"Отдаётся в {original['bytes'] / processed['bytes']:.1f} раза "
+            f"меньше, миниатюры нарезаются в "
+            f"{original['thumbnail_ms'] / processed['thumbnail_ms']:.1f} "
+            f"раза быстрее")
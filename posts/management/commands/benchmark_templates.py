@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает время отрисовки страницы карточек: шаблон без "
+            "кэша, шаблон из cached.Loader и posts.cards")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=200,
+                            help="Сколько страниц отрисовать каждым способом")
+
+    def handle(self, *args, **options):
+        results = benchmark.card_rendering(options["pages"])
+        for name, row in results.items():
+            self.stdout.write(f"{name:<16} {row['page_ms']:>8} мс/страница "
+                              f"{row['bytes']:>8} байт")
+        slowest = results["template"]["page_ms"]
+        fastest = results["python"]["page_ms"]
+        self.stdout.write(f"posts.cards быстрее шаблона без кэша в "
+                          f"{slowest / fastest:.1f} раза")
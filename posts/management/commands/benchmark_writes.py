@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Всплеск комментариев к одному посту: запись из запроса против "
+            "отложенной записи posts.writebehind")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200,
+                            help="Сколько комментариев отправить")
+        parser.add_argument("--concurrency", type=int, default=8,
+                            help="Сколько потоков отправляют одновременно")
+
+    def handle(self, *args, **options):
+        results = benchmark.comment_burst(options["requests"],
+                                          options["concurrency"])
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<13} {row['per_second']:>8} запр/с  "
+                f"p95 {row['p95_ms']:>9} мс  ошибок {row['errors']:>4}  "
+                f"сохранено {row['saved']:>5} за {row['saved_after_s']} с")
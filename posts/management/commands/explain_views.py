@@ -0,0 +1,106 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from posts import timeline
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry,
+                          User)
+from posts.pagination import comment_batch, encode_cursor, paginate
+from posts.seed import seed
+
+# фрагменты плана SQLite, которые означают полный проход или сортировку
+FULL_SCAN = "SCAN "
+INDEX_SCAN = " USING "
+TEMP_SORT = "USE TEMP B-TREE"
+
+
+def page_query(object_list, **params):
+    """Запрос строк страницы, который выполняет ``paginate`` для
+    параметров адреса ``params``."""
+    page = paginate(RequestFactory().get("/", params), object_list)
+    if getattr(page, "is_keyset", False):
+        return page.queryset
+    return page.object_list
+
+
+def view_queries():
+    """Запросы, которые выполняют представления posts.views; строятся
+    теми же функциями, что и в представлениях."""
+    post = Post.objects.first()
+    author, group = post.author, Group.objects.first()
+    comment = Comment.objects.first()
+    follower = User.objects.get(
+        pk=TimelineEntry.objects.values_list("user", flat=True).first())
+    return {
+        "index": page_query(Post.objects.for_feed()),
+        "index cursor": page_query(Post.objects.for_feed(),
+                                   cursor=encode_cursor(post)),
+        "group_posts": page_query(group.posts.for_feed()),
+        "profile": page_query(author.posts.for_feed()),
+        "post_view": Post.objects.for_feed().filter(
+            id=post.id, author__username=author.username).order_by(),
+        "post_view comments": comment_batch(comment.post.comments.all(),
+                                            None)[0],
+        "post_comments cursor": comment_batch(
+            comment.post.comments.all(),
+            encode_cursor(comment, field="created"))[0],
+        "follow_index": page_query(timeline.feed_for(follower)),
+        "follow_index past timeline": page_query(
+            timeline.pull_feed(follower), cursor=encode_cursor(post)),
+        "profile following": Follow.objects.filter(
+            user=follower, author=author),
+        "new_post fan-out": Follow.objects.filter(
+            author=author).values_list("user_id", flat=True),
+        "profile_unfollow": TimelineEntry.objects.filter(
+            user=follower, post__author=author).order_by(),
+        "user lookup": User.objects.filter(username=author.username),
+    }
+
+
+def problems(plan):
+    for line in plan.splitlines():
+        detail = line.split(" ", 3)[-1]
+        if TEMP_SORT in detail:
+            yield detail
+        elif detail.startswith(FULL_SCAN) and INDEX_SCAN not in detail:
+            yield detail
+
+
+class Command(BaseCommand):
+    help = ("Наполняет базу большим набором данных и проверяет EXPLAIN "
+            "запросов всех представлений: полный проход таблицы или "
+            "временная сортировка считаются ошибкой")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--posts", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=40000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument(
+            "--keep", action="store_true",
+            help="Не откатывать сгенерированные данные")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Проверка планов написана для SQLite")
+        failed = []
+        with transaction.atomic():
+            seed(users=options["users"], posts=options["posts"],
+                 comments=options["comments"], follows=options["follows"])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+            for name, queryset in view_queries().items():
+                plan = queryset.explain()
+                found = list(problems(plan))
+                status = self.style.ERROR("FAIL") if found else "ok"
+                self.stdout.write(f"{status:>4}  {name}")
+                for detail in found:
+                    self.stdout.write(f"      {detail}")
+                if found:
+                    failed.append(name)
+            if not options["keep"]:
+                transaction.set_rollback(True)
+        if failed:
+            raise CommandError("Запросы без подходящего индекса: "
+                               + ", ".join(failed))
+        self.stdout.write(self.style.SUCCESS("Все запросы используют индексы"))
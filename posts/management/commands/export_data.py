@@ -0,0 +1,29 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ("Потоково выгружает сообщества, посты, комментарии и подписки "
+            "в файлы JSONL или CSV, по файлу на таблицу")
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Каталог для файлов")
+        parser.add_argument("--format", choices=transfer.FORMATS,
+                            default="jsonl")
+        parser.add_argument("--tables", nargs="+",
+                            choices=list(transfer.TABLES),
+                            default=list(transfer.TABLES))
+
+    def handle(self, *args, **options):
+        os.makedirs(options["directory"], exist_ok=True)
+        transfer.export(options["directory"], options["format"],
+                        options["tables"], report=self.report)
+        self.stdout.write(self.style.SUCCESS("Выгрузка завершена"))
+
+    def report(self, table, rows, seconds):
+        rate = rows / seconds if seconds else rows
+        self.stdout.write(f"{table}: {rows} строк за {seconds:.1f} с "
+                          f"({rate:.0f} строк/с)")
@@ -0,0 +1,23 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from posts import writebehind
+
+
+class Command(BaseCommand):
+    help = ("Сохраняет отложенные записи из журнала posts.writebehind, "
+            "в том числе оставшиеся после падения процессов")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--follow", action="store_true",
+            help="Работать писателем, пока процесс не остановят, - вместо "
+                 "фоновых потоков воркеров")
+
+    def handle(self, *args, **options):
+        if options["follow"]:
+            writebehind.run(threading.Event())
+            return
+        flushed = writebehind.flush()
+        self.stdout.write(f"Сохранено записей журнала: {flushed}")
@@ -0,0 +1,35 @@
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Нарезает миниатюры для уже загруженных картинок постов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Нарезать заново и те картинки, миниатюры которых готовы")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image="").exclude(
+            image__isnull=True).only("pk", "image", "author", "group")
+        futures, skipped = [], 0
+        for post in posts.iterator():
+            name = post.image.name
+            ready = all(thumbnails.get_url(name, alias)
+                        for alias in settings.POST_THUMBNAILS)
+            if ready and not options["force"]:
+                skipped += 1
+                continue
+            future = thumbnails.schedule(name, post)
+            if future is not None:
+                futures.append(future)
+        failed = sum(not future.result() for future in as_completed(futures))
+        self.stdout.write(
+            f"Нарезано: {len(futures) - failed}, уже готово: {skipped}, "
+            f"ошибок: {failed}")
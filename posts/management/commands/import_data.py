@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ("Потоково загружает файлы export_data пачками через "
+            "bulk_create и пересчитывает ленты, счётчики и поиск")
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Каталог с файлами")
+        parser.add_argument("--format", choices=transfer.FORMATS,
+                            default="jsonl")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        skipped = transfer.load(options["directory"], options["format"],
+                                options["batch_size"], report=self.report)
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f"Пропущено комментариев к отсутствующим постам: {skipped}"))
+        self.stdout.write(self.style.SUCCESS("Загрузка завершена"))
+
+    def report(self, table, rows, seconds):
+        rate = rows / seconds if seconds else rows
+        self.stdout.write(f"{table}: {rows} строк за {seconds:.1f} с "
+                          f"({rate:.0f} строк/с)")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ("Пересчитывает хранимые счётчики постов, комментариев "
+            "и подписок и исправляет расхождения")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Только показать расхождения, ничего не меняя")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = counters.rebuild(dry_run=options["dry_run"])
+        for table, rows in drift.items():
+            self.stdout.write(f"{table}: {rows}")
+        if options["dry_run"]:
+            self.stdout.write("Проверка завершена, счётчики не изменены")
+        else:
+            self.stdout.write(self.style.SUCCESS("Счётчики пересчитаны"))
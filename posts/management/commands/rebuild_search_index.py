@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = "Перестраивает поисковый индекс постов и комментариев"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Проиндексировано постов: {total}"))
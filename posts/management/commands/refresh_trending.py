@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = "Пересобирает рейтинг ленты популярного"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild", action="store_true",
+            help="Сначала пересчитать рейтинги по комментариям в окне")
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Повторять каждые столько секунд; 0 - один раз")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            trending.rebuild()
+        while True:
+            ranking = trending.refresh()
+            self.stdout.write(f"В рейтинге постов: {len(ranking)}")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube.sqlite.replica import replicate
+from yatube.sqlite.routers import REPLICA_ALIAS
+
+
+class Command(BaseCommand):
+    help = ("Копирует основную базу в файл реплики - замена репликации "
+            "для локальной проверки")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Повторять каждые столько секунд; 0 - скопировать один раз")
+
+    def handle(self, *args, **options):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            raise CommandError("Реплика не настроена: задайте путь к ней "
+                               "в переменной DATABASE_REPLICA")
+        source = settings.DATABASES["default"]["NAME"]
+        target = settings.DATABASES[REPLICA_ALIAS]["NAME"]
+        while True:
+            started = time.monotonic()
+            replicate(source, target)
+            self.stdout.write(f"Реплика обновлена за "
+                              f"{time.monotonic() - started:.2f} с")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
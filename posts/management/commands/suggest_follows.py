@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает рекомендации «Кого почитать» для всех пользователей"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Повторять каждые столько секунд; 0 - один раз")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            saved = recommendations.rebuild()
+            self.stdout.write(f"Рекомендаций: {saved}, расчёт за "
+                              f"{time.monotonic() - started:.1f} с")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.6 on 2026-10-18 01:59
+
+from django.db import migrations, models
+
+
+# изменения моделей, которые были в коде раньше, чем в миграциях:
+# подписи полей и ограничение уникальности подписки
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_comment_follow'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата публикации'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='follow',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
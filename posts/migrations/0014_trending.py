@@ -0,0 +1,22 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='posts.Post')),
+                ('score', models.FloatField(default=0)),
+                ('updated', models.DateTimeField()),
+            ],
+        ),
+    ]
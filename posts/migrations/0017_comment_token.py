@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='token',
+            field=models.UUIDField(editable=False, null=True, unique=True),
+        ),
+    ]
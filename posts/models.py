@@ -13,10 +13,29 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+
+    def for_feed(self):
+        """Посты для карточек post_item.html: автор и группа подтягиваются
+        join-ом, число комментариев хранится в самом посте."""
+        return self.select_related("author", "group")
+
+
 class Post(models.Model):
 
     class Meta:
-        ordering = ["-pub_date"]
+        ordering = ["-pub_date", "-id"]
+        # по индексу на каждую ленту: общая, автора и сообщества
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"],
+                         name="post_date_idx"),
+            models.Index(fields=["author", "-pub_date", "-id"],
+                         name="post_author_date_idx"),
+            models.Index(fields=["group", "-pub_date", "-id"],
+                         name="post_group_date_idx"),
+        ]
+
+    objects = PostQuerySet.as_manager()
 
     text = models.TextField(verbose_name="Текст",
                             help_text="Введите текст поста")
@@ -29,6 +48,14 @@ class Post(models.Model):
                               help_text="Выберите группу")
     image = models.ImageField(upload_to="posts/", blank=True, null=True,
                               verbose_name="Картинка")
+    # размеры записывает posts.images при загрузке; не width_field, чтобы
+    # Django не открывал файл при создании каждого объекта
+    image_width = models.PositiveIntegerField(null=True, blank=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True,
+                                               editable=False)
+    # счётчик поддерживается в posts.counters
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.text
@@ -36,6 +63,12 @@ class Post(models.Model):
 
 class Comment(models.Model):
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["post", "created"],
+                         name="comment_post_created_idx"),
+        ]
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
                              related_name="comments")
     author = models.ForeignKey(User, on_delete=models.CASCADE,
@@ -44,6 +77,9 @@ class Comment(models.Model):
                             help_text="Напишите текст комментария")
     created = models.DateTimeField(verbose_name="Дата публикации",
                                    auto_now_add=True)
+    # метка записи журнала posts.writebehind: повторное сохранение
+    # журнала после сбоя не создаёт дублей
+    token = models.UUIDField(null=True, unique=True, editable=False)
 
     def __str__(self):
         return self.text[:15]
@@ -56,8 +92,109 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=["user", "author"], name="unique_follow")
         ]
+        # уникальный индекс покрывает поиск по user, этот - по author
+        indexes = [
+            models.Index(fields=["author", "user"],
+                         name="follow_author_user_idx"),
+        ]
     user = models.ForeignKey(User, on_delete=models.CASCADE,
                              verbose_name="Подписчик", related_name="follower")
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                verbose_name="Подписант",
                                related_name="following")
+
+
+class UserStats(models.Model):
+    """Хранимые счётчики пользователя для страниц профиля и поста."""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                related_name="stats")
+    posts_count = models.PositiveIntegerField(default=0)
+    # сколько пользователей подписано на него
+    followers_count = models.PositiveIntegerField(default=0)
+    # на скольких авторов подписан он сам
+    following_count = models.PositiveIntegerField(default=0)
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Ленты заполняются при публикации поста (fan-out-on-write), поэтому
+    страница /follow/ читает готовый список вместо join по Follow.
+    """
+
+    class Meta:
+        ordering = ["-pub_date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_timeline_entry")
+        ]
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"],
+                         name="timeline_user_date_idx"),
+        ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    # копия Post.pub_date, чтобы сортировать ленту по индексу без join
+    pub_date = models.DateTimeField()
+
+
+class SearchTerm(models.Model):
+    """Запись обратного индекса поиска: основа слова и её вес в посте.
+
+    Вес складывается из вхождений слова в текст поста, название его
+    сообщества и комментарии; индекс поддерживается в posts.search.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["term", "post"], name="unique_search_term")
+        ]
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="search_terms")
+    weight = models.IntegerField()
+
+
+class TrendingScore(models.Model):
+    """Затухающий рейтинг поста для ленты популярного.
+
+    ``score`` - сумма весов комментариев и новых подписчиков автора на
+    момент ``updated``; к текущему времени он уменьшается вдвое за
+    каждые ``settings.TRENDING_HALF_LIFE`` секунд. Поддерживается в
+    posts.trending.
+    """
+
+    post = models.OneToOneField(Post, on_delete=models.CASCADE,
+                                primary_key=True, related_name="trend")
+    score = models.FloatField(default=0)
+    updated = models.DateTimeField()
+
+
+class Suggestion(models.Model):
+    """Автор, на которого стоит подписаться пользователю.
+
+    ``rank`` - место в списке, начиная с нуля, ``score`` - вес из общих
+    подписок и общих сообществ. Строки пересобирает пакетная задача
+    posts.recommendations, страницы их только читают.
+    """
+
+    class Meta:
+        ordering = ["user", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"], name="unique_suggestion")
+        ]
+        indexes = [
+            models.Index(fields=["user", "rank"],
+                         name="suggestion_user_rank_idx"),
+        ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="suggestions")
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
@@ -0,0 +1,190 @@
+"""Постраничная навигация лент и комментариев.
+
+Первые ``settings.PAGE_NUMBER_LIMIT`` страниц доступны по старым адресам
+``?page=N`` через обычный ``Paginator``. Дальше лента листается курсором
+``?cursor=...``: запрос ищет записи по ключу ``(pub_date, id)`` и не
+считает ``COUNT(*)``, поэтому глубокие страницы не замедляются.
+Комментарии поста листаются только курсором по ключу ``(created, id)``
+от старых к новым.
+"""
+import base64
+import json
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+NEXT = "n"
+PREVIOUS = "p"
+MAX_PK = 2 ** 63 - 1
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(obj, direction=NEXT, field="pub_date"):
+    """Упаковывает ключ записи в непрозрачный токен для ``?cursor=``."""
+    raw = json.dumps([direction, getattr(obj, field).isoformat(), obj.pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, pub_date, pk = json.loads(
+            base64.urlsafe_b64decode(padded.encode()))
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise InvalidCursor(cursor)
+    # id вне диапазона целых SQLite не дошёл бы до запроса
+    if (direction not in (NEXT, PREVIOUS) or pub_date is None
+            or not 0 <= pk <= MAX_PK):
+        raise InvalidCursor(cursor)
+    return direction, pub_date, pk
+
+
+class KeysetPage(Sequence):
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, cursor, has_next,
+                 has_previous, queryset=None):
+        self.object_list = object_list
+        # запрос, которым выбраны строки страницы (для EXPLAIN)
+        self.queryset = queryset
+        self.paginator = paginator
+        self.cursor = cursor
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return "<Keyset page %s>" % (self.cursor or "first")
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0], PREVIOUS)
+
+
+class KeysetPaginator:
+    """Пагинатор по ключу ``(pub_date, id)`` для лент, отсортированных
+    от новых записей к старым."""
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def get_page(self, cursor):
+        try:
+            direction, pub_date, pk = decode_cursor(cursor)
+        except InvalidCursor:
+            return self._page(self.object_list, None, NEXT)
+        # условие записано как диапазон по pub_date, а не через OR,
+        # чтобы SQLite шёл по индексу (pub_date, id) без сортировки
+        if direction == NEXT:
+            older = (Q(pub_date__lte=pub_date)
+                     & ~Q(pub_date=pub_date, pk__gte=pk))
+            return self._page(self.object_list.filter(older), cursor, NEXT)
+        newer = Q(pub_date__gte=pub_date) & ~Q(pub_date=pub_date, pk__lte=pk)
+        return self._page(self.object_list.filter(newer), cursor, PREVIOUS)
+
+    def _page(self, queryset, cursor, direction):
+        if direction == NEXT:
+            queryset = queryset.order_by("-pub_date", "-pk")
+        else:
+            queryset = queryset.order_by("pub_date", "pk")
+        queryset = queryset[:self.per_page + 1]
+        rows = list(queryset)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        # курсор за концом ленты (записи удалены или курсор подделан)
+        # даёт пустую страницу без ссылок, от неё некуда листать
+        came_from = cursor is not None and bool(rows)
+        if direction == NEXT:
+            return KeysetPage(rows, self, cursor, has_more, came_from,
+                              queryset)
+        rows.reverse()
+        return KeysetPage(rows, self, cursor, came_from, has_more, queryset)
+
+
+def paginate(request, object_list, per_page=None, count=None):
+    """Возвращает страницу ленты по параметрам ``?page=`` или ``?cursor=``.
+
+    ``count`` позволяет передать заранее известное число записей
+    (например, хранимый счётчик), чтобы не выполнять ``COUNT(*)``.
+    """
+    per_page = per_page or settings.POST_PER_PAGE
+    cursor = request.GET.get("cursor")
+    if cursor is not None:
+        return KeysetPaginator(object_list, per_page).get_page(cursor)
+    page_number = request.GET.get("page")
+    try:
+        if int(page_number) > settings.PAGE_NUMBER_LIMIT:
+            raise Http404("Дальше листайте ленту курсором")
+    except (TypeError, ValueError):
+        pass
+    paginator = Paginator(object_list, per_page)
+    paginator.number_limit = settings.PAGE_NUMBER_LIMIT
+    if count is not None:
+        paginator.count = count
+    page = paginator.get_page(page_number)
+    # с последней нумерованной страницы переходим на курсоры
+    if page.number >= settings.PAGE_NUMBER_LIMIT and page.has_next():
+        page.next_cursor = encode_cursor(page[-1], NEXT)
+    return page
+
+
+def _after(created, pk):
+    return Q(created__gte=created) & ~Q(created=created, pk__lte=pk)
+
+
+def comment_batch(comments, cursor, per_page=None, total=None):
+    """Пачка комментариев после ``cursor`` и курсор следующей пачки.
+
+    ``comments`` - комментарии одного поста. Возвращается QuerySet не
+    больше чем из ``per_page`` комментариев с авторами и курсор
+    следующей пачки или None. ``total`` - известное число комментариев
+    поста: по нему первая пачка узнаёт, есть ли продолжение, без
+    запроса.
+    """
+    per_page = per_page or settings.COMMENTS_PER_PAGE
+    comments = comments.select_related("author").order_by("created", "pk")
+    try:
+        _, created, pk = decode_cursor(cursor)
+    except InvalidCursor:
+        cursor = None
+    else:
+        comments = comments.filter(_after(created, pk))
+    batch = comments[:per_page]
+    if len(batch) < per_page:
+        return batch, None
+    last = batch[per_page - 1]
+    if cursor is None and total is not None:
+        has_next = total > per_page
+    else:
+        has_next = comments.filter(_after(last.created, last.pk)).exists()
+    return batch, encode_cursor(last, field="created") if has_next else None
@@ -0,0 +1,138 @@
+"""Кого почитать: рекомендации авторов для подписки.
+
+Пакетная задача (команда ``suggest_follows``) один раз читает всю
+таблицу подписок в отсортированные массивы id, как в posts.graph, и
+сообщества, в которых пишут авторы. Кандидат для пользователя получает
+вес ``settings.SUGGESTION_WEIGHTS["follow"]`` за каждого, на кого
+пользователь подписан и кто подписан на кандидата, и вес
+``["group"]`` за каждое общее сообщество, в котором оба писали. Лучшие
+``settings.SUGGESTIONS_PER_USER`` кандидатов сохраняются в таблицу
+``Suggestion``.
+
+Страницы только читают готовый список из кэша и убирают из него тех,
+на кого пользователь уже подписан, по графу подписок - без запросов к
+базе.
+"""
+import heapq
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from yatube.cache import get_or_compute
+from yatube.sqlite import replica
+
+from . import fragments, graph
+from .models import Follow, Post, Suggestion, User
+
+
+def follow_arrays():
+    """Весь граф подписок: ``{id: отсортированный array("I") авторов}``."""
+    following = defaultdict(lambda: array("I"))
+    # порядок уникального индекса (user, author): массивы уже отсортированы
+    rows = Follow.objects.order_by("user_id", "author_id").values_list(
+        "user_id", "author_id")
+    for user_id, author_id in rows.iterator():
+        following[user_id].append(author_id)
+    return following
+
+
+def group_members():
+    """Сообщества каждого автора ``{id: set}`` и самые активные авторы
+    каждого сообщества ``{id сообщества: array}``.
+
+    Из сообщества берутся ``settings.SUGGESTION_GROUP_AUTHORS`` авторов с
+    наибольшим числом постов, чтобы большое сообщество не давало каждому
+    своему участнику тысячи кандидатов.
+    """
+    groups = defaultdict(set)
+    activity = defaultdict(list)
+    rows = Post.objects.filter(group__isnull=False).order_by().values_list(
+        "group_id", "author_id").annotate(posts=Count("pk"))
+    for group_id, author_id, posts in rows.iterator():
+        groups[author_id].add(group_id)
+        activity[group_id].append((posts, -author_id))
+    members = {
+        group_id: array("I", (-author for _, author in heapq.nlargest(
+            settings.SUGGESTION_GROUP_AUTHORS, authors)))
+        for group_id, authors in activity.items()}
+    return groups, members
+
+
+def rank(user_id, following, groups, members):
+    """Лучшие кандидаты пользователя: список пар (id автора, вес)."""
+    weights = settings.SUGGESTION_WEIGHTS
+    mine = following.get(user_id, ())
+    friends = Counter()
+    for followee in mine:
+        friends.update(following.get(followee, ()))
+    shared = Counter()
+    for group_id in groups.get(user_id, ()):
+        shared.update(members[group_id])
+    scores = Counter({author: count * weights["follow"]
+                      for author, count in friends.items()})
+    scores.update({author: count * weights["group"]
+                   for author, count in shared.items()})
+    excluded = set(mine)
+    excluded.add(user_id)
+    return heapq.nlargest(
+        settings.SUGGESTIONS_PER_USER,
+        ((author, score) for author, score in scores.items()
+         if author not in excluded and score > 0),
+        key=lambda item: (item[1], -item[0]))
+
+
+def rebuild(chunk=500):
+    """Пересчитывает рекомендации всех пользователей; возвращает число
+    сохранённых строк.
+
+    Пользователи обрабатываются пачками по ``chunk``: каждая пачка
+    заменяется в своей короткой транзакции, и запись не держит
+    блокировку базы на всё время расчёта.
+    """
+    following = follow_arrays()
+    groups, members = group_members()
+    user_ids = list(User.objects.order_by("pk").values_list("pk", flat=True))
+    saved = 0
+    for start in range(0, len(user_ids), chunk):
+        part = user_ids[start:start + chunk]
+        rows = [Suggestion(user_id=user_id, author_id=author_id,
+                           rank=index, score=score)
+                for user_id in part
+                for index, (author_id, score) in enumerate(
+                    rank(user_id, following, groups, members))]
+        with transaction.atomic():
+            Suggestion.objects.filter(user_id__in=part).delete()
+            Suggestion.objects.bulk_create(rows)
+        saved += len(rows)
+    fragments.bump(fragments.SUGGESTIONS)
+    return saved
+
+
+def _stored(user_id):
+    return [{"pk": pk, "username": username}
+            for pk, username in Suggestion.objects.filter(
+                user_id=user_id).values_list("author_id",
+                                             "author__username")]
+
+
+def for_user(user_id, limit=None):
+    """Кого показать пользователю: ``[{"pk", "username"}]``.
+
+    Список берётся из кэша, помеченного поколением последнего расчёта;
+    авторы, на которых пользователь подписался после расчёта,
+    отбрасываются по графу подписок.
+    """
+    limit = limit or settings.SUGGESTIONS_SHOWN
+    version = fragments.generations(
+        [fragments.SUGGESTIONS])[fragments.SUGGESTIONS]
+    stored = get_or_compute(f"suggestions:{user_id}",
+                            lambda: _stored(user_id), version=version,
+                            timeout=replica.cache_timeout(None))
+    if not stored:
+        return []
+    mine = graph.following(user_id)
+    return [author for author in stored
+            if not graph.contains(mine, author["pk"])][:limit]
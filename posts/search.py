@@ -0,0 +1,131 @@
+"""Полнотекстовый поиск по постам через обратный индекс.
+
+Для каждого поста хранится вес каждой основы слова (``SearchTerm``):
+вхождения в текст поста, название сообщества и комментарии с весами из
+``settings.SEARCH_WEIGHTS``. Индекс обновляется сигналами: пост
+переиндексируется целиком при сохранении, а комментарии и переименование
+сообщества только добавляют или вычитают свои слова. Поиск находит
+посты, в которых есть все слова запроса, и ранжирует их по сумме весов,
+умноженных на IDF слова.
+"""
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (Case, Count, ExpressionWrapper, F, FloatField,
+                              Sum, Value, When)
+
+from .models import Post, SearchTerm
+from .stemmer import terms
+
+REBUILD_CHUNK = 500
+
+
+def weigh(text, field):
+    """Веса терминов текста, встретившегося в поле ``field``."""
+    weight = settings.SEARCH_WEIGHTS[field]
+    return Counter({term: count * weight
+                    for term, count in Counter(terms(text)).items()})
+
+
+def post_weights(post, comments):
+    """Веса терминов поста вместе с текстами его комментариев."""
+    weights = weigh(post.text, "text")
+    if post.group is not None:
+        weights += weigh(post.group.title, "group")
+    for text in comments:
+        weights += weigh(text, "comment")
+    return weights
+
+
+def _entries(post_id, weights):
+    return [SearchTerm(post_id=post_id, term=term, weight=weight)
+            for term, weight in weights.items()]
+
+
+def index_post(post):
+    """Строит записи индекса поста заново."""
+    with transaction.atomic():
+        SearchTerm.objects.filter(post_id=post.pk).delete()
+        comments = post.comments.values_list("text", flat=True)
+        SearchTerm.objects.bulk_create(
+            _entries(post.pk, post_weights(post, comments)))
+
+
+def change(post_ids, weights, sign=1):
+    """Добавляет (``sign=1``) или вычитает веса терминов у постов."""
+    post_ids = list(post_ids)
+    if not post_ids or not weights:
+        return
+    with transaction.atomic():
+        existing = set(SearchTerm.objects.filter(
+            post_id__in=post_ids, term__in=weights).values_list(
+            "post_id", "term"))
+        for term, weight in weights.items():
+            SearchTerm.objects.filter(post_id__in=post_ids, term=term).update(
+                weight=F("weight") + sign * weight)
+        if sign > 0:
+            SearchTerm.objects.bulk_create(
+                SearchTerm(post_id=post_id, term=term, weight=weight)
+                for post_id in post_ids for term, weight in weights.items()
+                if (post_id, term) not in existing)
+        else:
+            SearchTerm.objects.filter(
+                post_id__in=post_ids, weight__lte=0).delete()
+
+
+def index_posts(post_ids):
+    """Строит записи индекса постов ``post_ids`` заново одной пачкой."""
+    posts = Post.objects.filter(pk__in=post_ids).select_related(
+        "group").prefetch_related("comments")
+    with transaction.atomic():
+        SearchTerm.objects.filter(post_id__in=post_ids).delete()
+        SearchTerm.objects.bulk_create(
+            entry for post in posts for entry in _entries(
+                post.pk, post_weights(
+                    post, [comment.text for comment in post.comments.all()])))
+
+
+def rebuild():
+    """Перестраивает весь индекс; возвращает число проиндексированных
+    постов."""
+    SearchTerm.objects.all().delete()
+    count = last = 0
+    # iterator() не поддерживает prefetch_related, поэтому пачками по id
+    while True:
+        ids = list(Post.objects.filter(pk__gt=last).order_by(
+            "pk").values_list("pk", flat=True)[:REBUILD_CHUNK])
+        if not ids:
+            return count
+        index_posts(ids)
+        count += len(ids)
+        last = ids[-1]
+
+
+def ranked(query):
+    """Id постов, подходящих под запрос, с рангом: словари
+    ``{"post": id, "score": ранг}`` от лучшего совпадения к худшему."""
+    query_terms = set(terms(query))
+    frequencies = dict(SearchTerm.objects.filter(
+        term__in=query_terms).values_list("term").annotate(
+        Count("post")).order_by())
+    if not query_terms or len(frequencies) < len(query_terms):
+        return SearchTerm.objects.none().values("post")
+    total = Post.objects.count()
+    idf = Case(*[When(term=term, then=Value(math.log(1 + total / found)))
+                 for term, found in frequencies.items()],
+               output_field=FloatField())
+    return SearchTerm.objects.filter(term__in=query_terms).values(
+        "post").annotate(
+        matched=Count("term"),
+        score=Sum(ExpressionWrapper(F("weight") * idf,
+                                    output_field=FloatField())),
+    ).filter(matched=len(query_terms)).order_by("-score", "-post")
+
+
+def posts_for(rows):
+    """Посты для карточек в порядке найденных строк ``ranked``."""
+    ids = [row["post"] for row in rows]
+    posts = Post.objects.for_feed().in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
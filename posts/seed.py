@@ -0,0 +1,68 @@
+"""Генератор тестовых данных для проверки планов запросов и нагрузки.
+
+Записи создаются через ``bulk_create`` пачками, сигналы при этом не
+срабатывают, поэтому ленты подписок, счётчики и поисковый индекс
+пересчитываются в конце.
+"""
+import random
+
+from . import (counters, fragments, graph, recommendations, search, timeline,
+               trending)
+from .models import Comment, Follow, Group, Post, User
+
+
+def _bulk(model, objects):
+    # размер пачки Django подбирает сам под ограничения SQLite
+    model.objects.bulk_create(objects, ignore_conflicts=True)
+
+
+def rebuild_derived(follower_ids):
+    """Пересчитывает то, что обычно поддерживают сигналы: граф
+    подписок, ленты подписчиков ``follower_ids``, счётчики, поисковый
+    индекс, рейтинг популярного и рекомендации."""
+    graph.forget(User.objects.values_list("pk", flat=True))
+    for user_id in follower_ids:
+        timeline.rebuild(user_id)
+    counters.rebuild()
+    search.rebuild()
+    trending.rebuild()
+    recommendations.rebuild()
+    # сигналы не сработали, поэтому закэшированные страницы сбрасываются
+    fragments.bump(fragments.ALL_FEEDS)
+
+
+def seed(users=1000, groups=20, posts=20000, comments=40000,
+         follows=20000, random_seed=0):
+    """Наполняет базу данными заданного объёма и возвращает их количество.
+
+    Имена пользователей и сообществ получают префикс ``seed``, поэтому
+    повторный запуск дополняет уже созданные записи.
+    """
+    rnd = random.Random(random_seed)
+    _bulk(User, (User(username=f"seed{i}") for i in range(users)))
+    _bulk(Group, (Group(title=f"Сообщество {i}", slug=f"seed-{i}",
+                        description="Сгенерированное сообщество")
+                  for i in range(groups)))
+    user_ids = list(User.objects.filter(
+        username__startswith="seed").values_list("pk", flat=True))
+    group_ids = list(Group.objects.filter(
+        slug__startswith="seed-").values_list("pk", flat=True))
+
+    _bulk(Post, (Post(text=f"Сгенерированный пост {i}",
+                      author_id=rnd.choice(user_ids),
+                      group_id=rnd.choice(group_ids + [None]))
+                 for i in range(posts)))
+    post_ids = list(Post.objects.filter(
+        author_id__in=user_ids).values_list("pk", flat=True))
+    _bulk(Comment, (Comment(text=f"Комментарий {i}",
+                            post_id=rnd.choice(post_ids),
+                            author_id=rnd.choice(user_ids))
+                    for i in range(comments)))
+    _bulk(Follow, (Follow(user_id=user_id, author_id=author_id)
+                   for user_id, author_id in
+                   (rnd.sample(user_ids, 2) for _ in range(follows))))
+
+    rebuild_derived(Follow.objects.filter(
+        user_id__in=user_ids).values_list("user_id", flat=True).distinct())
+    return {"users": len(user_ids), "groups": len(group_ids),
+            "posts": len(post_ids)}
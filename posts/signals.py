@@ -0,0 +1,172 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import (counters, fragments, graph, search, thumbnails, timeline,
+               trending)
+from .conditional import slug_key, username_key
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=User)
+def username_changed(sender, instance, update_fields=None, raw=False,
+                     **kwargs):
+    if raw or instance.pk is None or (
+            update_fields is not None and "username" not in update_fields):
+        return
+    old = User.objects.filter(pk=instance.pk).values_list(
+        "username", flat=True).first()
+    if old is not None and old != instance.username:
+        # старое имя может достаться новому пользователю с другим id
+        cache.delete(username_key(old))
+        fragments.bump(fragments.user_name(instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # имя может достаться новому пользователю с другим id
+    cache.delete(username_key(instance.username))
+    fragments.bump(fragments.user_name(instance.pk))
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_values(sender, instance, **kwargs):
+    # при смене группы нужно сбросить и ленту прежней группы,
+    # а при смене картинки - нарезать новые миниатюры
+    instance._old_group_id, instance._old_image = None, None
+    if instance.pk is not None:
+        instance._old_group_id, instance._old_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                "group_id", "image").first() or (None, None))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    fragments.bump(fragments.post_name(instance.pk),
+                   *fragments.feeds_of(instance.author_id, instance.group_id))
+    if getattr(instance, "_old_group_id", None) not in (
+            None, instance.group_id):
+        fragments.bump(f"group:{instance._old_group_id}")
+    image = instance.image.name
+    if image and image != getattr(instance, "_old_image", None):
+        transaction.on_commit(
+            lambda: thumbnails.schedule(image, instance))
+    search.index_post(instance)
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        timeline.push_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    fragments.bump(*fragments.feeds_of(instance.author_id, instance.group_id))
+    counters.bump_user(instance.author_id, posts_count=-1)
+
+
+def comments_changed(post_id):
+    post = Post.objects.filter(pk=post_id).values(
+        "author_id", "group_id").first()
+    if post is not None:
+        fragments.bump(fragments.post_name(post_id),
+                       *fragments.feeds_of(**post))
+
+
+@receiver(pre_save, sender=Comment)
+def remember_old_comment(sender, instance, **kwargs):
+    instance._old_text = None
+    if instance.pk is not None:
+        instance._old_text = Comment.objects.filter(
+            pk=instance.pk).values_list("text", flat=True).first()
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if getattr(instance, "_old_text", None) is not None:
+        search.change([instance.post_id],
+                      search.weigh(instance._old_text, "comment"), -1)
+    search.change([instance.post_id], search.weigh(instance.text, "comment"))
+    if created:
+        counters.bump_post(instance.post_id, 1)
+        comments_changed(instance.post_id)
+        trending.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # при удалении поста его записи индекса уже удалены каскадом,
+    # поэтому здесь можно только вычитать, но не добавлять строки
+    search.change([instance.post_id],
+                  search.weigh(instance.text, "comment"), -1)
+    counters.bump_post(instance.post_id, -1)
+    comments_changed(instance.post_id)
+
+
+@receiver(pre_save, sender=Group)
+def remember_old_title(sender, instance, **kwargs):
+    instance._old_title = None
+    if instance.pk is not None:
+        instance._old_title = Group.objects.filter(
+            pk=instance.pk).values_list("title", flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # название группы есть на карточках во всех лентах
+    fragments.bump(f"group:{instance.pk}", fragments.ALL_FEEDS)
+    cache.delete(slug_key(instance.slug))
+    old_title = getattr(instance, "_old_title", None)
+    if old_title is not None and old_title != instance.title:
+        post_ids = instance.posts.values_list("pk", flat=True)
+        search.change(post_ids, search.weigh(old_title, "group"), -1)
+        search.change(post_ids, search.weigh(instance.title, "group"))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # посты останутся без группы через SET_NULL, сигналов у них не будет
+    search.change(instance.posts.values_list("pk", flat=True),
+                  search.weigh(instance.title, "group"), -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+        fragments.bump(fragments.user_name(instance.author_id),
+                       fragments.user_name(instance.user_id))
+        graph.added(instance.user_id, instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+        trending.follower_added(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    fragments.bump(fragments.user_name(instance.author_id),
+                   fragments.user_name(instance.user_id))
+    graph.removed(instance.user_id, instance.author_id)
+    timeline.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_migrate)
+def index_existing_posts(sender, plan=None, using="default", **kwargs):
+    # индекс строится здесь, а не в миграции 0013_search: код стеммера и
+    # веса полей меняются, а миграция должна оставаться прежней
+    if sender.name != "posts" or not plan:
+        return
+    if any(migration.app_label == "posts"
+           and migration.name == "0013_search" and not backwards
+           for migration, backwards in plan):
+        with transaction.atomic(using=using):
+            search.rebuild()
@@ -0,0 +1,98 @@
+"""Разбор текста для поискового индекса.
+
+Текст разбивается на слова, служебные слова отбрасываются, а русские
+слова приводятся к основе стеммером Snowball (алгоритм Портера для
+русского языка), чтобы «котики», «котиков» и «котик» находились по
+любой из форм.
+"""
+import re
+
+WORD = re.compile(r"\w+")
+CYRILLIC = re.compile(r"[а-я]")
+VOWEL = re.compile(r"[аеиоуыэюя]")
+TERM_LENGTH = 64
+
+STOP_WORDS = frozenset("""
+    а без более бы был была были было быть в вам вас весь во вот все всё
+    всего вы где да даже для до его ее её ей если есть еще ещё же за здесь
+    и из или им их к как ко когда кто ли либо мне может мы на над нам нас
+    не него нее неё нет ни них но ну о об однако он она они оно от очень
+    по под при с со так также такой там те тем то того тоже той только
+    том ты у уж уже хотя чего чей чем что чтобы чье чья эта эти это я
+""".split())
+
+PERFECTIVE_GERUND = re.compile(
+    r"(ив|ивши|ившись|ыв|ывши|ывшись|(?<=[ая])(в|вши|вшись))$")
+REFLEXIVE = re.compile(r"(ся|сь)$")
+ADJECTIVE = re.compile(
+    r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых"
+    r"|ую|юю|ая|яя|ою|ею)$")
+PARTICIPLE = re.compile(r"(ивш|ывш|ующ|(?<=[ая])(ем|нн|вш|ющ|щ))$")
+VERB = re.compile(
+    r"(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено"
+    r"|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю"
+    r"|(?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно))$")
+NOUN = re.compile(
+    r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем"
+    r"|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$")
+DERIVATIONAL = re.compile(r"ость?$")
+SUPERLATIVE = re.compile(r"(ейше|ейш)$")
+
+
+def _strip(pattern, word):
+    """Отрезает окончание, если оно есть; возвращает слово и признак."""
+    match = pattern.search(word)
+    if match is None:
+        return word, False
+    return word[:match.start()], True
+
+
+def _region(word, start=0):
+    """Начало области R1 (R2 при ``start`` = R1): позиция после первой
+    согласной, которая идёт за гласной."""
+    match = re.search(r"[аеиоуыэюя][^аеиоуыэюя]", word[start:])
+    return len(word) if match is None else start + match.end()
+
+
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    match = VOWEL.search(word)
+    if match is None:
+        return word
+    head, rv = word[:match.end()], word[match.end():]
+
+    rv, found = _strip(PERFECTIVE_GERUND, rv)
+    if not found:
+        rv, _ = _strip(REFLEXIVE, rv)
+        rv, found = _strip(ADJECTIVE, rv)
+        if found:
+            rv, _ = _strip(PARTICIPLE, rv)
+        else:
+            rv, found = _strip(VERB, rv)
+            if not found:
+                rv, _ = _strip(NOUN, rv)
+
+    rv, _ = _strip(re.compile(r"и$"), rv)
+
+    word = head + rv
+    match = DERIVATIONAL.search(rv)
+    if match is not None and len(head) + match.start() >= _region(
+            word, _region(word)):
+        rv = rv[:match.start()]
+
+    rv, found = _strip(SUPERLATIVE, rv)
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    elif not found and rv.endswith("ь"):
+        rv = rv[:-1]
+    return head + rv
+
+
+def terms(text):
+    """Поисковые термины текста в порядке появления, с повторами."""
+    for word in WORD.findall(text.lower().replace("ё", "е")):
+        if word in STOP_WORDS:
+            continue
+        if CYRILLIC.search(word):
+            word = stem(word)
+        yield word[:TERM_LENGTH]
@@ -0,0 +1,28 @@
+from django import template
+
+from posts import fragments, recommendations, thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, page, feed=None, feed_id=None, separator=""):
+    """Карточки постов страницы: {% post_cards page "group" group.pk %}."""
+    if feed is not None and feed_id is not None:
+        feed = f"{feed}:{feed_id}"
+    return fragments.render_feed_page(context, page, feed, separator)
+
+
+@register.inclusion_tag("post_image.html")
+def post_image(post, alias):
+    """Картинка поста: {% post_image post "card" %}, см.
+    ``thumbnails.image_attrs``."""
+    return thumbnails.image_attrs(post, alias)
+
+
+@register.inclusion_tag("who_to_follow.html")
+def who_to_follow(user):
+    """Кого почитать: {% who_to_follow user %}, см. posts.recommendations."""
+    if not user.is_authenticated:
+        return {}
+    return {"suggestions": recommendations.for_user(user.pk)}
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+
+from posts import benchmark
+from posts.seed import seed
+
+
+class BenchmarkTests(TestCase):
+    def test_percentile(self):
+        """Перцентиль считается методом ближайшего ранга."""
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
+
+    def test_regressions(self):
+        """Замедление, лишние запросы и смена кода ответа - регрессии."""
+        base = {"index": {"p95_ms": 10, "queries": 2, "status": [200]},
+                "post": {"p95_ms": 10, "queries": 3, "status": [200]}}
+        results = {"index": {"p95_ms": 11, "queries": 2, "status": [200]},
+                   "post": {"p95_ms": 13, "queries": 4, "status": [404]}}
+        found = benchmark.regressions(results, base, tolerance=0.2)
+        self.assertEqual(len(found), 3)
+        self.assertTrue(all(line.startswith("post:") for line in found))
+        self.assertEqual(benchmark.regressions(results, {}), [])
+
+    def test_command_covers_every_view(self):
+        """Команда прогоняет все адреса и сравнивает результат с эталоном."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, "benchmark.json")
+        sizes = ["--users", "20", "--groups", "2", "--posts", "60",
+                 "--comments", "60", "--follows", "60", "--requests", "2"]
+        call_command("benchmark", *sizes, "--output", output,
+                     stdout=StringIO())
+        with open(output) as report:
+            views = json.load(report)["views"]
+        names = {scenario.split()[0] for scenario in views}
+        self.assertEqual(names, {
+            "index", "group_posts", "search", "trending", "new_post",
+            "follow_index",
+            "profile", "post", "post_comments", "post_edit", "add_comment",
+            "profile_follow", "profile_unfollow"})
+        for row in views.values():
+            self.assertLess(max(row["status"]), 400)
+            row["queries"] = 0
+        baseline = output + ".base"
+        with open(baseline, "w") as base:
+            json.dump({"views": views}, base)
+        with self.assertRaises(CommandError):
+            call_command("benchmark", *sizes, "--output", output,
+                         "--baseline", baseline,
+                         stdout=StringIO())
+
+
+class ConcurrentBenchmarkTests(TransactionTestCase):
+    def test_requests_are_split_between_threads(self):
+        """Параллельный прогон делит запросы между потоками и считает
+        пропускную способность."""
+        seed(users=10, groups=2, posts=30, comments=30, follows=30)
+        views, throughput = benchmark.run(requests=3, warmup=0,
+                                          concurrency=2)
+        self.assertGreater(throughput, 0)
+        for name, row in views.items():
+            with self.subTest(view=name):
+                self.assertEqual(row["requests"], 3)
+
+    def test_concurrency_needs_saved_data(self):
+        """Потоки не видят данных в транзакции, поэтому нужен --keep."""
+        with self.assertRaises(CommandError):
+            call_command("benchmark", "--concurrency", "2",
+                         stdout=StringIO())
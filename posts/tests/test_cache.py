@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from yatube import settings as project_settings
+from yatube.cache import FallbackCache, get_or_compute
+
+LOCMEM = "django.core.cache.backends.locmem.LocMemCache"
+
+
+def make_cache(primary):
+    return FallbackCache("", {"OPTIONS": {
+        "PRIMARY": primary,
+        "FALLBACK": {"BACKEND": LOCMEM, "LOCATION": "fallback"},
+        "RETRY_INTERVAL": 0,
+    }})
+
+
+class FallbackCacheTests(SimpleTestCase):
+
+    def test_configured_primary_backend_resolves(self):
+        """Основной бэкенд из настроек проекта импортируется и создаётся."""
+        primary = project_settings.CACHES["default"]["OPTIONS"]["PRIMARY"]
+        shared = make_cache(primary)
+        self.assertEqual(type(shared._primary).__name__, "MemcachedCache")
+
+    def test_misconfigured_primary_fails_loudly(self):
+        """Опечатка в бэкенде - ошибка, а не тихий переход на замену."""
+        with self.assertRaises(ImportError):
+            make_cache({"BACKEND": "django.core.cache.backends.memcached."
+                                   "MemcacheCache",
+                        "LOCATION": "127.0.0.1:1"})
+
+    def test_unavailable_memcached_uses_fallback(self):
+        """Без сервера memcached кэш работает на запасном бэкенде."""
+        shared = make_cache({
+            "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+            "LOCATION": "127.0.0.1:1"})
+        with self.assertLogs("yatube.cache", "WARNING"):
+            shared.set("key", "value")
+        self.assertEqual(shared.get("key"), "value")
+        self.assertTrue(shared._down)
+
+    def test_switches_to_fallback_and_back(self):
+        """При недоступном сервере кэш переходит на запасной, а после
+        восстановления очищает основной и возвращается к нему."""
+        shared = make_cache({"BACKEND": LOCMEM, "LOCATION": "primary"})
+        shared.set("gen", 1)
+        with mock.patch.object(shared, "_alive", return_value=False):
+            shared.set("gen", 2)
+            self.assertEqual(shared._fallback.get("gen"), 2)
+        self.assertIsNone(shared.get("gen"))
+        self.assertFalse(shared._down)
+
+    def test_primary_errors_go_to_fallback(self):
+        """Ошибка основного сервера не доходит до представления."""
+        shared = make_cache({"BACKEND": LOCMEM, "LOCATION": "broken"})
+        with mock.patch.object(shared._primary, "get",
+                               side_effect=ConnectionError):
+            shared._fallback.set("key", "value")
+            self.assertEqual(shared.get("key"), "value")
+        self.assertTrue(shared._down)
+
+
+class GetOrComputeTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_only_lock_holder_recomputes(self):
+        """Пока значение пересчитывает другой процесс, отдаётся старое."""
+        compute = mock.Mock(return_value="new")
+        get_or_compute("hot", lambda: "old", version=1)
+        cache.add("hot:lock", 1)
+        self.assertEqual(get_or_compute("hot", compute, version=2), "old")
+        compute.assert_not_called()
+        cache.delete("hot:lock")
+        self.assertEqual(get_or_compute("hot", compute, version=2), "new")
+        self.assertEqual(get_or_compute("hot", compute, version=2), "new")
+        compute.assert_called_once()
+
+    def test_waits_for_missing_value(self):
+        """Без старого значения ждёт пересчёта и потом считает сам."""
+        cache.add("cold:lock", 1)
+        value = get_or_compute("cold", lambda: "value", wait=0.1)
+        self.assertEqual(value, "value")
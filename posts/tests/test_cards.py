@@ -0,0 +1,98 @@
+import re
+
+from django.core.cache import cache
+from django.template import engines
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import benchmark, cards, thumbnails
+from posts.models import Group, Post, User
+from yatube import templates
+
+
+def normalize(html):
+    """Разметка без комментариев и пробелов вокруг тегов."""
+    html = re.sub(r"<!--.*?-->", "", html, flags=re.S)
+    html = re.sub(r"\s*(<[^>]*>)\s*", r"\1", html)
+    return re.sub(r"\s+", " ", html).strip()
+
+
+class PythonCardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="writer")
+        cls.reader = User.objects.create(username="reader")
+        cls.group = Group.objects.create(title="Кошки & <собаки>",
+                                         slug="pets")
+        cls.posts = [
+            Post.objects.create(text="Простой пост", author=cls.author),
+            Post.objects.create(
+                text="Первая строка\nвторая <b>не жирная</b> & «кавычки»",
+                author=cls.author, group=cls.group, comment_count=3),
+            Post.objects.create(text="С картинкой", author=cls.author,
+                                image="posts/picture.webp",
+                                image_width=800, image_height=600),
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def render_template(self, post, user):
+        template = engines["django"].get_template("post_item.html")
+        return template.render({"post": post, "user": user})
+
+    def assertSameCards(self):
+        for post in Post.objects.for_feed():
+            for user in (None, self.reader, self.author):
+                with self.subTest(post=post.text, user=user):
+                    self.assertEqual(
+                        normalize(cards.render_card(post, user)),
+                        normalize(self.render_template(post, user)))
+
+    def test_python_card_matches_template(self):
+        """Карточка из posts.cards совпадает с post_item.html."""
+        self.assertSameCards()
+
+    def test_python_card_matches_template_with_thumbnails(self):
+        """Совпадают и карточки с готовыми миниатюрами и srcset."""
+        name = self.posts[2].image.name
+        cache.set_many({thumbnails.url_key(name, alias): f"/media/{alias}.jpg"
+                        for alias in ("card", "card_small")}, None)
+        self.assertIn("srcset", cards.render_card(self.posts[2]))
+        self.assertSameCards()
+
+    def test_feeds_render_same_cards_with_either_renderer(self):
+        """Лента выглядит одинаково с любым POST_CARD_RENDERER."""
+        client = Client()
+        client.force_login(self.author)
+        pages = {}
+        for renderer in ("python", "template"):
+            cache.clear()
+            with override_settings(POST_CARD_RENDERER=renderer):
+                response = client.get(reverse("index"))
+            pages[renderer] = normalize(response.content.decode())
+        self.assertEqual(pages["python"], pages["template"])
+        self.assertIn(reverse("post_edit", args=["writer", self.posts[0].pk]),
+                      pages["python"])
+
+
+class TemplatePreloadTests(TestCase):
+    def test_preload_fills_cached_loader(self):
+        """После preload шаблоны берутся из кэша загрузчика."""
+        loader = engines["django"].engine.template_loaders[0]
+        loader.reset()
+        self.assertEqual(templates.preload(["index.html", "post_item.html"]),
+                         2)
+        self.assertIn("index.html", loader.get_template_cache)
+        self.assertIn("post_item.html", loader.get_template_cache)
+
+    def test_benchmark_compares_renderers(self):
+        """Замер показывает время страницы для каждого способа."""
+        author = User.objects.create(username="writer")
+        Post.objects.create(text="Пост", author=author)
+        results = benchmark.card_rendering(pages=2)
+        self.assertEqual(set(results),
+                         {"template", "cached template", "python"})
+        self.assertLess(results["python"]["bytes"],
+                        results["template"]["bytes"])
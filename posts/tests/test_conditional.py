@@ -0,0 +1,194 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="writer")
+        cls.reader = User.objects.create(username="reader")
+        cls.group = Group.objects.create(
+            title="Тест тайтл",
+            description="Тестовое описание",
+            slug="test-slug")
+        cls.post = Post.objects.create(text="Тестовый текст",
+                                       author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def revalidate(self, url, response, client=None):
+        return (client or self.guest_client).get(
+            url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_feed_is_not_modified(self):
+        """Повторный запрос неизменной ленты получает 304 без SQL."""
+        url = reverse("index")
+        response = self.guest_client.get(url)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertTrue(response.has_header("Last-Modified"))
+        with self.assertNumQueries(0):
+            repeated = self.revalidate(url, response)
+        self.assertEqual(repeated.status_code, 304)
+        repeated = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(repeated.status_code, 304)
+
+    def test_new_post_changes_validators(self):
+        """Новый пост меняет ETag ленты."""
+        url = reverse("index")
+        response = self.guest_client.get(url)
+        Post.objects.create(text="Ещё пост", author=self.author)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_object_pages_after_first_visit(self):
+        """Страницы сообщества, профиля и поста получают валидаторы, когда
+        id объекта известен, и меняют их вместе с данными."""
+        post_url = reverse("post", args=[self.author.username, self.post.pk])
+        for url in (reverse("group_posts", args=[self.group.slug]),
+                    reverse("profile", args=[self.author.username]),
+                    post_url):
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                response = self.guest_client.get(url)
+                self.assertEqual(
+                    self.revalidate(url, response).status_code, 304)
+        response = self.guest_client.get(post_url)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text="Комментарий")
+        self.assertEqual(self.revalidate(post_url, response).status_code,
+                         200)
+
+    def test_follow_changes_profile(self):
+        """Подписка меняет ETag профиля: там счётчики и кнопка."""
+        url = reverse("profile", args=[self.author.username])
+        self.reader_client.get(url)
+        response = self.reader_client.get(url)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertFalse(response.has_header("Last-Modified"))
+        Follow.objects.create(user=self.reader, author=self.author)
+        repeated = self.revalidate(url, response, self.reader_client)
+        self.assertEqual(repeated.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        """Анонимная версия страницы не подходит вошедшему пользователю."""
+        url = reverse("index")
+        response = self.guest_client.get(url)
+        repeated = self.revalidate(url, response, self.reader_client)
+        self.assertEqual(repeated.status_code, 200)
+
+    def test_etag_changes_after_login(self):
+        """После выхода и входа CSRF-токен новый, и страница с формой
+        комментария отдаётся заново, а не через 304."""
+        # копия, чтобы не менять хэш пароля у общего для тестов объекта
+        reader = User.objects.get(pk=self.reader.pk)
+        reader.set_password("password")
+        reader.save()
+        client = Client()
+        credentials = {"username": "reader", "password": "password"}
+        client.post(reverse("login"), credentials)
+        url = reverse("post", args=[self.author.username, self.post.pk])
+        client.get(url)
+        response = client.get(url)
+        self.assertEqual(self.revalidate(url, response, client).status_code,
+                         304)
+        client.post(reverse("logout"))
+        client.post(reverse("login"), credentials)
+        repeated = self.revalidate(url, response, client)
+        self.assertEqual(repeated.status_code, 200)
+        self.assertNotEqual(repeated["ETag"], response["ETag"])
+
+    def test_renamed_user_frees_old_address(self):
+        """После смены имени старый адрес не отдаёт прежний профиль, а
+        новый владелец имени получает свою страницу."""
+        old_url = reverse("profile", args=["writer"])
+        # первый визит запоминает id, второй получает валидаторы
+        self.guest_client.get(old_url)
+        response = self.guest_client.get(old_url)
+        author = User.objects.get(pk=self.author.pk)
+        author.username = "renamed"
+        author.save()
+        self.assertEqual(self.revalidate(old_url, response).status_code, 404)
+        newcomer = User.objects.create(username="writer")
+        repeated = self.revalidate(old_url, response)
+        self.assertEqual(repeated.status_code, 200)
+        self.assertEqual(repeated.context["author"], newcomer)
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="writer")
+        cls.other = User.objects.create(username="other")
+        cls.group = Group.objects.create(title="Первая", slug="first",
+                                         description="Описание")
+        cls.other_group = Group.objects.create(
+            title="Вторая", slug="second", description="Описание")
+        cls.post = Post.objects.create(text="Тестовый текст",
+                                       author=cls.author, group=cls.group)
+        Post.objects.create(text="Чужой пост", author=cls.other,
+                            group=cls.other_group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.urls = {
+            "index": reverse("index"),
+            "group": reverse("group_posts", args=[self.group.slug]),
+            "other_group": reverse("group_posts",
+                                   args=[self.other_group.slug]),
+            "profile": reverse("profile", args=[self.author.username]),
+            "other_profile": reverse("profile", args=[self.other.username]),
+            "post": reverse("post", args=[self.author.username,
+                                          self.post.pk]),
+        }
+        # первый визит запоминает id объектов, второй кладёт страницу
+        for url in self.urls.values():
+            self.guest_client.get(url)
+            self.guest_client.get(url)
+
+    def test_cached_pages_skip_queries(self):
+        """Повторный показ страницы анониму не обращается к базе."""
+        for url in self.urls.values():
+            with self.subTest(url=url), self.assertNumQueries(0):
+                response = self.guest_client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_page_and_cursor_vary(self):
+        """Номер страницы и курсор - разные записи кэша, прочие
+        параметры адреса кэш не дробят."""
+        url = self.urls["index"]
+        with self.assertNumQueries(0):
+            self.guest_client.get(url + "?utm_source=mail")
+        response = self.guest_client.get(url + "?page=2")
+        self.assertEqual(response.context["page"].number, 1)
+
+    def test_logged_in_and_csrf_cookie_bypass(self):
+        """Вошедшим и запросам с CSRF-cookie кэш страниц не отдаётся."""
+        self.guest_client.cookies["csrftoken"] = "token"
+        response = self.guest_client.get(self.urls["index"])
+        self.assertIsNotNone(response.context)
+        self.client.force_login(self.other)
+        response = self.client.get(self.urls["index"])
+        self.assertEqual(response.context["user"], self.other)
+
+    def test_write_purges_only_affected_pages(self):
+        """Новый комментарий сбрасывает ленты с постом и его страницу, но
+        не чужие профиль и сообщество."""
+        Comment.objects.create(post=self.post, author=self.other,
+                               text="Комментарий")
+        for name in ("index", "group", "profile", "post"):
+            with self.subTest(page=name):
+                response = self.guest_client.get(self.urls[name])
+                self.assertIsNotNone(response.context)
+        for name in ("other_group", "other_profile"):
+            with self.subTest(page=name), self.assertNumQueries(0):
+                self.guest_client.get(self.urls[name])
@@ -0,0 +1,67 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="reader")
+        cls.author = User.objects.create(username="writer")
+        cls.post = Post.objects.create(text="Тестовый текст",
+                                       author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_follow_and_unfollow_update_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        self.authorized_client.get(
+            reverse("profile_follow", args=[self.author.username]))
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        self.authorized_client.get(
+            reverse("profile_unfollow", args=[self.author.username]))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+
+    def test_comment_updates_post_counter(self):
+        """Комментарий увеличивает счётчик поста, удаление уменьшает."""
+        self.authorized_client.post(
+            reverse("add_comment", args=[self.author.username,
+                                         self.post.id]),
+            {"text": "Комментарий"})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        Comment.objects.all().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_post_counter(self):
+        """Публикация и удаление поста меняют счётчик автора."""
+        post = Post.objects.create(text="Ещё пост", author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_rebuild_counters_fixes_drift(self):
+        """Команда rebuild_counters исправляет разошедшиеся счётчики."""
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=7)
+        UserStats.objects.filter(user=self.user).delete()
+        out = StringIO()
+        call_command("rebuild_counters", stdout=out)
+        self.assertIn("posts: 1", out.getvalue())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertTrue(UserStats.objects.filter(user=self.user).exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
@@ -68,10 +68,13 @@ class PostFormTests(TestCase):
         )
         self.assertRedirects(response, reverse("index"))
         self.assertEqual(Post.objects.count(), self.count + 1)
+        # картинка пересохраняется в WebP с записанными размерами
         self.assertTrue(Post.objects.filter(
             text="Текст",
             group=self.group.id,
-            image="posts/small.gif").exists())
+            image="posts/small.webp",
+            image_width=2,
+            image_height=1).exists())
 
     def test_edit_existing_post(self):
         """Валидная форма редактирует пост."""
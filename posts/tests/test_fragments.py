@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="writer")
+        cls.group = Group.objects.create(
+            title="Тест тайтл",
+            description="Тестовое описание",
+            slug="test-slug")
+        cls.post = Post.objects.create(text="Тестовый текст",
+                                       author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_anonymous_feed_page_skips_queries(self):
+        """Повторный показ ленты аноним не запрашивает посты."""
+        url = reverse("group_posts", args=[self.group.slug])
+        self.guest_client.get(url)
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(url)
+        self.assertContains(response, "Тестовый текст")
+
+    def test_comment_invalidates_card(self):
+        """Новый комментарий сразу меняет карточку во всех лентах."""
+        self.guest_client.get(reverse("index"))
+        Comment.objects.create(post=self.post, author=self.author,
+                               text="Комментарий")
+        for url in (reverse("index"),
+                    reverse("group_posts", args=[self.group.slug]),
+                    reverse("profile", args=[self.author.username])):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, "Комментариев: 1")
+
+    def test_group_rename_invalidates_cards(self):
+        """Переименование группы меняет карточки её постов."""
+        self.guest_client.get(reverse("index"))
+        self.group.title = "Новое название"
+        self.group.save()
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, "#Новое название")
+
+    def test_edit_button_is_not_shared(self):
+        """Кнопка редактирования из карточки автора не видна другим."""
+        edit_url = reverse("post_edit",
+                           args=[self.author.username, self.post.id])
+        response = self.author_client.get(reverse("index"))
+        self.assertContains(response, edit_url)
+        response = self.guest_client.get(reverse("index"))
+        self.assertNotContains(response, edit_url)
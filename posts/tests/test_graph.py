@@ -0,0 +1,95 @@
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import graph
+from posts.models import Follow, User
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [User.objects.create(username=f"user{index}")
+                     for index in range(5)]
+        first, second, third, fourth, fifth = cls.users
+        for user, author in ((first, second), (first, third),
+                             (second, first), (second, fourth),
+                             (third, fourth), (third, fifth)):
+            Follow.objects.create(user=user, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def follow_queries(self, function, *args):
+        """Результат ``function`` и число запросов к таблице подписок."""
+        with CaptureQueriesContext(connection) as queries:
+            result = function(*args)
+        table = Follow._meta.db_table
+        return result, sum(table in query["sql"] for query in queries)
+
+    def test_lists_are_sorted_and_cached(self):
+        """Списки подписок читаются из базы один раз."""
+        first, second, third, *_ = self.users
+        ids, queries = self.follow_queries(graph.following, first.pk)
+        self.assertEqual(list(ids), sorted([second.pk, third.pk]))
+        self.assertEqual(queries, 1)
+        result, queries = self.follow_queries(
+            graph.is_following, first.pk, third.pk)
+        self.assertTrue(result)
+        self.assertEqual(queries, 0)
+        self.assertFalse(graph.is_following(third.pk, first.pk))
+        self.assertEqual(list(graph.followers(self.users[3].pk)),
+                         sorted([second.pk, third.pk]))
+
+    def test_mutual(self):
+        """Взаимные подписки - пересечение двух списков."""
+        first, second, *_ = self.users
+        self.assertEqual(graph.mutual(first.pk), [second.pk])
+
+    def test_follow_changes_reset_cached_lists(self):
+        """Подписка и отписка сбрасывают списки в кэше, и следующее
+        чтение берёт их из базы один раз."""
+        first, _, _, fourth, _ = self.users
+        graph.following(first.pk)
+        graph.followers(fourth.pk)
+        graph.follow(first.pk, fourth.pk)
+        result, queries = self.follow_queries(
+            graph.is_following, first.pk, fourth.pk)
+        self.assertTrue(result)
+        self.assertEqual(queries, 1)
+        self.assertEqual(self.follow_queries(
+            graph.is_following, first.pk, fourth.pk)[1], 0)
+        self.assertIn(first.pk, graph.followers(fourth.pk))
+        graph.unfollow(first.pk, fourth.pk)
+        self.assertFalse(graph.is_following(first.pk, fourth.pk))
+        self.assertNotIn(first.pk, graph.followers(fourth.pk))
+
+    def test_rollback_leaves_no_edge(self):
+        """Подписка в откатившейся транзакции не остаётся в кэше."""
+        first, _, _, fourth, _ = self.users
+        graph.following(first.pk)
+        graph.followers(fourth.pk)
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                graph.follow(first.pk, fourth.pk)
+                raise DatabaseError
+        self.assertFalse(graph.is_following(first.pk, fourth.pk))
+        self.assertNotIn(first.pk, graph.followers(fourth.pk))
+
+    def test_pages_do_not_query_follow(self):
+        """Профиль и пост показывают кнопку подписки по графу в кэше."""
+        first, second, *_ = self.users
+        client = Client()
+        client.force_login(first)
+        graph.following(first.pk)
+        urls = [reverse("profile", args=[second.username])]
+        post = second.posts.create(text="Пост")
+        urls.append(reverse("post", args=[second.username, post.pk]))
+        for url in urls:
+            with self.subTest(url=url):
+                response, queries = self.follow_queries(client.get, url)
+                self.assertEqual(queries, 0)
+                self.assertContains(response, "Отписаться")
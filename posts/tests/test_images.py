@@ -0,0 +1,108 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import benchmark, images, thumbnails
+from posts.forms import PostForm
+from posts.models import Post, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_photo(size=(3000, 1000), orientation=None):
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = "Camera"  # Make
+    if orientation is not None:
+        exif[0x0112] = orientation
+    Image.new("RGB", size, "green").save(buffer, "JPEG", exif=exif)
+    return SimpleUploadedFile("photo.jpg", buffer.getvalue(),
+                              content_type="image/jpeg")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_MAX_SIDE=1000,
+                   IMAGE_FORMAT="WEBP")
+class ImageProcessingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username="writer")
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_process_caps_and_reencodes(self):
+        """Картинка уменьшается, пересохраняется в WebP без EXIF и
+        поворачивается по EXIF."""
+        result, width, height = images.process(make_photo(orientation=6))
+        self.assertEqual((width, height), (333, 1000))
+        self.assertEqual(result.name, "photo.webp")
+        with Image.open(result) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertEqual(image.size, (333, 1000))
+            self.assertNotIn("exif", image.info)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=100)
+    def test_large_file_is_rejected(self):
+        """Слишком большой файл отклоняется формой ещё до того, как его
+        откроет Pillow."""
+        form = PostForm(data={"text": "Пост"},
+                        files={"image": make_photo()})
+        with mock.patch("PIL.Image.open") as image_open:
+            self.assertFalse(form.is_valid())
+        image_open.assert_not_called()
+        self.assertEqual(form.errors.as_data()["image"][0].code,
+                         "file_too_large")
+
+    def test_truncated_image_is_rejected(self):
+        """Обрезанный JPEG проходит verify(), но форма отклоняет его без
+        ошибки сервера."""
+        photo = make_photo().read()
+        truncated = SimpleUploadedFile("photo.jpg", photo[:len(photo) // 2],
+                                       content_type="image/jpeg")
+        response = self.client.post(reverse("new_post"),
+                                    {"text": "Пост", "image": truncated})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context["form"].errors.as_data()["image"][0].code,
+            "invalid_image")
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_large_image_is_rejected(self):
+        """Картинка с лишними мегапикселями отклоняется до декодирования."""
+        form = PostForm(data={"text": "Пост"},
+                        files={"image": make_photo()})
+        self.assertFalse(form.is_valid())
+
+    def test_card_has_dimensions_and_srcset(self):
+        """Карточка получает размеры без открытия файла, а после нарезки -
+        srcset из миниатюр."""
+        self.client.post(reverse("new_post"),
+                         {"text": "Пост", "image": make_photo()})
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (1000, 333))
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, 'width="1000" height="333"')
+        thumbnails.generate(post.image.name)
+        post.save()  # сбрасывает кэш карточки
+        response = self.client.get(reverse("index"))
+        small = thumbnails.get_url(post.image.name, "card_small")
+        self.assertContains(response, f'srcset="{small} 480w, ')
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_benchmark_shows_smaller_files(self):
+        """Обработанный снимок меньше исходного."""
+        results = benchmark.image_pipeline(count=1, size=(2000, 1500))
+        self.assertLess(results["processed"]["bytes"],
+                        results["original"]["bytes"])
@@ -0,0 +1,18 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Post
+
+
+class ExplainViewsTests(TestCase):
+
+    def test_view_queries_use_indexes(self):
+        """Запросы представлений не сканируют таблицы и не сортируют
+        во временных таблицах, а сгенерированные данные откатываются."""
+        out = StringIO()
+        call_command("explain_views", users=30, posts=300, comments=300,
+                     follows=100, stdout=out)
+        self.assertNotIn("FAIL", out.getvalue())
+        self.assertFalse(Post.objects.exists())
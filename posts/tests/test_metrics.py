@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.template import Template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from yatube import metrics
+
+User = get_user_model()
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.author = User.objects.create(username="writer")
+        Post.objects.create(text="Текст", author=self.author)
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        self.guest_client = Client()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_views_are_measured(self):
+        """Запросы попадают в гистограммы своего представления."""
+        self.guest_client.get(reverse("index"))
+        self.guest_client.get(reverse("index"))
+        self.guest_client.get(reverse("profile", args=["writer"]))
+        duration = metrics.registry["duration"].series
+        self.assertEqual(duration["index"][2], 2)
+        self.assertEqual(duration["profile"][2], 1)
+        queries = metrics.registry["queries"].series["profile"]
+        self.assertGreater(queries[1], 0)
+        self.assertGreater(metrics.registry["templates"].series["index"][1],
+                           0)
+        cache = metrics.registry["cache"].series
+        self.assertIn((("result", "hit"), ("view", "index")), cache)
+
+    def test_template_class_is_not_patched(self):
+        """Время шаблонов замеряет бэкенд, а класс Template Django
+        остаётся нетронутым."""
+        self.assertEqual(Template.render.__module__, "django.template.base")
+        self.guest_client.get(reverse("index"))
+        self.assertEqual(
+            metrics.registry["templates"].series["index"][2], 1)
+
+    def test_stats_endpoint_is_staff_only(self):
+        """Метрики в формате Prometheus видны только сотрудникам."""
+        self.guest_client.get(reverse("index"))
+        response = self.guest_client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 302)
+        response = self.staff_client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response, 'yatube_request_duration_seconds_count{view="index"} 1')
+        self.assertContains(
+            response, 'yatube_requests_total{status="200",view="index"} 1')
+
+    @override_settings(METRICS_SLOW_SAMPLE=1)
+    def test_slow_requests_are_logged_with_sql(self):
+        """В режиме выборки медленный запрос пишется в лог вместе с SQL."""
+        with self.assertLogs("yatube.metrics", "WARNING") as logs:
+            self.guest_client.get(reverse("profile", args=["writer"]))
+        self.assertIn("SELECT", logs.output[0])
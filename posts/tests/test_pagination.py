@@ -0,0 +1,156 @@
+import base64
+import datetime as dt
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post, User
+from posts.pagination import (NEXT, PREVIOUS, KeysetPaginator,
+                              comment_batch, encode_cursor)
+
+
+def raw_cursor(direction, pub_date, pk):
+    """Курсор с произвольным содержимым, как его может собрать краулер."""
+    raw = json.dumps([direction, pub_date, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="test_user")
+        Post.objects.bulk_create(
+            Post(text=f"Пост {i}", author=cls.user) for i in range(13))
+        cls.posts = list(Post.objects.all())
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def get_page(self, query):
+        response = self.guest_client.get(reverse("index") + query)
+        return response.context["page"]
+
+    def test_cursor_walks_whole_feed(self):
+        """Курсор проходит ленту вперёд и назад без пропусков."""
+        first = self.get_page("?cursor=")
+        self.assertEqual(list(first), self.posts[:10])
+        self.assertFalse(first.has_previous())
+        second = self.get_page(f"?cursor={first.next_cursor}")
+        self.assertEqual(list(second), self.posts[10:])
+        self.assertFalse(second.has_next())
+        back = self.get_page(f"?cursor={second.previous_cursor}")
+        self.assertEqual(list(back), self.posts[:10])
+
+    def test_cursor_page_does_not_count(self):
+        """Курсорная страница обходится одним запросом к постам."""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1):
+            page = paginator.get_page(encode_cursor(self.posts[4]))
+        self.assertEqual(list(page), self.posts[5:])
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        page = self.get_page("?cursor=garbage")
+        self.assertEqual(list(page), self.posts[:10])
+
+    def test_garbage_pk_returns_first_page(self):
+        """Курсор с нечисловым или слишком большим id открывает первую
+        страницу."""
+        date = self.posts[0].pub_date.isoformat()
+        for pk in ("abc", None, [1], 10 ** 30, -1):
+            with self.subTest(pk=pk):
+                page = self.get_page(f"?cursor={raw_cursor(NEXT, date, pk)}")
+                self.assertEqual(list(page), self.posts[:10])
+
+    def test_cursor_past_the_end_gives_empty_page(self):
+        """Курсор за концом ленты даёт пустую страницу без ссылок на
+        профиле и на главной в обе стороны."""
+        past = (self.posts[-1].pub_date - dt.timedelta(days=1)).isoformat()
+        future = (self.posts[0].pub_date + dt.timedelta(days=1)).isoformat()
+        urls = [reverse("index"),
+                reverse("profile", args=[self.user.username])]
+        cursors = [raw_cursor(NEXT, past, 1), raw_cursor(PREVIOUS, future, 1)]
+        for url in urls:
+            for cursor in cursors:
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.guest_client.get(f"{url}?cursor={cursor}")
+                    self.assertEqual(response.status_code, 200)
+                    page = response.context["page"]
+                    self.assertEqual(list(page), [])
+                    self.assertFalse(page.has_other_pages())
+                    self.assertIsNone(page.next_cursor)
+                    self.assertIsNone(page.previous_cursor)
+
+    @override_settings(PAGE_NUMBER_LIMIT=1)
+    def test_page_numbers_switch_to_cursor(self):
+        """После последней нумерованной страницы навигация идёт курсором."""
+        page = self.get_page("?page=1")
+        self.assertEqual(page.next_cursor, encode_cursor(self.posts[9]))
+        response = self.guest_client.get(reverse("index") + "?page=2")
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(COMMENTS_PER_PAGE=10)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="test_user")
+        cls.post = cls.make_post(25)
+        cls.comments = list(cls.post.comments.order_by("pk"))
+
+    @classmethod
+    def make_post(cls, comment_count):
+        post = Post.objects.create(text="Пост", author=cls.user)
+        # все комментарии с одной датой: порядок решает id
+        Comment.objects.bulk_create(
+            Comment(post=post, author=cls.user, text=f"Комментарий {i}")
+            for i in range(comment_count))
+        Post.objects.filter(pk=post.pk).update(comment_count=comment_count)
+        return Post.objects.get(pk=post.pk)
+
+    def setUp(self):
+        cache.clear()
+
+    def post_url(self, post):
+        return reverse("post", args=[self.user.username, post.pk])
+
+    def test_comments_are_loaded_in_batches(self):
+        """Страница поста показывает первую пачку, остальные подгружаются
+        по курсору."""
+        response = self.client.get(self.post_url(self.post))
+        self.assertEqual(list(response.context["comments"]),
+                         self.comments[:10])
+        url = reverse("post_comments", args=[self.user.username,
+                                             self.post.pk])
+        data = self.client.get(
+            url + "?cursor=" + response.context["next_cursor"]).json()
+        self.assertIn("Комментарий 10<", data["html"])
+        self.assertNotIn("Комментарий 9<", data["html"])
+        data = self.client.get(data["next_url"]).json()
+        self.assertIn("Комментарий 24<", data["html"])
+        self.assertIsNone(data["next"])
+
+    def test_last_full_batch_has_no_cursor(self):
+        """Пачка ровно до последнего комментария не даёт курсора."""
+        batch, cursor = comment_batch(
+            self.post.comments.all(),
+            encode_cursor(self.comments[14], field="created"))
+        self.assertEqual(list(batch), self.comments[15:25])
+        self.assertIsNone(cursor)
+
+    def test_post_page_queries_do_not_depend_on_comments(self):
+        """Число запросов страницы поста не зависит от числа
+        комментариев."""
+        queries = []
+        for post in (self.post, self.make_post(300)):
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(self.post_url(post))
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.tests.utils import QueryCountMixin
+
+
+class FeedQueriesTests(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="reader")
+        cls.author = User.objects.create(username="writer")
+        cls.group = Group.objects.create(
+            title="Тест тайтл",
+            description="Тестовое описание",
+            slug="test-slug")
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for i in range(12):
+            post = Post.objects.create(text=f"Пост {i}", author=cls.author,
+                                       group=cls.group)
+            Comment.objects.create(post=post, author=cls.user,
+                                   text="Комментарий")
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_list_views_use_constant_queries(self):
+        """Списки постов не делают запросов на каждую карточку."""
+        pages = {
+            reverse("index"): 2,
+            reverse("group_posts", args=[self.group.slug]): 3,
+            reverse("profile", args=[self.author.username]): 3,
+        }
+        for url, expected in pages.items():
+            with self.subTest(url=url):
+                self.assertViewQueries(self.guest_client, url, expected)
+
+    def test_follow_index_uses_constant_queries(self):
+        """Лента подписок не делает запросов на каждую карточку."""
+        # шестой - список «Кого почитать», пока его нет в кэше
+        self.assertViewQueries(self.authorized_client,
+                               reverse("follow_index"), 6)
+
+    def test_comment_count_comes_from_counter(self):
+        """Число комментариев берётся из счётчика поста."""
+        response = self.guest_client.get(reverse("index"))
+        post = response.context["page"][0]
+        self.assertEqual(post.comment_count, 1)
+        self.assertContains(response, "Комментариев: 1")
@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import graph, recommendations
+from posts.models import Follow, Group, Post, Suggestion, User
+
+
+@override_settings(SUGGESTION_WEIGHTS={"follow": 1, "group": 0.5})
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.friend, cls.other, cls.popular, cls.neighbour = [
+            User.objects.create(username=name)
+            for name in ("reader", "friend", "other", "popular", "neighbour")]
+        # popular читают оба, на кого подписан reader; neighbour пишет с
+        # reader в одном сообществе
+        for user, author in ((cls.reader, cls.friend),
+                             (cls.reader, cls.other),
+                             (cls.friend, cls.popular),
+                             (cls.other, cls.popular),
+                             (cls.other, cls.reader)):
+            Follow.objects.create(user=user, author=author)
+        group = Group.objects.create(title="Сообщество", slug="club")
+        for author in (cls.reader, cls.neighbour):
+            Post.objects.create(text="Пост", author=author, group=group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rank_combines_follows_and_groups(self):
+        """Общие подписки весят больше общего сообщества, себя и тех, на
+        кого уже подписан, в списке нет."""
+        following = recommendations.follow_arrays()
+        groups, members = recommendations.group_members()
+        ranked = recommendations.rank(self.reader.pk, following, groups,
+                                      members)
+        self.assertEqual(ranked, [(self.popular.pk, 2),
+                                  (self.neighbour.pk, 0.5)])
+
+    def test_rebuild_replaces_stored_rows(self):
+        """Пересчёт заменяет прежние рекомендации пользователя."""
+        Suggestion.objects.create(user=self.reader, author=self.other,
+                                  rank=0, score=10)
+        recommendations.rebuild(chunk=2)
+        stored = Suggestion.objects.filter(user=self.reader)
+        self.assertEqual(list(stored.values_list("author", "rank")),
+                         [(self.popular.pk, 0), (self.neighbour.pk, 1)])
+
+    def test_pages_read_precomputed_list(self):
+        """Список читается из кэша без запросов, а новые подписки сразу
+        убирают автора из показа."""
+        recommendations.rebuild()
+        shown = recommendations.for_user(self.reader.pk)
+        self.assertEqual([author["username"] for author in shown],
+                         ["popular", "neighbour"])
+        with self.assertNumQueries(0):
+            recommendations.for_user(self.reader.pk)
+        graph.follow(self.reader.pk, self.popular.pk)
+        self.assertEqual([author["username"] for author in
+                          recommendations.for_user(self.reader.pk)],
+                         ["neighbour"])
+
+    def test_widget_on_follow_and_own_profile(self):
+        """Виджет есть в ленте подписок и на своей странице профиля."""
+        recommendations.rebuild()
+        client = Client()
+        client.force_login(self.reader)
+        follow_url = reverse("profile_follow", args=["popular"])
+        for url in (reverse("follow_index"),
+                    reverse("profile", args=["reader"])):
+            with self.subTest(url=url):
+                self.assertContains(client.get(url), follow_url)
+        response = client.get(reverse("profile", args=["friend"]))
+        self.assertNotContains(response, "Кого почитать")
+
+    def test_rebuild_invalidates_only_own_profile(self):
+        """Пересчёт меняет ETag только своей страницы профиля, а кэш
+        страниц для остальных не сбрасывает."""
+        client = Client()
+        client.force_login(self.reader)
+        urls = {name: reverse("profile", args=[name])
+                for name in ("reader", "friend")}
+        # первый показ запоминает id пользователя по имени
+        for url in urls.values():
+            Client().get(url)
+        etags = {name: client.get(url)["ETag"] for name, url in urls.items()}
+        anonymous = Client().get(urls["friend"])["ETag"]
+        recommendations.rebuild()
+        self.assertNotEqual(client.get(urls["reader"])["ETag"],
+                            etags["reader"])
+        self.assertEqual(client.get(urls["friend"])["ETag"], etags["friend"])
+        self.assertEqual(Client().get(urls["friend"])["ETag"], anonymous)
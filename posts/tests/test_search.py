@@ -0,0 +1,129 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search, signals
+from posts.models import Comment, Group, Post, SearchTerm
+from posts.stemmer import stem, terms
+
+User = get_user_model()
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        """Формы одного слова приводятся к одной основе."""
+        self.assertEqual(stem("котики"), stem("котиков"))
+        self.assertEqual(stem("публикация"), stem("публикации"))
+
+    def test_stop_words_and_yo(self):
+        """Служебные слова отбрасываются, ё заменяется на е."""
+        self.assertEqual(list(terms("Ёжики и котики")), ["ежик", "котик"])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username="writer")
+        self.group = Group.objects.create(title="Кошки", slug="cats",
+                                          description="Про кошек")
+        self.cats = Post.objects.create(
+            text="Мои котики любят спать", author=self.author,
+            group=self.group)
+        self.dogs = Post.objects.create(
+            text="Собака и котик гуляют", author=self.author)
+        self.client = Client()
+
+    def found(self, query):
+        return [row["post"] for row in search.ranked(query)]
+
+    def test_index_follows_post_changes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        self.assertEqual(self.found("собаки"), [self.dogs.pk])
+        self.dogs.text = "Лошадь гуляет"
+        self.dogs.save()
+        self.assertEqual(self.found("собаки"), [])
+        self.assertEqual(self.found("лошади"), [self.dogs.pk])
+        self.dogs.delete()
+        self.assertEqual(self.found("лошади"), [])
+
+    def test_all_words_required_and_ranked(self):
+        """Находятся посты со всеми словами, сообщество повышает ранг."""
+        self.assertEqual(self.found("котик"), [self.cats.pk, self.dogs.pk])
+        self.assertEqual(self.found("котик собака"), [self.dogs.pk])
+        self.assertEqual(self.found("котик жираф"), [])
+        self.assertEqual(self.found("и"), [])
+
+    def test_comments_are_indexed(self):
+        """Слова комментариев находят пост и пропадают при удалении."""
+        comment = Comment.objects.create(post=self.cats, author=self.author,
+                                         text="Отличные фотографии")
+        self.assertEqual(self.found("фотография"), [self.cats.pk])
+        comment.text = "Отличное видео"
+        comment.save()
+        self.assertEqual(self.found("фотография"), [])
+        self.assertEqual(self.found("видео"), [self.cats.pk])
+        comment.delete()
+        self.assertEqual(self.found("отличный"), [])
+        self.assertTrue(SearchTerm.objects.filter(post=self.cats).exists())
+
+    def test_group_title_changes(self):
+        """Переименование и удаление сообщества меняют индекс постов."""
+        self.group.title = "Пушистики"
+        self.group.save()
+        self.assertEqual(self.found("кошки"), [])
+        self.assertEqual(self.found("пушистик"), [self.cats.pk])
+        self.group.delete()
+        self.assertEqual(self.found("пушистик"), [])
+
+    def test_delete_post_with_comments(self):
+        """Удаление поста с комментариями не оставляет записей индекса."""
+        Comment.objects.create(post=self.cats, author=self.author,
+                               text="Комментарий")
+        self.cats.delete()
+        self.assertFalse(SearchTerm.objects.filter(
+            post_id=self.cats.pk).exists())
+
+    def test_rebuild_matches_incremental_index(self):
+        """Полная перестройка даёт тот же индекс, что и сигналы."""
+        Comment.objects.create(post=self.cats, author=self.author,
+                               text="Котик спит")
+        before = set(SearchTerm.objects.values_list(
+            "post", "term", "weight"))
+        self.assertEqual(search.rebuild(), 2)
+        self.assertEqual(set(SearchTerm.objects.values_list(
+            "post", "term", "weight")), before)
+
+    def test_search_migration_indexes_existing_posts(self):
+        """После применения миграции поиска существующие посты
+        индексируются, а другие миграции индекс не трогают."""
+        SearchTerm.objects.all().delete()
+        loader = MigrationLoader(connection)
+        config = apps.get_app_config("posts")
+        earlier = loader.get_migration("posts", "0012_feed_indexes")
+        signals.index_existing_posts(config, plan=[(earlier, False)])
+        self.assertEqual(self.found("собаки"), [])
+        migration = loader.get_migration("posts", "0013_search")
+        signals.index_existing_posts(config, plan=[(migration, False)])
+        self.assertEqual(self.found("собаки"), [self.dogs.pk])
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты по рангу."""
+        response = self.client.get(reverse("search"), {"q": "котиков"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["page"]),
+                         [self.cats, self.dogs])
+        response = self.client.get(reverse("search"), {"q": "жираф"})
+        self.assertContains(response, "ничего не найдено")
+        response = self.client.get(reverse("search"))
+        self.assertIsNone(response.context["page"])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит посты по форме слова."""
+        admin = User.objects.create_superuser("admin", "a@a.ru", "pass")
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "собаки"})
+        self.assertEqual(list(response.context["cl"].result_list),
+                         [self.dogs])
@@ -0,0 +1,254 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import resolve, reverse
+
+from posts.models import Post, User
+from yatube.sqlite import replica
+from yatube.sqlite.base import Database, DatabaseWrapper, RetryingCursor
+from yatube.sqlite.routers import (READ_ALIAS, REPLICA_ALIAS, ReadOnlyRouter,
+                                   ReplicaRouter)
+
+WRITERS = 4
+READERS = 4
+TRANSACTIONS = 200
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "stress.sqlite3")
+        self.opened = []
+        writer = self.open()
+        with writer.cursor() as cursor:
+            cursor.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, "
+                           "total INTEGER NOT NULL)")
+
+    def tearDown(self):
+        for wrapper in self.opened:
+            wrapper.close()
+
+    def settings(self, **options):
+        return {**connections.databases["default"], "ENGINE": "yatube.sqlite",
+                "NAME": self.path, "OPTIONS": options}
+
+    def open(self, **options):
+        wrapper = DatabaseWrapper(self.settings(**options), alias="stress")
+        self.opened.append(wrapper)
+        return wrapper
+
+    def test_pragmas(self):
+        """Соединение включает WAL и настройки из OPTIONS."""
+        wrapper = self.open(PRAGMAS={"cache_size": -1000})
+        with wrapper.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], -1000)
+
+    def test_read_only_connection(self):
+        """Соединение с READ_ONLY читает, но не пишет."""
+        reader = self.open(READ_ONLY=True)
+        with reader.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM item")
+            self.assertEqual(cursor.fetchone()[0], 0)
+            with self.assertRaisesMessage(Exception, "readonly database"):
+                cursor.execute("INSERT INTO item (total) VALUES (1)")
+
+    def test_busy_query_is_retried(self):
+        """Запрос вне транзакции повторяется, пока база заблокирована."""
+        failures = [Database.OperationalError("database is locked")] * 2
+        wrapper = self.open(BACKOFF=0)
+        with mock.patch("django.db.backends.sqlite3.base."
+                        "SQLiteCursorWrapper.execute",
+                        side_effect=[*failures, "done"]) as execute:
+            cursor = wrapper.cursor()
+            self.assertIsInstance(cursor.cursor, RetryingCursor)
+            self.assertEqual(cursor.execute("SELECT 1"), "done")
+        self.assertEqual(execute.call_count, 3)
+
+    def write(self, errors):
+        try:
+            for _ in range(TRANSACTIONS):
+                # чтение и запись в одной транзакции: с обычным BEGIN
+                # повышение блокировки здесь и падает
+                with transaction.atomic(using="stress"):
+                    with connections["stress"].cursor() as cursor:
+                        cursor.execute("SELECT count(*) FROM item")
+                        total = cursor.fetchone()[0]
+                        cursor.execute("INSERT INTO item (total) "
+                                       "VALUES (%s)", [total])
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connections["stress"].close()
+
+    def read(self, errors, done):
+        # соединение принадлежит потоку, который его открыл
+        wrapper = DatabaseWrapper(self.settings(READ_ONLY=True),
+                                  alias="stress")
+        try:
+            while not done.is_set():
+                with wrapper.cursor() as cursor:
+                    cursor.execute("SELECT max(total) FROM item")
+        except Exception as error:
+            errors.append(error)
+        finally:
+            wrapper.close()
+
+    def test_concurrent_reads_and_writes(self):
+        """Писатели и читатели в разных потоках работают без ошибок
+        блокировки, и ни одна запись не теряется."""
+        errors = []
+        done = threading.Event()
+        self.enterContext(mock.patch.dict(connections.databases,
+                                          {"stress": self.settings()}))
+        readers = [threading.Thread(target=self.read, args=(errors, done))
+                   for _ in range(READERS)]
+        writers = [threading.Thread(target=self.write, args=(errors,))
+                   for _ in range(WRITERS)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+        self.assertEqual(errors, [])
+        with self.open(READ_ONLY=True).cursor() as cursor:
+            cursor.execute("SELECT count(*), max(total) FROM item")
+            self.assertEqual(cursor.fetchone(),
+                             (WRITERS * TRANSACTIONS,
+                              WRITERS * TRANSACTIONS - 1))
+
+
+class ReadOnlyRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadOnlyRouter()
+        self.default = connections["default"]
+
+    def test_reads_go_to_read_only_connection(self):
+        """Чтения вне транзакции идут в readonly, записи - в default."""
+        with mock.patch.object(self.default, "is_in_memory_db",
+                               return_value=False):
+            self.assertEqual(self.router.db_for_read(None), READ_ALIAS)
+            with mock.patch.object(self.default, "in_atomic_block", True):
+                self.assertIsNone(self.router.db_for_read(None))
+        self.assertEqual(self.router.db_for_write(None), "default")
+        self.assertFalse(self.router.allow_migrate(READ_ALIAS, "posts"))
+
+    def test_memory_database_is_not_split(self):
+        """База в памяти, как в тестах, читается через основное
+        соединение."""
+        with mock.patch.object(self.default, "is_in_memory_db",
+                               return_value=True):
+            self.assertIsNone(self.router.db_for_read(None))
+
+
+class ReplicaTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        replica_settings = {**connections.databases["default"],
+                            "NAME": "replica.sqlite3"}
+        # база в тестах - в памяти, здесь её считаем файлом
+        self.enterContext(mock.patch.dict(
+            connections.databases, {REPLICA_ALIAS: replica_settings}))
+        self.enterContext(mock.patch(
+            "yatube.sqlite.routers._primary_only", return_value=False))
+
+    def request(self, path, method="get", write=False, model=Post,
+                probe=None, **cookies):
+        """Пропускает запрос через ReplicaMiddleware; возвращает ответ и
+        базу, из которой представление читало бы (или результат
+        ``probe``)."""
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies)
+        request.resolver_match = resolve(path)
+        used = []
+
+        def view(request):
+            used.append(probe() if probe is not None
+                        else self.router.db_for_read(model))
+            if write:
+                self.router.db_for_write(Post)
+            return HttpResponse()
+
+        def handler(request):
+            # как обработчик Django: process_view, затем представление
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = replica.ReplicaMiddleware(handler)
+        return middleware(request), used[0]
+
+    def test_feed_reads_from_replica(self):
+        """Лента читает с реплики, остальные страницы - с основной базы."""
+        self.assertEqual(self.request(reverse("index"))[1], REPLICA_ALIAS)
+        self.assertEqual(self.request(reverse("new_post"))[1], READ_ALIAS)
+        # пользователь запроса и сессия - всегда с основной базы
+        self.assertEqual(self.request(reverse("index"), model=User)[1],
+                         READ_ALIAS)
+        # вне запроса реплика не используется
+        self.assertNotEqual(self.router.db_for_read(Post), REPLICA_ALIAS)
+
+    def test_writer_sticks_to_primary(self):
+        """После записи пользователь какое-то время читает с основной
+        базы."""
+        response, _ = self.request(reverse("new_post"), "post", write=True)
+        until = response.cookies[replica.STICKY_COOKIE].value
+        self.assertGreater(int(until), time.time())
+        _, used = self.request(reverse("index"),
+                               **{replica.STICKY_COOKIE: until})
+        self.assertEqual(used, READ_ALIAS)
+        _, used = self.request(reverse("index"),
+                               **{replica.STICKY_COOKIE: "1"})
+        self.assertEqual(used, REPLICA_ALIAS)
+
+    def test_replica_pages_are_cached_briefly(self):
+        """Построенное из данных реплики живёт в кэше не дольше окна
+        прилипания."""
+        with self.settings(REPLICA_STICKY_SECONDS=10):
+            _, timeout = self.request(
+                reverse("index"), probe=lambda: replica.cache_timeout(None))
+            self.assertEqual(timeout, 10)
+            _, timeout = self.request(
+                reverse("new_post"), probe=lambda: replica.cache_timeout(60))
+            self.assertEqual(timeout, 60)
+
+    def test_replicate(self):
+        """replicate копирует основную базу в файл реплики."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = os.path.join(directory, "primary.sqlite3")
+        target = os.path.join(directory, "replica.sqlite3")
+        with sqlite3.connect(source) as primary:
+            primary.execute("CREATE TABLE item (total INTEGER)")
+            primary.execute("INSERT INTO item VALUES (7)")
+        primary.close()
+        replica.replicate(source, target)
+        copy = sqlite3.connect(target)
+        self.addCleanup(copy.close)
+        self.assertEqual(copy.execute("SELECT total FROM item").fetchall(),
+                         [(7,)])
+
+
+class StickyCookieTests(TestCase):
+    def test_new_post_sets_sticky_cookie(self):
+        """Новый пост помечает автора для чтения с основной базы."""
+        user = User.objects.create_user(username="writer")
+        self.client.force_login(user)
+        response = self.client.post(reverse("new_post"), {"text": "Пост"})
+        self.assertIn(replica.STICKY_COOKIE, response.cookies)
+        response = self.client.get(reverse("index"))
+        self.assertNotIn(replica.STICKY_COOKIE, response.cookies)
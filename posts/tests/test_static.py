@@ -0,0 +1,141 @@
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+ASSETS = {
+    "bootstrap/dist/css/bootstrap.min.css": ".card{margin:0}" * 200,
+    "jquery/dist/jquery.min.js": "window.jQuery=function(){};" * 200,
+    "bootstrap/dist/js/bootstrap.min.js": "window.bootstrap={};" * 200,
+    "site/site.css": "/* отступы */\nbody {\n    margin: 0;\n}\n",
+}
+ASSET_URL = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+
+
+def strip_comments(text):
+    """Минификатор для теста: убирает комментарии и переводы строк."""
+    return re.sub(r"/\*.*?\*/|\n", "", text)
+
+
+class StaticPipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.media = tempfile.mkdtemp()
+        for name, text in ASSETS.items():
+            path = os.path.join(self.source, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as asset:
+                asset.write(text)
+        self.settings = override_settings(
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=[
+                "django.contrib.staticfiles.finders.FileSystemFinder"],
+            STATIC_MINIFIERS={".css": f"{__name__}.strip_comments",
+                              ".js": "missing_package.jsmin"},
+            MEDIA_ROOT=self.media)
+        self.settings.enable()
+        with self.assertLogs("yatube.static", "WARNING"):
+            call_command("collectstatic", interactive=False, verbosity=0)
+        # middleware читает STATIC_ROOT при создании, то есть в первом
+        # запросе нового клиента
+        self.client = Client()
+
+    def tearDown(self):
+        self.settings.disable()
+        for path in (self.source, self.root, self.media):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def download(self, url, **headers):
+        response = self.client.get(url, **headers)
+        body = b"".join(response.streaming_content)
+        response.close()
+        return response, body
+
+    def view(self, url, browser_cache):
+        """Показ страницы браузером с кэшем; возвращает, сколько байт
+        статики пришлось скачать."""
+        html = self.client.get(url).content.decode()
+        downloaded = 0
+        for asset in ASSET_URL.findall(html):
+            if asset in browser_cache:
+                continue
+            response, body = self.download(asset)
+            self.assertEqual(response.status_code, 200, asset)
+            downloaded += len(body)
+            if "immutable" in response["Cache-Control"]:
+                browser_cache.add(asset)
+        return downloaded
+
+    def test_second_view_downloads_no_static(self):
+        """Статика страницы кэшируется навсегда и второй раз не
+        скачивается."""
+        browser_cache = set()
+        self.assertGreater(self.view(reverse("index"), browser_cache), 0)
+        self.assertEqual(len(browser_cache), 3)
+        self.assertEqual(self.view(reverse("index"), browser_cache), 0)
+
+    def test_assets_are_hashed_and_compressed(self):
+        """Адреса статики содержат хэш, ответ отдаётся сжатым."""
+        html = self.client.get(reverse("index")).content.decode()
+        url = next(asset for asset in ASSET_URL.findall(html)
+                   if asset.endswith(".css"))
+        self.assertRegex(url, r"bootstrap\.min\.[0-9a-f]{12}\.css$")
+        response, body = self.download(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("max-age=315360000", response["Cache-Control"])
+        self.assertLess(len(body), len(ASSETS[
+            "bootstrap/dist/css/bootstrap.min.css"]))
+
+    def test_css_is_minified_before_hashing(self):
+        """Минификатор применяется к CSS, файл с хэшем уже сжат."""
+        names = os.listdir(os.path.join(self.root, "site"))
+        hashed = next(name for name in names
+                      if re.fullmatch(r"site\.[0-9a-f]{12}\.css", name))
+        with open(os.path.join(self.root, "site", hashed)) as asset:
+            self.assertEqual(asset.read(), "body {    margin: 0;}")
+
+    def test_missing_manifest_entry_fails_in_production(self):
+        """Файл не из манифеста - ошибка сборки, а не адрес без хэша."""
+        self.assertEqual(static("missing.css"), "/static/missing.css")
+        with override_settings(STATIC_MANIFEST_STRICT=True):
+            with self.assertRaises(ValueError):
+                static("missing.css")
+            self.assertRegex(static("site/site.css"),
+                             r"^/static/site/site\.[0-9a-f]{12}\.css$")
+
+    def test_thumbnails_are_served_as_immutable(self):
+        """Миниатюра, нарезанная после запуска, отдаётся с вечным кэшем,
+        а исходные картинки middleware не отдаёт."""
+        self.client.get(reverse("index"))
+        for name in ("cache/ab/cd/thumb.jpg", "posts/original.jpg"):
+            path = os.path.join(self.media, name)
+            os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as image:
+                image.write(b"jpeg")
+        response, body = self.download("/media/cache/ab/cd/thumb.jpg")
+        self.assertEqual(body, b"jpeg")
+        self.assertIn("immutable", response["Cache-Control"])
+        response = self.client.get("/media/posts/original.jpg")
+        self.assertEqual(response.status_code, 404)
+
+    def test_thumbnail_links_do_not_leave_cache(self):
+        """Ссылка из каталога миниатюр на исходную картинку не отдаётся."""
+        self.client.get(reverse("index"))
+        os.makedirs(os.path.join(self.media, "posts"))
+        os.makedirs(os.path.join(self.media, "cache"))
+        with open(os.path.join(self.media, "posts", "original.jpg"),
+                  "wb") as image:
+            image.write(b"jpeg")
+        os.symlink(os.path.join(self.media, "posts", "original.jpg"),
+                   os.path.join(self.media, "cache", "link.jpg"))
+        response = self.client.get("/media/cache/link.jpg")
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,64 @@
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Post, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(name="picture.png", size=(1200, 800)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "blue").save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type="image/png")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="writer")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.post = Post.objects.create(text="Пост с картинкой",
+                                        author=self.author,
+                                        image=make_image())
+
+    def test_card_uses_original_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, карточка показывает исходную картинку."""
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, self.post.image.url)
+
+    def test_card_uses_pregenerated_thumbnail(self):
+        """Готовая миниатюра подставляется в карточку без нарезки."""
+        future = thumbnails.schedule(self.post.image.name, self.post)
+        self.assertTrue(future.result(timeout=10))
+        url = thumbnails.get_url(self.post.image.name, "card")
+        self.assertIsNotNone(url)
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, url)
+        self.assertNotContains(response, self.post.image.url + '"')
+
+    def test_generated_size(self):
+        """Миниатюра карточки нарезается в размере 960x339."""
+        thumbnails.generate(self.post.image.name)
+        url = thumbnails.get_url(self.post.image.name, "card")
+        path = MEDIA_ROOT + url[len("/media"):]
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (960, 339))
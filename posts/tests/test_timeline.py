@@ -0,0 +1,97 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry, User
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="reader")
+        cls.author = User.objects.create(username="writer")
+        cls.old_post = Post.objects.create(text="Старый пост",
+                                           author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def feed(self):
+        response = self.authorized_client.get(reverse("follow_index"))
+        return list(response.context["page"])
+
+    def test_follow_backfills_timeline(self):
+        """Подписка дозаполняет ленту уже опубликованными постами."""
+        self.authorized_client.get(
+            reverse("profile_follow", args=[self.author.username]))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.old_post).exists())
+        self.assertEqual(self.feed(), [self.old_post])
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост попадает в ленты подписчиков автора."""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(text="Новый пост", author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=new_post).exists())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_SIZE=3, POST_PER_PAGE=2,
+                       PAGE_NUMBER_LIMIT=2)
+    def test_posts_older_than_timeline_are_reachable(self):
+        """Посты старше обрезанной ленты доступны по номерам страниц и
+        по курсору."""
+        Follow.objects.create(user=self.user, author=self.author)
+        for index in range(6):
+            Post.objects.create(text=f"Пост {index}", author=self.author)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(),
+                         3)
+        expected = list(Post.objects.filter(author=self.author))
+        url = reverse("follow_index")
+        seen = []
+        page = self.authorized_client.get(url).context["page"]
+        seen += page
+        page = self.authorized_client.get(url + "?page=2").context["page"]
+        seen += page
+        while getattr(page, "next_cursor", None):
+            page = self.authorized_client.get(
+                f"{url}?cursor={page.next_cursor}").context["page"]
+            seen += page
+        self.assertEqual(seen, expected)
+
+    @override_settings(TIMELINE_SIZE=2)
+    def test_push_trims_follower_timelines(self):
+        """Рассылка поста обрезает ленты подписчиков до TIMELINE_SIZE."""
+        other = User.objects.create(username="other")
+        for reader in (self.user, other):
+            Follow.objects.create(user=reader, author=self.author)
+        posts = [Post.objects.create(text=f"Пост {index}", author=self.author)
+                 for index in range(3)]
+        for reader in (self.user, other):
+            self.assertEqual(set(TimelineEntry.objects.filter(
+                user=reader).values_list("post", flat=True)),
+                {posts[1].pk, posts[2].pk})
+
+    def test_unfollow_removes_posts(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_client.get(
+            reverse("profile_unfollow", args=[self.author.username]))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_deleted_post_leaves_timeline(self):
+        """Удалённый пост пропадает из ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text="Удаляемый пост", author=self.author)
+        post.delete()
+        self.assertEqual(self.feed(), [self.old_post])
+
+    def test_cold_user_falls_back_to_join(self):
+        """Для пользователя без ленты работает прежний запрос, а лента
+        строится заново."""
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.filter(user=self.user).delete()
+        self.assertEqual(self.feed(), [self.old_post])
+        self.assertTrue(TimelineEntry.objects.filter(user=self.user).exists())
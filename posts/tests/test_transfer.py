@@ -0,0 +1,114 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import trending
+from posts.models import (Comment, Follow, Group, Post, SearchTerm,
+                          TrendingScore, User)
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        author = User.objects.create(username="writer")
+        reader = User.objects.create(username="reader")
+        group = Group.objects.create(title="Кошки", slug="cats",
+                                     description="Про кошек")
+        self.post = Post.objects.create(text="Котики, спят", author=author,
+                                        group=group)
+        Post.objects.create(text="Без группы", author=reader)
+        Comment.objects.create(post=self.post, author=reader,
+                               text="Комментарий с \"кавычками\"\nи строкой")
+        Follow.objects.create(user=reader, author=author)
+
+    def snapshot(self):
+        return {
+            "groups": list(Group.objects.values_list("slug", "title")),
+            "posts": list(Post.objects.values_list(
+                "id", "text", "pub_date", "author__username",
+                "group__slug")),
+            "comments": list(Comment.objects.values_list(
+                "id", "post_id", "author__username", "text", "created")),
+            "follows": list(Follow.objects.values_list(
+                "user__username", "author__username")),
+        }
+
+    def round_trip(self, fmt):
+        before = self.snapshot()
+        call_command("export_data", self.directory, "--format", fmt,
+                     stdout=StringIO())
+        for model in (Follow, Comment, Post, Group, User):
+            model.objects.all().delete()
+        out = StringIO()
+        call_command("import_data", self.directory, "--format", fmt,
+                     "--batch-size", "1", stdout=out)
+        self.assertEqual(self.snapshot(), before)
+        self.assertIn("строк/с", out.getvalue())
+
+    def test_jsonl_round_trip(self):
+        """Выгрузка и загрузка JSONL сохраняют данные, id и даты."""
+        self.round_trip("jsonl")
+
+    def test_csv_round_trip(self):
+        """CSV переживает запятые, кавычки и переводы строк."""
+        self.round_trip("csv")
+
+    def test_derived_data_is_rebuilt(self):
+        """После загрузки есть ленты, счётчики и поисковый индекс."""
+        self.round_trip("jsonl")
+        reader = User.objects.get(username="reader")
+        self.assertEqual(reader.timeline.count(), 1)
+        self.assertEqual(reader.stats.following_count, 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comment_count, 1)
+        self.assertTrue(SearchTerm.objects.filter(term="котик").exists())
+
+    def test_new_rows_after_import(self):
+        """Новые посты получают id после загруженных."""
+        self.round_trip("jsonl")
+        post = Post.objects.create(text="Новый",
+                                   author=User.objects.first())
+        self.assertGreater(post.pk, self.post.pk)
+
+    def test_import_into_non_empty_database(self):
+        """В непустой базе загруженные посты получают новые id, а их
+        комментарии - ссылки на них, а не на существующие посты."""
+        call_command("export_data", self.directory, stdout=StringIO())
+        before = self.snapshot()
+        call_command("import_data", self.directory, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 4)
+        self.assertEqual(self.post.comments.count(), 1)
+        copy = Comment.objects.exclude(post=self.post).get()
+        self.assertEqual(copy.post.text, self.post.text)
+        self.assertGreater(copy.post.pk, max(
+            row[0] for row in before["posts"]))
+        self.assertEqual(copy.post.pub_date, self.post.pub_date)
+        self.assertEqual(copy.created, self.post.comments.get().created)
+
+    def test_import_keeps_existing_derived_data(self):
+        """Загрузка в непустую базу пересчитывает только загруженные
+        записи: рейтинг от подписок и записи индекса существующих постов
+        остаются, а загруженные посты находятся и попадают в ленты."""
+        call_command("export_data", self.directory, stdout=StringIO())
+        TrendingScore.objects.update_or_create(
+            post=self.post, defaults={"score": 5})
+        # запись, которой нет в тексте: полный пересчёт индекса её удалил бы
+        SearchTerm.objects.create(post=self.post, term="метка", weight=1)
+        call_command("import_data", self.directory, stdout=StringIO())
+        score = TrendingScore.objects.get(post=self.post).score
+        self.assertAlmostEqual(score, 5, places=2)
+        self.assertTrue(SearchTerm.objects.filter(post=self.post,
+                                                  term="метка").exists())
+        copy = Post.objects.filter(text=self.post.text).exclude(
+            pk=self.post.pk).get()
+        self.assertTrue(SearchTerm.objects.filter(post=copy,
+                                                  term="котик").exists())
+        self.assertIn(copy.pk, trending.ranking())
+        reader = User.objects.get(username="reader")
+        self.assertTrue(reader.timeline.filter(post=copy).exists())
+        self.assertEqual(copy.comment_count, 1)
+        self.assertEqual(reader.stats.following_count, 1)
+        self.assertEqual(copy.author.stats.posts_count, 2)
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import trending
+from posts.models import Comment, Follow, Post, TrendingScore, User
+
+
+@override_settings(TRENDING_HALF_LIFE=3600, TRENDING_WINDOW=86400,
+                   TRENDING_WEIGHTS={"comment": 1, "follower": 2})
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="author")
+        cls.reader = User.objects.create(username="reader")
+        cls.quiet = Post.objects.create(text="Тихий пост", author=cls.reader)
+        cls.popular = Post.objects.create(text="Популярный пост",
+                                          author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def score(self, post):
+        return TrendingScore.objects.get(post=post).score
+
+    def test_events_update_score_incrementally(self):
+        """Комментарий и новый подписчик автора поднимают рейтинг."""
+        Comment.objects.create(post=self.popular, author=self.reader,
+                               text="Комментарий")
+        self.assertAlmostEqual(self.score(self.popular), 1, places=3)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertAlmostEqual(self.score(self.popular), 3, places=3)
+        self.assertFalse(TrendingScore.objects.filter(
+            post=self.quiet).exists())
+
+    def test_score_decays(self):
+        """Рейтинг уменьшается вдвое за период полураспада."""
+        now = timezone.now()
+        trending.add({self.popular.pk: 4}, now - timedelta(hours=2))
+        trending.add({self.quiet.pk: 2}, now)
+        self.assertEqual(trending.refresh(now),
+                         [self.quiet.pk, self.popular.pk])
+        trending.add({self.popular.pk: 1}, now)
+        self.assertAlmostEqual(self.score(self.popular), 2)
+
+    def test_old_posts_leave_ranking(self):
+        """Посты старше окна удаляются из рейтинга при пересборке."""
+        trending.add({self.popular.pk: 5})
+        Post.objects.filter(pk=self.popular.pk).update(
+            pub_date=timezone.now() - timedelta(days=2))
+        self.assertEqual(trending.refresh(), [])
+        self.assertFalse(TrendingScore.objects.exists())
+
+    def test_rebuild_matches_events(self):
+        """Пересчёт по комментариям даёт тот же порядок, что и события."""
+        for _ in range(2):
+            Comment.objects.create(post=self.quiet, author=self.author,
+                                   text="Комментарий")
+        Comment.objects.create(post=self.popular, author=self.reader,
+                               text="Комментарий")
+        expected = trending.refresh()
+        self.assertEqual(trending.rebuild(), expected)
+        self.assertAlmostEqual(self.score(self.quiet), 2, places=3)
+
+    def test_page_reads_precomputed_ranking(self):
+        """Лента популярного показывает посты по готовому рейтингу и не
+        пересчитывает его на каждый запрос."""
+        trending.add({self.popular.pk: 3, self.quiet.pk: 1})
+        trending.refresh()
+        trending.add({self.quiet.pk: 10})
+        response = self.client.get(reverse("trending"))
+        self.assertEqual(list(response.context["page"]),
+                         [self.popular, self.quiet])
+        self.assertContains(response, "Популярный пост")
+        trending.refresh()
+        response = self.client.get(reverse("trending"))
+        self.assertEqual(list(response.context["page"]),
+                         [self.quiet, self.popular])
+
+    def test_cold_ranking_is_computed_once(self):
+        """Пока другой процесс считает рейтинг, запрос ждёт его результат
+        и не сканирует таблицу сам."""
+        cache.delete(trending.RANKING_KEY)
+        cache.add(f"{trending.RANKING_KEY}:lock", 1)
+
+        def computed_elsewhere(seconds):
+            cache.set(trending.RANKING_KEY, (None, [self.popular.pk]), None)
+
+        with mock.patch("yatube.cache.time.sleep", computed_elsewhere):
+            with self.assertNumQueries(0):
+                self.assertEqual(trending.ranking(), [self.popular.pk])
+        cache.delete(f"{trending.RANKING_KEY}:lock")
+
+    def test_page_follows_post_changes(self):
+        """Правка и удаление поста видны в популярном сразу, без
+        пересборки рейтинга."""
+        trending.add({self.popular.pk: 3, self.quiet.pk: 1})
+        trending.refresh()
+        url = reverse("trending")
+        self.assertContains(self.client.get(url), "Популярный пост")
+        popular = Post.objects.get(pk=self.popular.pk)
+        popular.text = "Исправленный пост"
+        popular.save()
+        self.assertContains(self.client.get(url), "Исправленный пост")
+        Post.objects.filter(pk=self.quiet.pk).delete()
+        self.assertEqual(list(self.client.get(url).context["page"]),
+                         [self.popular])
@@ -142,18 +142,27 @@ class TaskViewsTests(TestCase):
         self.assertEqual(response.context["page"][0], self.post)
 
     def test_index_page_cache(self):
-        """Проверяем корректнось кэширования шаблона index."""
+        """Проверяем корректнось кэширования карточек на странице index."""
+        cache.clear()
         response = self.authorized_client.get(reverse("index"))
         previous_content = response.content
+        # изменение в обход сигналов не меняет версию поста, поэтому
+        # на странице остаётся закэшированная карточка
+        Post.objects.filter(pk=self.post.pk).update(text="Тихая правка")
+        response = self.authorized_client.get(reverse("index"))
+        self.assertEqual(previous_content, response.content)
+
+        # новый пост появляется сразу, без ожидания истечения кэша
         Post.objects.create(text="Новый пост", author=self.user, )
         response = self.authorized_client.get(reverse("index"))
-        next_content = response.content
-        self.assertEqual(previous_content, next_content)
-        cache.clear()
+        self.assertContains(response, "Новый пост")
+        self.assertNotContains(response, "Тихая правка")
 
-        response = self.authorized_client.get(reverse('index'))
-        cleared_cache_content = response.content
-        self.assertNotEqual(cleared_cache_content, next_content)
+        # сохранение поста меняет его версию и карточку
+        self.post.refresh_from_db()
+        self.post.save()
+        response = self.authorized_client.get(reverse("index"))
+        self.assertContains(response, "Тихая правка")
 
     def test_auth_user_can_follow(self):
         """Авторизованный пользователь может подписываться на других
@@ -219,6 +228,10 @@ class PaginatorViewsTest(TestCase):
         ]
         Post.objects.bulk_create(objs)
 
+    def setUp(self):
+        # bulk_create не вызывает сигналов, страницы из кэша устарели бы
+        cache.clear()
+
     def test_first_page_containse_ten_records(self):
         response = self.client.get(reverse("index"))
         self.assertEqual(len(response.context.get("page").object_list), 10)
@@ -0,0 +1,199 @@
+import fcntl
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import writebehind
+from posts.models import Comment, Follow, Post, User, UserStats
+
+
+class WriteBehindTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="author")
+        cls.reader = User.objects.create(username="reader")
+        cls.post = Post.objects.create(text="Пост", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.journal = tempfile.mkdtemp()
+        # фоновый поток не запускается: его соединение не видит данных
+        # теста, поэтому журнал сохраняется вызовом flush
+        self.settings = override_settings(
+            WRITE_BEHIND=True, WRITE_BEHIND_DIR=self.journal,
+            WRITE_BEHIND_BATCH=2)
+        self.settings.enable()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.comment_url = reverse("add_comment",
+                                   args=["author", self.post.pk])
+
+    def tearDown(self):
+        writebehind.flush()
+        self.settings.disable()
+        shutil.rmtree(self.journal, ignore_errors=True)
+
+    def journal_lines(self):
+        with open(os.path.join(self.journal, writebehind.JOURNAL)) as journal:
+            return list(journal)
+
+    def left_files(self):
+        return sorted(name for name in os.listdir(self.journal)
+                      if name != writebehind.WRITER_LOCK)
+
+    def entry(self, text, **fields):
+        return dict({"op": writebehind.COMMENT, "token": uuid.uuid4().hex,
+                     "user": self.reader.pk, "post": self.post.pk,
+                     "slot": 0, "text": text}, **fields)
+
+    def write_batch(self, name, entries, tail=""):
+        with open(os.path.join(self.journal, name), "w") as batch:
+            for entry in entries:
+                batch.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            batch.write(tail)
+
+    def submit_from_process(self, function, *args):
+        """Отправляет запись из отдельного процесса, как другой воркер."""
+        process = multiprocessing.get_context("fork").Process(
+            target=function, args=args)
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        return process.pid
+
+    def test_comments_are_journaled_then_saved_in_order(self):
+        """Комментарии сначала попадают в журнал, а потом сохраняются
+        пачками в порядке отправки."""
+        texts = [f"Комментарий {index}" for index in range(5)]
+        for text in texts:
+            self.client.post(self.comment_url, {"text": text})
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(len(self.journal_lines()), 5)
+        self.assertEqual(writebehind.flush(), 5)
+        saved = Comment.objects.filter(post=self.post).order_by("pk")
+        self.assertEqual(list(saved.values_list("text", flat=True)), texts)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 5)
+        self.assertEqual(self.left_files(), [])
+
+    def test_author_sees_own_pending_comment(self):
+        """До сохранения комментарий видит только его автор."""
+        post_url = reverse("post", args=["author", self.post.pk])
+        self.client.get(post_url)
+        self.client.post(self.comment_url, {"text": "Ещё не в базе"})
+        self.assertContains(self.client.get(post_url), "Ещё не в базе")
+        self.assertNotContains(Client().get(post_url), "Ещё не в базе")
+        writebehind.flush()
+        response = self.client.get(post_url)
+        self.assertContains(response, "Ещё не в базе", count=1)
+        self.assertNotContains(response, "pending-comments")
+
+    def test_follow_changes_collapse_to_last_state(self):
+        """Подписка видна автору сразу, а при сохранении подписки и
+        отписки сводятся к последнему состоянию."""
+        follow_url = reverse("profile_follow", args=["author"])
+        unfollow_url = reverse("profile_unfollow", args=["author"])
+        for url in (follow_url, unfollow_url, follow_url):
+            self.client.get(url)
+        self.assertFalse(Follow.objects.exists())
+        self.assertContains(self.client.get(reverse("profile",
+                                                    args=["author"])),
+                            "Отписаться")
+        writebehind.flush()
+        self.assertTrue(Follow.objects.filter(user=self.reader,
+                                              author=self.author).exists())
+        self.assertEqual(UserStats.objects.get(
+            user=self.author).followers_count, 1)
+        self.client.get(unfollow_url)
+        writebehind.flush()
+        self.assertFalse(Follow.objects.exists())
+
+    def test_leftover_batches_are_saved_once_in_order(self):
+        """Пачки, оставшиеся после падения писателя, сохраняются раньше
+        нового журнала, повтор не создаёт дублей, а оборванная строка
+        пропускается."""
+        self.write_batch("000000000001.batch", [self.entry("Из пачки")],
+                         json.dumps(self.entry("Оборвалась"))[:20])
+        # писатель упал после фиксации, но до удаления второй пачки
+        saved = self.entry("Уже сохранена")
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text=saved["text"], token=saved["token"])
+        self.write_batch("000000000002.batch", [saved])
+        writebehind.comment(self.reader.pk, self.post.pk, "Из журнала")
+        with self.assertLogs("posts.writebehind", "WARNING"):
+            self.assertEqual(writebehind.flush(), 3)
+        self.assertEqual(list(Comment.objects.order_by("pk").values_list(
+            "text", flat=True)), ["Уже сохранена", "Из пачки", "Из журнала"])
+        self.assertEqual(self.left_files(), [])
+
+    def test_only_one_writer_saves(self):
+        """Пока писателем работает другой процесс, журнал не трогается."""
+        writebehind.comment(self.reader.pk, self.post.pk, "Ждёт писателя")
+        path = os.path.join(self.journal, writebehind.WRITER_LOCK)
+        with open(path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.assertEqual(writebehind.flush(), 0)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(writebehind.flush(), 1)
+
+    @override_settings(WRITE_BEHIND_RETRIES=2)
+    def test_failing_entry_is_moved_aside(self):
+        """Пачка с записью, которая не сохраняется, после нескольких
+        попыток сохраняется по одной записи, а эта запись уходит в
+        failed/ и не задерживает следующие."""
+        broken = self.entry(None)
+        self.write_batch("000000000001.batch",
+                         [self.entry("До"), broken, self.entry("После")])
+        with self.assertRaises(Exception):
+            writebehind.flush()
+        self.assertFalse(Comment.objects.exists())
+        writebehind.comment(self.reader.pk, self.post.pk, "Следующий")
+        with self.assertLogs("posts.writebehind", "ERROR"):
+            self.assertEqual(writebehind.flush(), 4)
+        self.assertEqual(list(Comment.objects.order_by("pk").values_list(
+            "text", flat=True)), ["До", "После", "Следующий"])
+        failed = os.path.join(self.journal, writebehind.FAILED,
+                              "000000000001.batch")
+        with open(failed) as journal:
+            self.assertEqual([json.loads(line)["token"] for line in journal],
+                             [broken["token"]])
+
+    def test_order_is_kept_across_processes(self):
+        """Записи из разных процессов сохраняются в порядке отправки:
+        комментарии к посту и подписка с отпиской через разных
+        воркеров."""
+        pids = set()
+        for index in range(4):
+            pids.add(self.submit_from_process(
+                writebehind.comment, self.reader.pk, self.post.pk,
+                f"Комментарий {index}"))
+        pids.add(self.submit_from_process(
+            writebehind.follow, self.reader.pk, self.author.pk))
+        pids.add(self.submit_from_process(
+            writebehind.unfollow, self.reader.pk, self.author.pk))
+        self.assertEqual(len(pids), 6)
+        self.assertEqual(writebehind.flush(), 6)
+        texts = Comment.objects.order_by("pk").values_list("text", flat=True)
+        self.assertEqual(list(texts),
+                         [f"Комментарий {index}" for index in range(4)])
+        self.assertFalse(Follow.objects.exists())
+
+    def test_pending_writes_do_not_overwrite_each_other(self):
+        """Каждая несохранённая запись лежит в своём ключе кэша."""
+        for index in range(3):
+            writebehind.comment(self.reader.pk, self.post.pk,
+                                f"Черновик {index}")
+        self.assertEqual(
+            [item.text for item in writebehind.pending_comments(
+                self.reader, self.post.pk)],
+            [f"Черновик {index}" for index in range(3)])
+        writebehind.flush()
+        self.assertEqual(writebehind.pending(self.reader.pk), [])
@@ -0,0 +1,13 @@
+from django.core.cache import cache
+
+
+class QueryCountMixin:
+    """Закрепляет число SQL-запросов страницы, чтобы N+1 не вернулся."""
+
+    def assertViewQueries(self, client, url, expected):
+        # фрагментный кэш index_page иначе скроет запросы шаблона
+        cache.clear()
+        with self.assertNumQueries(expected):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
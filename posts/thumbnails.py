@@ -0,0 +1,147 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Когда пост сохраняется с новой картинкой, все размеры из
+``settings.POST_THUMBNAILS`` нарезаются в пуле потоков, а их адреса
+складываются в кэш. Шаблоны берут готовый адрес и никогда не декодируют
+исходный файл во время запроса: пока миниатюра не готова, показывается
+исходная картинка, а после нарезки карточка поста обновляется.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.kvstores.base import KVStoreBase
+
+from . import fragments
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+
+
+def url_key(name, alias):
+    digest = hashlib.md5(f"{name}:{alias}".encode()).hexdigest()
+    return f"thumbnail:{digest}"
+
+
+def get_url(name, alias):
+    """Адрес готовой миниатюры или None, если она ещё не нарезана."""
+    return cache.get(url_key(name, alias))
+
+
+def get_urls(name, aliases):
+    """Адреса готовых миниатюр ``{alias: url}``, одним чтением кэша."""
+    keys = {url_key(name, alias): alias for alias in aliases}
+    return {keys[key]: url for key, url in cache.get_many(keys).items()}
+
+
+def size(alias):
+    """Ширина и высота миниатюры по её геометрии в настройках."""
+    width, height = settings.POST_THUMBNAILS[alias][0].split("x")
+    return int(width), int(height)
+
+
+def image_attrs(post, alias):
+    """Атрибуты ``<img>`` картинки поста: src, srcset, sizes, width и height.
+
+    Берёт заранее нарезанные миниатюры из ``settings.POST_IMAGE_SRCSET``
+    и их размеры из настроек. Если миниатюра ещё не готова, ставит
+    нарезку в очередь и показывает исходную картинку с размерами,
+    записанными при загрузке, - файл во время запроса не открывается.
+    Для поста без картинки возвращает пустой словарь.
+    """
+    if not post.image:
+        return {}
+    name = post.image.name
+    aliases = settings.POST_IMAGE_SRCSET.get(alias, [alias])
+    urls = get_urls(name, aliases)
+    if alias not in urls:
+        transaction.on_commit(lambda: schedule(name, post))
+        return {"src": post.image.url, "width": post.image_width,
+                "height": post.image_height}
+    width, height = size(alias)
+    srcset = ", ".join(f"{urls[thumb]} {size(thumb)[0]}w"
+                       for thumb in aliases if thumb in urls)
+    return {"src": urls[alias], "srcset": srcset,
+            "sizes": f"(max-width: {width}px) 100vw, {width}px",
+            "width": width, "height": height}
+
+
+def generate(name):
+    """Нарезает все размеры миниатюр картинки и запоминает их адреса."""
+    urls = {}
+    for alias, (geometry, options) in settings.POST_THUMBNAILS.items():
+        urls[url_key(name, alias)] = get_thumbnail(
+            name, geometry, **options).url
+    cache.set_many(urls, None)
+    return urls
+
+
+def _run(name, names_to_bump):
+    try:
+        generate(name)
+        # карточка могла закэшироваться с исходной картинкой
+        fragments.bump(*names_to_bump)
+        return True
+    except Exception:
+        logger.exception("Не удалось нарезать миниатюры для %s", name)
+        return False
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix="thumbnails")
+        return _executor
+
+
+def schedule(name, post=None):
+    """Ставит нарезку миниатюр в очередь пула, если она ещё не стоит там.
+
+    ``post`` - пост с этой картинкой, его карточка обновится после нарезки.
+    """
+    with _lock:
+        if name in _pending:
+            return None
+        _pending.add(name)
+    names_to_bump = []
+    if post is not None:
+        names_to_bump = [fragments.post_name(post.pk),
+                         *fragments.feeds_of(post.author_id, post.group_id)]
+    return executor().submit(_run, name, names_to_bump)
+
+
+class CacheKVStore(KVStoreBase):
+    """Хранилище sorl-thumbnail в общем кэше вместо таблицы в БД.
+
+    Потоки нарезки не обращаются к базе данных. Если запись вытеснена из
+    кэша, sorl найдёт уже нарезанный файл в хранилище и не станет
+    обрабатывать картинку заново.
+    """
+
+    def _get_raw(self, key):
+        return cache.get(key)
+
+    def _set_raw(self, key, value):
+        cache.set(key, value, None)
+
+    def _delete_raw(self, *keys):
+        cache.delete_many(keys)
+
+    def _find_keys_raw(self, prefix):
+        # кэш не умеет перечислять ключи, а sorl нужно это только для
+        # команды очистки thumbnail cleanup
+        return []
@@ -0,0 +1,138 @@
+"""Материализованные ленты подписок (fan-out-on-write).
+
+Новый пост раскладывается в ленты всех подписчиков автора, подписка
+дозаполняет ленту последними постами автора, отписка удаляет их.
+Лента ограничена ``settings.TIMELINE_SIZE`` записями: посты старше
+последней из них страница подписок берёт прежним join по Follow.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery
+
+from . import graph
+from .models import Follow, Post, TimelineEntry
+
+
+def _entries(user_ids, posts):
+    return [TimelineEntry(user_id=user_id, post_id=post.id,
+                          pub_date=post.pub_date)
+            for user_id in user_ids for post in posts]
+
+
+def push_post(post):
+    """Добавляет пост в ленты подписчиков его автора."""
+    follower_ids = list(Follow.objects.filter(
+        author_id=post.author_id).values_list("user_id", flat=True))
+    TimelineEntry.objects.bulk_create(
+        _entries(follower_ids, [post]), ignore_conflicts=True)
+    trim(*follower_ids)
+
+
+def fan_out(post_ids):
+    """Раскладывает посты ``post_ids`` в ленты подписчиков их авторов
+    одной пачкой, например после загрузки ``bulk_create`` без сигналов."""
+    by_author = defaultdict(list)
+    for post in Post.objects.filter(pk__in=post_ids).only(
+            "id", "pub_date", "author_id"):
+        by_author[post.author_id].append(post)
+    followers = Follow.objects.filter(author_id__in=by_author).values_list(
+        "user_id", "author_id")
+    entries = []
+    for user_id, author_id in followers:
+        entries.extend(_entries([user_id], by_author[author_id]))
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    trim(*{entry.user_id for entry in entries})
+
+
+def add_follows(pairs):
+    """Дозаполняет ленты постами новых авторов: ``pairs`` - пары
+    (id подписчика, id автора)."""
+    entries = []
+    for user_id, author_id in pairs:
+        posts = Post.objects.filter(author_id=author_id).only(
+            "id", "pub_date")[:settings.TIMELINE_SIZE]
+        entries.extend(_entries([user_id], posts))
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    trim(*{user_id for user_id, _ in pairs})
+
+
+def backfill(user_id, author_id):
+    """Дозаполняет ленту пользователя постами нового автора."""
+    add_follows([(user_id, author_id)])
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты пользователя посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def trim(*user_ids):
+    """Обрезает ленты пользователей до ``settings.TIMELINE_SIZE``
+    последних записей.
+
+    Каждая пачка пользователей обрезается одним DELETE: у каждой ленты
+    удаляются записи старше её записи номер ``TIMELINE_SIZE``, которую
+    коррелированный подзапрос находит по индексу (user, pub_date, post).
+    """
+    size = settings.TIMELINE_SIZE
+    oldest_kept = TimelineEntry.objects.filter(
+        user_id=OuterRef("user_id")).order_by(
+        "-pub_date", "-post_id").values("pub_date")[size - 1:size]
+    for start in range(0, len(user_ids), graph.CHUNK):
+        TimelineEntry.objects.filter(
+            user_id__in=user_ids[start:start + graph.CHUNK],
+            pub_date__lt=Subquery(oldest_kept)).delete()
+
+
+def rebuild(user_id):
+    """Строит ленту пользователя заново по таблице подписок."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = Post.objects.filter(author__following__user_id=user_id).only(
+        "id", "pub_date")[:settings.TIMELINE_SIZE]
+    TimelineEntry.objects.bulk_create(_entries([user_id], posts))
+
+
+def timeline_posts(user):
+    """Посты материализованной ленты в порядке индекса (user, pub_date,
+    post), без сортировки во временной таблице."""
+    return Post.objects.for_feed().filter(
+        timeline_entries__user=user).order_by(
+        F("timeline_entries__pub_date").desc(),
+        F("timeline_entries__post").desc())
+
+
+def pull_feed(user):
+    """Лента подписок по таблице Follow, без материализованной ленты.
+
+    Авторы берутся подзапросом, а не join: так SQLite идёт по индексу
+    постов (pub_date, id) и не сортирует во временной таблице.
+    """
+    authors = Follow.objects.filter(user=user).values("author")
+    return Post.objects.filter(author__in=authors).for_feed()
+
+
+def truncated(user):
+    """Заполнена ли лента пользователя до ``settings.TIMELINE_SIZE``:
+    тогда старые посты подписок в ней обрезаны."""
+    size = settings.TIMELINE_SIZE
+    return TimelineEntry.objects.filter(user=user)[size - 1:size].exists()
+
+
+def feed_for(user):
+    """Возвращает ленту подписок пользователя.
+
+    Для «холодного» пользователя, у которого лента ещё не построена,
+    отдаёт прежний join по Follow и заодно строит ленту. Пустую ленту
+    того, кто ни на кого не подписан, видно по графу подписок без
+    запроса к Follow.
+    """
+    if TimelineEntry.objects.filter(user=user).exists():
+        return timeline_posts(user)
+    if not graph.following(user.id):
+        return Post.objects.for_feed().none()
+    fallback = Post.objects.filter(author__following__user=user)
+    if fallback.exists():
+        rebuild(user.id)
+    return pull_feed(user)
@@ -0,0 +1,282 @@
+"""Потоковые выгрузка и загрузка сообществ, постов, комментариев и подписок.
+
+Каждая таблица пишется в свой файл JSONL или CSV по одной строке на
+запись. Строки читаются и пишутся генераторами, поэтому память не растёт
+с объёмом данных. Авторы и сообщества ссылаются на записи по имени
+пользователя и slug и при загрузке разрешаются через словари в памяти.
+Id постов и комментариев из файла сдвигаются за последние id в базе:
+в пустую базу записи загружаются со своими id, в непустую - не
+сталкиваясь с существующими, а комментарий ссылается на пост по тому же
+сдвигу без таблицы соответствия. Загрузка идёт ``bulk_create`` пачками
+в одной транзакции, сигналы при этом не срабатывают. Поэтому потом, уже
+короткими транзакциями по пачкам id, индексируются, раскладываются по
+лентам и учитываются в рейтинге и счётчиках только загруженные записи:
+производные данные остальной базы не пересчитываются. Рекомендации
+пересчитает следующий запуск ``suggest_follows``.
+"""
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, fragments, graph, search, timeline, trending
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ("jsonl", "csv")
+
+# столбцы файлов и поля, из которых они выгружаются; загрузка идёт в том
+# же порядке - от независимых записей к ссылающимся на них
+TABLES = {
+    "groups": (Group, {"slug": "slug", "title": "title",
+                       "description": "description"}),
+    "posts": (Post, {"id": "id", "text": "text", "pub_date": "pub_date",
+                     "author": "author__username", "group": "group__slug",
+                     "image": "image", "image_width": "image_width",
+                     "image_height": "image_height"}),
+    "comments": (Comment, {"id": "id", "post": "post_id",
+                           "author": "author__username", "text": "text",
+                           "created": "created"}),
+    "follows": (Follow, {"user": "user__username",
+                         "author": "author__username"}),
+}
+# совпадающие slug и пары подписок - те же записи, они пропускаются
+MERGED = ("groups", "follows")
+# даты из файла: auto_now_add заменяет их при вставке временем загрузки
+DATES = {"posts": "pub_date", "comments": "created"}
+# сколько загруженных записей обрабатывается за раз при пересчёте
+REFRESH_CHUNK = 500
+
+
+def file_path(directory, table, fmt):
+    return os.path.join(directory, f"{table}.{fmt}")
+
+
+def export_rows(table):
+    """Записи таблицы словарями ``столбец: значение`` по порядку id."""
+    model, columns = TABLES[table]
+    rows = model.objects.order_by("pk").values_list(*columns.values())
+    for values in rows.iterator(chunk_size=2000):
+        yield {column: value.isoformat() if isinstance(value, datetime)
+               else value
+               for column, value in zip(columns, values)}
+
+
+def write(rows, output, fmt, columns):
+    """Пишет строки в открытый файл; возвращает их число."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(output, fieldnames=columns)
+        writer.writeheader()
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+        return count
+    for count, row in enumerate(rows, 1):
+        output.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return count
+
+
+def read(source, fmt):
+    """Строки открытого файла словарями; пустые значения CSV - None."""
+    if fmt == "csv":
+        for row in csv.DictReader(source):
+            yield {column: value or None for column, value in row.items()}
+        return
+    for line in source:
+        if line.strip():
+            yield json.loads(line)
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def id_chunks(queryset, size=REFRESH_CHUNK):
+    """Id записей queryset пачками по возрастанию, без списка всех id
+    в памяти."""
+    last = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last).order_by(
+            "pk").values_list("pk", flat=True)[:size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def restore_dates(model, field, objects, dates):
+    """Возвращает вставленным записям даты из файла.
+
+    ``auto_now_add`` заменяет при вставке даже явно заданную дату, а
+    отключать его на общем поле модели нельзя - параллельные сохранения
+    остались бы без даты. Поэтому даты записываются вторым запросом в
+    той же транзакции.
+    """
+    for item, date in zip(objects, dates):
+        setattr(item, field, date)
+    model.objects.bulk_update(objects, [field])
+
+
+class Importer:
+    """Загружает таблицы пачками, разрешая имена и slug через словари."""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.users = dict(User.objects.values_list("username", "pk"))
+        self.groups = dict(Group.objects.values_list("slug", "pk"))
+        self.skipped = 0
+        # на сколько сдвигаются id из файла; записи с id больше сдвига
+        # загружены этим импортом
+        self.post_offset = Post.objects.aggregate(last=Max("pk"))["last"] or 0
+        self.comment_offset = Comment.objects.aggregate(
+            last=Max("pk"))["last"] or 0
+        # подписки не сдвигаются, но новые строки получают id после этого
+        self.follow_offset = Follow.objects.aggregate(
+            last=Max("pk"))["last"] or 0
+
+    def user_ids(self, rows, *columns):
+        """Id пользователей из столбцов пачки, недостающие создаются."""
+        names = {row[column] for row in rows for column in columns}
+        missing = names - self.users.keys()
+        if missing:
+            User.objects.bulk_create(
+                (User(username=name) for name in missing),
+                ignore_conflicts=True)
+            self.users.update(User.objects.filter(
+                username__in=missing).values_list("username", "pk"))
+        return self.users
+
+    def load(self, table, rows):
+        """Загружает строки таблицы; возвращает их число."""
+        model = TABLES[table][0]
+        count = 0
+        for batch in batches(rows, self.batch_size):
+            objects = getattr(self, f"_{table}")(batch)
+            dates = None
+            if table in DATES:
+                dates = [getattr(item, DATES[table]) for item in objects]
+            # id сдвинуты за существующие, поэтому конфликт поста или
+            # комментария - ошибка, а не повод молча пропустить запись
+            model.objects.bulk_create(objects,
+                                      ignore_conflicts=table in MERGED)
+            if dates is not None:
+                restore_dates(model, DATES[table], objects, dates)
+            count += len(batch)
+        if table == "groups":
+            self.groups = dict(Group.objects.values_list("slug", "pk"))
+        return count
+
+    def _groups(self, batch):
+        return [Group(slug=row["slug"], title=row["title"],
+                      description=row["description"] or "")
+                for row in batch]
+
+    def _posts(self, batch):
+        users = self.user_ids(batch, "author")
+        return [Post(id=int(row["id"]) + self.post_offset, text=row["text"],
+                     pub_date=parse_datetime(row["pub_date"]),
+                     author_id=users[row["author"]],
+                     group_id=self.groups.get(row["group"]),
+                     image=row["image"] or "",
+                     # в файлах старых выгрузок размеров нет
+                     image_width=row.get("image_width") or None,
+                     image_height=row.get("image_height") or None)
+                for row in batch]
+
+    def _comments(self, batch):
+        users = self.user_ids(batch, "author")
+        # комментарий может ссылаться только на пост из этой загрузки,
+        # а не на существовавший пост с тем же id
+        posts = set(Post.objects.filter(
+            pk__in=[int(row["post"]) + self.post_offset for row in batch],
+            pk__gt=self.post_offset).values_list("pk", flat=True))
+        objects = [Comment(id=int(row["id"]) + self.comment_offset,
+                           post_id=int(row["post"]) + self.post_offset,
+                           author_id=users[row["author"]], text=row["text"],
+                           created=parse_datetime(row["created"]))
+                   for row in batch
+                   if int(row["post"]) + self.post_offset in posts]
+        self.skipped += len(batch) - len(objects)
+        return objects
+
+    def _follows(self, batch):
+        users = self.user_ids(batch, "user", "author")
+        return [Follow(user_id=users[row["user"]],
+                       author_id=users[row["author"]])
+                for row in batch if row["user"] != row["author"]]
+
+
+def export(directory, fmt, tables=tuple(TABLES), report=None):
+    """Выгружает таблицы в ``directory``; report(table, rows, seconds)
+    вызывается после каждой таблицы."""
+    for table in tables:
+        started = time.monotonic()
+        with open(file_path(directory, table, fmt), "w", newline="",
+                  encoding="utf-8") as output:
+            count = write(export_rows(table), output, fmt,
+                          list(TABLES[table][1]))
+        if report is not None:
+            report(table, count, time.monotonic() - started)
+
+
+def refresh_derived(importer, now=None):
+    """Индексирует, раскладывает по лентам и учитывает в счётчиках и
+    рейтинге записи, загруженные ``importer``, пачками по id."""
+    now = now or timezone.now()
+    posts = Post.objects.filter(pk__gt=importer.post_offset)
+    for ids in id_chunks(posts):
+        search.index_posts(ids)
+        timeline.fan_out(ids)
+        counters.recount(
+            posts.filter(pk__in=ids).values_list("author_id", flat=True),
+            ids)
+    for ids in id_chunks(Comment.objects.filter(
+            pk__gt=importer.comment_offset)):
+        trending.add_comments(ids, now)
+    for ids in id_chunks(Follow.objects.filter(
+            pk__gt=importer.follow_offset)):
+        pairs = list(Follow.objects.filter(pk__in=ids).values_list(
+            "user_id", "author_id"))
+        user_ids = {user_id for pair in pairs for user_id in pair}
+        graph.forget(user_ids)
+        timeline.add_follows(pairs)
+        counters.recount(user_ids)
+    trending.refresh(now)
+    # сигналы не сработали, поэтому закэшированные страницы сбрасываются
+    fragments.bump(fragments.ALL_FEEDS)
+
+
+def load(directory, fmt, batch_size=1000, report=None):
+    """Загружает таблицы, чьи файлы есть в ``directory``, и пересчитывает
+    производные данные загруженных записей. Возвращает число пропущенных
+    комментариев к отсутствующим постам."""
+    with transaction.atomic():
+        importer = Importer(batch_size)
+        for table in TABLES:
+            name = file_path(directory, table, fmt)
+            if not os.path.exists(name):
+                continue
+            started = time.monotonic()
+            with open(name, newline="", encoding="utf-8") as source:
+                count = importer.load(table, read(source, fmt))
+            if report is not None:
+                report(table, count, time.monotonic() - started)
+        # id вставлялись явно, последовательности нужно сдвинуть за них
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]):
+                cursor.execute(sql)
+    refresh_derived(importer)
+    return importer.skipped
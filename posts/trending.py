@@ -0,0 +1,130 @@
+"""Лента популярного: посты с наибольшим затухающим рейтингом.
+
+Рейтинг поста (``TrendingScore``) растёт на вес события, когда к посту
+пишут комментарий или у его автора появляется подписчик, и вдвое
+уменьшается за каждые ``settings.TRENDING_HALF_LIFE`` секунд. Сигналы
+обновляют его по событию, без пересчёта по всем комментариям.
+Периодическая задача (команда ``refresh_trending``) приводит рейтинги
+к текущему моменту, сортирует и кладёт в кэш готовый список id
+лучших постов. Лента читает этот список и показывает посты теми же
+карточками, что и остальные ленты.
+"""
+import heapq
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from yatube.cache import get_or_compute
+from yatube.sqlite import replica
+
+from . import fragments
+from .models import Comment, Post, TrendingScore
+
+RANKING_KEY = "trending:ranking"
+
+
+def decayed(score, updated, now):
+    """Рейтинг ``score`` на момент ``updated``, приведённый к ``now``."""
+    age = (now - updated).total_seconds()
+    return score * 0.5 ** (max(age, 0) / settings.TRENDING_HALF_LIFE)
+
+
+def window_start(now=None):
+    """Посты, опубликованные раньше, в популярное не попадают."""
+    return (now or timezone.now()) - timedelta(
+        seconds=settings.TRENDING_WINDOW)
+
+
+def add(weights, now=None):
+    """Прибавляет веса ``{id поста: вес}`` к рейтингам постов."""
+    if not weights:
+        return
+    now = now or timezone.now()
+    with transaction.atomic():
+        scores = TrendingScore.objects.in_bulk(list(weights))
+        for trend in scores.values():
+            trend.score = (decayed(trend.score, trend.updated, now)
+                           + weights[trend.pk])
+            trend.updated = now
+        TrendingScore.objects.bulk_update(scores.values(),
+                                          ["score", "updated"])
+        TrendingScore.objects.bulk_create(
+            TrendingScore(post_id=pk, score=weight, updated=now)
+            for pk, weight in weights.items() if pk not in scores)
+
+
+def comment_added(comment):
+    add({comment.post_id: settings.TRENDING_WEIGHTS["comment"]},
+        comment.created)
+
+
+def follower_added(author_id):
+    """Новый подписчик поднимает недавние посты автора."""
+    weight = settings.TRENDING_WEIGHTS["follower"]
+    post_ids = Post.objects.filter(
+        author_id=author_id, pub_date__gte=window_start()).values_list(
+        "pk", flat=True)
+    add(dict.fromkeys(post_ids, weight))
+
+
+def _best(now):
+    TrendingScore.objects.filter(post__pub_date__lt=window_start(now)).delete()
+    rows = TrendingScore.objects.values_list("post_id", "score", "updated")
+    best = heapq.nlargest(
+        settings.TRENDING_SIZE,
+        ((decayed(score, updated, now), pk) for pk, score, updated in rows))
+    return [pk for _, pk in best]
+
+
+def refresh(now=None):
+    """Пересобирает список лучших постов и удаляет рейтинги постов,
+    вышедших из окна. Возвращает список id."""
+    ranking = _best(now or timezone.now())
+    # запись в формате get_or_compute, её читает ranking()
+    cache.set(RANKING_KEY, (None, ranking), None)
+    fragments.bump(fragments.TRENDING)
+    return ranking
+
+
+def ranking():
+    """Id постов популярного от лучшего к худшему."""
+    # кэш пуст (первый запуск или сброс): список не ждёт задачу, но
+    # считает его один процесс, а остальные ждут его результат
+    return get_or_compute(RANKING_KEY, lambda: _best(timezone.now()),
+                          timeout=replica.cache_timeout(None))
+
+
+def _comment_scores(comments, now):
+    weight = settings.TRENDING_WEIGHTS["comment"]
+    scores = Counter()
+    rows = comments.filter(post__pub_date__gte=window_start(now)).values_list(
+        "post_id", "created")
+    for post_id, created in rows.iterator():
+        scores[post_id] += decayed(weight, created, now)
+    return scores
+
+
+def add_comments(comment_ids, now=None):
+    """Прибавляет к рейтингам вклад комментариев ``comment_ids``, например
+    загруженных ``bulk_create`` без сигналов. Список лучших постов не
+    пересобирается - это делает ``refresh``."""
+    now = now or timezone.now()
+    add(_comment_scores(Comment.objects.filter(pk__in=comment_ids), now),
+        now)
+
+
+def rebuild(now=None):
+    """Считает рейтинги заново по комментариям в окне; подписки без
+    даты при этом не учитываются."""
+    now = now or timezone.now()
+    scores = _comment_scores(Comment.objects.all(), now)
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            TrendingScore(post_id=pk, score=score, updated=now)
+            for pk, score in scores.items())
+    return refresh(now)
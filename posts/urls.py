@@ -7,8 +7,12 @@ urlpatterns = [
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
     path("new/", views.new_post, name="new_post"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("search/", views.search_posts, name="search"),
+    path("trending/", views.trending_posts, name="trending"),
     path("<str:username>/", views.profile, name="profile"),
     path("<str:username>/<int:post_id>/", views.post_view, name="post"),
+    path("<str:username>/<int:post_id>/comments/", views.post_comments,
+         name="post_comments"),
     path("<str:username>/<int:post_id>/edit/", views.post_edit,
          name="post_edit"),
     path("<username>/<int:post_id>/comment", views.add_comment,
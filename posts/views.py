@@ -1,19 +1,62 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.conf import settings
+from django.template.loader import render_to_string
+from django.urls import reverse
 
+from . import (counters, fragments, graph, search, timeline, trending,
+               writebehind)
+from .conditional import (conditional, known_id, remember_id, slug_key,
+                          username_key)
 from .forms import CommentForm, PostForm
-from .models import Group, Post, Follow, User
+from .models import Group, Post, User
+from .pagination import comment_batch, paginate
+
+
+# поколения, от которых зависят страницы, для условного GET
+
+def _group_names(slug):
+    group_id = known_id(slug_key(slug))
+    return None if group_id is None else [f"group:{group_id}"]
+
+
+def _profile_names(username):
+    user_id = known_id(username_key(username))
+    if user_id is None:
+        return None
+    return [f"profile:{user_id}", fragments.user_name(user_id)]
+
 
+def _own_profile_names(user, username):
+    # рекомендации видит только владелец на своей странице профиля
+    return [fragments.SUGGESTIONS] if user.username == username else []
 
+
+def _post_names(username, post_id):
+    names = _profile_names(username)
+    if names is None:
+        return None
+    return [fragments.post_name(post_id), *names]
+
+
+def _following(current_user, author):
+    """Подписан ли текущий пользователь на автора; по графу в кэше."""
+    if not current_user.is_authenticated or current_user == author:
+        return False
+    if settings.WRITE_BEHIND:
+        pending = writebehind.pending_follow(current_user.pk, author.pk)
+        if pending is not None:
+            return pending
+    return graph.is_following(current_user.pk, author.pk)
+
+
+@conditional(lambda: ["index"])
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    # Из URL извлекаем номер запрошенной страницы - это значение параметра page
-    page_number = request.GET.get("page")
-    # Получаем набор записей для страницы с запрошенным номером
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    # Страница по номеру (?page=) или по курсору (?cursor=)
+    page = paginate(request, post_list)
     return render(
         request,
         "index.html",
@@ -21,14 +64,12 @@ def index(request):
     )
 
 
+@conditional(_group_names)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    # Из URL извлекаем номер запрошенной страницы - это значение параметра page
-    page_number = request.GET.get("page")
-    # Получаем набор записей для страницы с запрошенным номером
-    page = paginator.get_page(page_number)
+    remember_id(slug_key(slug), group.pk)
+    posts = group.posts.for_feed()
+    page = paginate(request, posts)
     return render(
         request,
         "group.html",
@@ -36,6 +77,36 @@ def group_posts(request, slug):
     )
 
 
+def search_posts(request):
+    query = request.GET.get("q", "").strip()
+    page = None
+    if query:
+        # результаты идут по рангу, а не по дате, поэтому курсоры ленты
+        # здесь не подходят - только номера страниц
+        paginator = Paginator(search.ranked(query), settings.POST_PER_PAGE)
+        paginator.number_limit = settings.PAGE_NUMBER_LIMIT
+        page = paginator.get_page(request.GET.get("page"))
+        page.object_list = search.posts_for(page.object_list)
+    return render(
+        request,
+        "search.html",
+        {"page": page, "query": query, }
+    )
+
+
+# рейтинг меняет только пересборка, а правку, удаление и комментарии
+# постов отмечает поколение главной, где показываются все посты
+@conditional(lambda: [fragments.TRENDING, "index"])
+def trending_posts(request):
+    # порядок задаёт готовый рейтинг, поэтому страницы - по номерам
+    paginator = Paginator(trending.ranking(), settings.POST_PER_PAGE)
+    paginator.number_limit = settings.PAGE_NUMBER_LIMIT
+    page = paginator.get_page(request.GET.get("page"))
+    posts = Post.objects.for_feed().in_bulk(page.object_list)
+    page.object_list = [posts[pk] for pk in page.object_list if pk in posts]
+    return render(request, "trending.html", {"page": page})
+
+
 @login_required
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -47,50 +118,74 @@ def new_post(request):
     return render(request, "new.html", {"form": form})
 
 
+@conditional(_profile_names, _own_profile_names)
 def profile(request, username):
     user = get_object_or_404(User, username=username)
+    remember_id(username_key(username), user.pk)
     current_user = request.user
-    post_list = user.posts.all()
-    post_list_count = post_list.count()
-
-    following = False
-    if current_user.is_authenticated and current_user != user:
-        following = current_user.follower.filter(author=user).exists()
-
-    paginator = Paginator(post_list, 10)
-
-    # Из URL извлекаем номер запрошенной страницы - это значение параметра page
-    page_number = request.GET.get("page")
-
-    # Получаем набор записей для страницы с запрошенным номером
-    page = paginator.get_page(page_number)
+    post_list = user.posts.for_feed()
+    stats = counters.stats_for(user)
+    page = paginate(request, post_list, count=stats.posts_count)
     return render(request, "profile.html",
                   {"page": page,
                    "author": user,
-                   "count": post_list_count,
+                   "stats": stats,
+                   "count": stats.posts_count,
                    "current_user": current_user,
-                   "following": following,
+                   "following": _following(current_user, user),
                    })
 
 
+@conditional(_post_names)
 def post_view(request, username, post_id):
 
     current_user = request.user
-    post = get_object_or_404(Post, id=post_id, author__username=username)
+    post = get_object_or_404(Post.objects.for_feed(),
+                             id=post_id, author__username=username)
     user = post.author
-    users_post_count = user.posts.all().count()
+    remember_id(username_key(username), user.pk)
+    stats = counters.stats_for(user)
     form = CommentForm()
-    comments = post.comments.all()
+    comments, next_cursor = comment_batch(
+        post.comments.all(), request.GET.get("cursor"),
+        total=post.comment_count)
+    pending_comments = []
+    if settings.WRITE_BEHIND and current_user.is_authenticated:
+        # свои комментарии, которые ещё не сохранены
+        pending_comments = writebehind.pending_comments(current_user,
+                                                        post.pk)
     return render(request, "post.html",
                   {"author": user,
                    "post": post,
-                   "count": users_post_count,
+                   "stats": stats,
+                   "count": stats.posts_count,
                    "current_user": current_user,
+                   "following": _following(current_user, user),
                    "form": form,
                    "comments": comments,
+                   "next_cursor": next_cursor,
+                   "pending_comments": pending_comments,
                    })
 
 
+@conditional(_post_names)
+def post_comments(request, username, post_id):
+    """Следующая пачка комментариев для подгрузки на странице поста."""
+    post = get_object_or_404(Post, id=post_id, author__username=username)
+    comments, next_cursor = comment_batch(
+        post.comments.all(), request.GET.get("cursor"))
+    next_url = None
+    if next_cursor is not None:
+        next_url = (reverse("post_comments", args=[username, post_id])
+                    + "?cursor=" + next_cursor)
+    return JsonResponse({
+        "html": render_to_string("comment_list.html",
+                                 {"comments": comments}, request),
+        "next": next_cursor,
+        "next_url": next_url,
+    })
+
+
 @login_required
 def post_edit(request, username, post_id):
     profile = get_object_or_404(User, username=username)
@@ -115,43 +210,50 @@ def add_comment(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        if settings.WRITE_BEHIND:
+            writebehind.comment(request.user.pk, post.pk,
+                                form.cleaned_data["text"])
+        else:
+            comment = form.save(commit=False)
+            comment.author = request.user
+            comment.post = post
+            comment.save()
     return redirect("post", username, post_id)
 
 
 @login_required
 def follow_index(request):
-    post = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post, settings.POST_PER_PAGE)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    post = timeline.feed_for(request.user)
+    page = paginate(request, post)
+    if not page.has_next() and timeline.truncated(request.user):
+        # страница дошла до конца обрезанной ленты: она и следующие за
+        # ней строятся join по Follow
+        page = paginate(request, timeline.pull_feed(request.user))
     form = CommentForm()
     return render(request, "follow.html",
                   {"page": page,
-                   "paginator": paginator,
+                   "paginator": page.paginator,
                    "form": form,
                    })
 
 
 @login_required
 def profile_follow(request, username):
-    user = request.user
     author = get_object_or_404(User, username=username)
-    if author != user:
-        Follow.objects.get_or_create(author=author, user=user)
+    if settings.WRITE_BEHIND:
+        writebehind.follow(request.user.pk, author.pk)
+    else:
+        graph.follow(request.user.pk, author.pk)
     return redirect("profile", username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-
-    user = request.user
     author = get_object_or_404(User, username=username)
-    if author != user:
-        Follow.objects.filter(author=author, user=user).delete()
+    if settings.WRITE_BEHIND:
+        writebehind.unfollow(request.user.pk, author.pk)
+    else:
+        graph.unfollow(request.user.pk, author.pk)
     return redirect("profile", username=username)
 
 
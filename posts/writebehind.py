@@ -0,0 +1,434 @@
+"""Отложенная запись комментариев и подписок.
+
+При ``settings.WRITE_BEHIND`` представления не пишут в базу сами:
+запись добавляется строкой JSON в общий для всех процессов журнал
+``settings.WRITE_BEHIND_DIR/journal.log`` (под ``flock`` и с ``fsync``,
+до ответа пользователю), а сохраняет её пачками через ``bulk_create``
+один писатель. У SQLite один писатель, поэтому одна транзакция на пачку
+вместо транзакции на запрос не даёт всплеску комментариев к популярному
+посту выстроиться в очередь за блокировкой.
+
+Писатель - тот процесс, который сейчас держит ``flock`` на
+``writer.lock``: фоновый поток каждого воркера раз в
+``settings.WRITE_BEHIND_INTERVAL`` секунд пробует им стать, можно и
+запустить отдельный процесс ``manage.py flush_writes --follow``.
+Писатель переименовывает накопленный журнал в пачку с очередным номером
+и сохраняет пачки по номерам, удаляя сохранённые. Порядок строк журнала -
+порядок отправки из всех процессов, поэтому комментарии к посту получают
+id и дату в порядке отправки, а подписка и следующая за ней отписка,
+отправленные через разные воркеры, не меняются местами.
+
+Повторное сохранение пачки после сбоя не создаёт дублей: у комментария
+есть ``token`` из журнала, а подписки сводятся к последнему желаемому
+состоянию пары. Пачка, которая не сохраняется
+``settings.WRITE_BEHIND_RETRIES`` раз подряд, сохраняется по одной
+записи, а записи с ошибкой переносятся в ``failed/`` и не задерживают
+остальные.
+
+Пока запись не сохранена, её автор видит её через «наложение» в кэше
+(``pending_comments``, ``pending_follow``): каждая запись лежит в своём
+ключе под номером из ``cache.incr``, и одновременные запросы
+пользователя не затирают записи друг друга. Страницы, на которых запись
+видна, получают новое поколение фрагментов.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from yatube.sqlite import replica
+
+from . import counters, fragments, search, signals, trending
+from .models import Comment, Follow, Post, User
+
+logger = logging.getLogger(__name__)
+
+COMMENT = "comment"
+FOLLOW = "follow"
+UNFOLLOW = "unfollow"
+
+JOURNAL = "journal.log"
+WRITER_LOCK = "writer.lock"
+BATCH_SUFFIX = ".batch"
+FAILED = "failed"
+
+_lock = threading.Lock()
+# внутри процесса пачки тоже сохраняет один поток
+_flush_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+_thread = None
+# сколько записей процесс добавил с последнего пробуждения писателя
+_submitted = 0
+# сколько раз подряд не сохранилась пачка: {путь: число}
+_failures = {}
+
+
+def _directory():
+    directory = settings.WRITE_BEHIND_DIR
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _counter_key(user_id):
+    return f"writes:{user_id}"
+
+
+def _entry_key(user_id, slot):
+    return f"writes:{user_id}:{slot}"
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def _append(line):
+    """Дописывает строку в общий журнал."""
+    path = os.path.join(_directory(), JOURNAL)
+    while True:
+        with open(path, "a", encoding="utf-8") as journal:
+            fcntl.flock(journal, fcntl.LOCK_EX)
+            # пока ждали блокировку, писатель мог унести файл в пачку
+            if os.fstat(journal.fileno()).st_ino != _inode(path):
+                continue
+            journal.write(line)
+            journal.flush()
+            os.fsync(journal.fileno())
+            return
+
+
+def _read(path):
+    entries = []
+    with open(path, encoding="utf-8") as journal:
+        for line in journal:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # строка, которую процесс не успел дописать до падения
+                logger.warning("Пропущена неполная запись журнала: %r", line)
+    return entries
+
+
+def _reserve(user_id):
+    """Номер ключа наложения для новой записи пользователя."""
+    key = _counter_key(user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # счётчик без срока: номера не должны повторяться, пока живы
+        # записи с прежними номерами
+        cache.add(key, 0, None)
+        return cache.incr(key)
+
+
+def _forget(entries):
+    cache.delete_many([_entry_key(entry["user"], entry["slot"])
+                       for entry in entries])
+
+
+def _visible_names(entry):
+    """Поколения страниц, на которых автор записи её увидит."""
+    if entry["op"] == COMMENT:
+        return [fragments.post_name(entry["post"])]
+    return [fragments.user_name(entry["author"]),
+            fragments.user_name(entry["user"])]
+
+
+def submit(op, user_id, **fields):
+    """Добавляет запись в журнал; возвращает её словарь.
+
+    После возврата запись не потеряется и при падении процесса, а её
+    автор уже видит её на страницах.
+    """
+    global _submitted
+    entry = {"op": op, "token": uuid.uuid4().hex, "user": user_id,
+             "slot": _reserve(user_id), **fields}
+    _append(json.dumps(entry, ensure_ascii=False) + "\n")
+    cache.set(_entry_key(user_id, entry["slot"]), entry,
+              settings.WRITE_BEHIND_PENDING_TIMEOUT)
+    fragments.bump(*_visible_names(entry))
+    # следующие запросы автора читают с основной базы, иначе после
+    # сохранения он не увидел бы запись, пока её нет на реплике
+    replica.wrote()
+    with _lock:
+        _submitted += 1
+        full = _submitted >= settings.WRITE_BEHIND_BATCH
+        if full:
+            _submitted = 0
+    if _thread is not None and not _thread.is_alive():
+        # поток не пережил fork воркера
+        start()
+    if full:
+        _wake.set()
+    return entry
+
+
+def comment(user_id, post_id, text):
+    return submit(COMMENT, user_id, post=post_id, text=text)
+
+
+def follow(user_id, author_id):
+    if user_id == author_id:
+        return None
+    return submit(FOLLOW, user_id, author=author_id)
+
+
+def unfollow(user_id, author_id):
+    return submit(UNFOLLOW, user_id, author=author_id)
+
+
+def pending(user_id):
+    """Ещё не сохранённые записи пользователя, в порядке отправки; не
+    больше ``settings.WRITE_BEHIND_PENDING_LIMIT`` последних."""
+    last = cache.get(_counter_key(user_id))
+    if not last:
+        return []
+    keys = [_entry_key(user_id, slot) for slot in range(
+        max(1, last - settings.WRITE_BEHIND_PENDING_LIMIT + 1), last + 1)]
+    found = cache.get_many(keys)
+    return [found[key] for key in keys if key in found]
+
+
+def pending_comments(user, post_id):
+    """Несохранённые комментарии пользователя к посту - объекты Comment
+    без id для вывода на странице."""
+    return [Comment(post_id=post_id, author=user, text=entry["text"])
+            for entry in pending(user.pk)
+            if entry["op"] == COMMENT and entry["post"] == post_id]
+
+
+def pending_follow(user_id, author_id):
+    """True или False, если пользователь подписался или отписался от
+    автора и это ещё не сохранено, иначе None."""
+    state = None
+    for entry in pending(user_id):
+        if entry["op"] != COMMENT and entry["author"] == author_id:
+            state = entry["op"] == FOLLOW
+    return state
+
+
+def _comments_saved(saved):
+    """Производные данные сохранённых комментариев - как у сигнала
+    ``comment_created``, но одним изменением на пост."""
+    texts = defaultdict(list)
+    for item in saved:
+        texts[item.post_id].append(item.text)
+    for post_id, post_texts in texts.items():
+        counters.bump_post(post_id, len(post_texts))
+        weights = Counter()
+        for text in post_texts:
+            weights += search.weigh(text, "comment")
+        search.change([post_id], weights)
+        signals.comments_changed(post_id)
+    weight = settings.TRENDING_WEIGHTS["comment"]
+    trending.add({post_id: len(post_texts) * weight
+                  for post_id, post_texts in texts.items()})
+
+
+def _save_comments(entries, users):
+    tokens = [entry["token"] for entry in entries]
+    saved_before = {token.hex for token in Comment.objects.filter(
+        token__in=tokens).values_list("token", flat=True)}
+    # пост могли удалить, пока запись ждала в очереди
+    posts = set(Post.objects.filter(
+        pk__in={entry["post"] for entry in entries}).values_list(
+        "pk", flat=True))
+    new = [Comment(token=entry["token"], post_id=entry["post"],
+                   author_id=entry["user"], text=entry["text"])
+           for entry in entries
+           if entry["token"] not in saved_before
+           and entry["post"] in posts and entry["user"] in users]
+    Comment.objects.bulk_create(new)
+    _comments_saved(new)
+    return len(new)
+
+
+def _save_follows(wanted, users):
+    """Приводит подписки к ``{(user, author): нужна ли}``."""
+    existing = set(Follow.objects.filter(
+        user_id__in={user for user, _ in wanted},
+        author_id__in={author for _, author in wanted}).values_list(
+        "user_id", "author_id"))
+    new = [Follow(user_id=user, author_id=author)
+           for (user, author), follows in wanted.items()
+           if follows and (user, author) not in existing
+           and user in users and author in users]
+    Follow.objects.bulk_create(new)
+    for item in new:
+        # bulk_create не отправляет post_save
+        signals.follow_created(Follow, item, created=True)
+    for (user, author), follows in wanted.items():
+        if not follows and (user, author) in existing:
+            # удаление через queryset отправит post_delete
+            Follow.objects.filter(user_id=user, author_id=author).delete()
+    return len(new)
+
+
+def _apply_batch(entries):
+    comments = [entry for entry in entries if entry["op"] == COMMENT]
+    wanted = {}
+    for entry in entries:
+        if entry["op"] != COMMENT:
+            wanted[(entry["user"], entry["author"])] = entry["op"] == FOLLOW
+    # пользователя могли удалить, пока запись ждала в очереди
+    ids = {entry["user"] for entry in entries}
+    ids.update(author for _, author in wanted)
+    with transaction.atomic():
+        users = set(User.objects.filter(pk__in=ids).values_list(
+            "pk", flat=True))
+        created = _save_comments(comments, users) if comments else 0
+        if wanted:
+            created += _save_follows(wanted, users)
+    # наложение убирается после фиксации, и страницы обновляются ещё раз:
+    # иначе запрос между этими шагами закэшировал бы запись дважды
+    _forget(entries)
+    fragments.bump(*{name for entry in entries
+                     for name in _visible_names(entry)})
+    return created
+
+
+def apply(entries):
+    """Сохраняет записи журнала по порядку, одной транзакцией на каждые
+    ``settings.WRITE_BEHIND_BATCH`` записей; возвращает число созданных
+    комментариев и подписок."""
+    size = settings.WRITE_BEHIND_BATCH
+    return sum(_apply_batch(entries[start:start + size])
+               for start in range(0, len(entries), size))
+
+
+@contextmanager
+def _writer():
+    """Делает процесс писателем на время блока; даёт False, если
+    писатель уже есть."""
+    with open(os.path.join(_directory(), WRITER_LOCK), "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+        else:
+            yield True
+
+
+def _batches():
+    return sorted(name for name in os.listdir(settings.WRITE_BEHIND_DIR)
+                  if name.endswith(BATCH_SUFFIX))
+
+
+def _rotate():
+    """Уносит накопленный журнал в пачку со следующим номером."""
+    directory = settings.WRITE_BEHIND_DIR
+    path = os.path.join(directory, JOURNAL)
+    if not os.path.exists(path):
+        return
+    with open(path, "a", encoding="utf-8") as journal:
+        fcntl.flock(journal, fcntl.LOCK_EX)
+        if os.fstat(journal.fileno()).st_size == 0:
+            return
+        # номер, а не время: порядок пачек не зависит от часов
+        batches = _batches()
+        number = int(batches[-1].split(".")[0]) + 1 if batches else 1
+        os.rename(path, os.path.join(directory,
+                                     f"{number:012d}{BATCH_SUFFIX}"))
+
+
+def _isolate(path, entries):
+    """Сохраняет пачку по одной записи; записи с ошибкой переносит в
+    ``failed/``."""
+    failed = []
+    for entry in entries:
+        try:
+            apply([entry])
+        except Exception:
+            logger.exception("Запись журнала не сохраняется: %r", entry)
+            failed.append(entry)
+    if failed:
+        directory = os.path.join(settings.WRITE_BEHIND_DIR, FAILED)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, os.path.basename(path)), "a",
+                  encoding="utf-8") as journal:
+            for entry in failed:
+                journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        # автор больше не увидит запись, которая не сохранится
+        _forget(failed)
+
+
+def _apply_file(path):
+    entries = _read(path)
+    try:
+        apply(entries)
+    except Exception:
+        _failures[path] = _failures.get(path, 0) + 1
+        if _failures[path] < settings.WRITE_BEHIND_RETRIES:
+            # следующие пачки ждут: иначе нарушился бы порядок
+            raise
+        logger.exception("Пачка %s сохраняется по одной записи", path)
+        _isolate(path, entries)
+    _failures.pop(path, None)
+    os.remove(path)
+    return len(entries)
+
+
+def flush():
+    """Сохраняет все отправленные записи, если процесс может стать
+    писателем; возвращает число сохранённых записей журнала."""
+    flushed = 0
+    with _flush_lock, _writer() as writer:
+        if not writer:
+            return 0
+        _rotate()
+        for name in _batches():
+            flushed += _apply_file(
+                os.path.join(settings.WRITE_BEHIND_DIR, name))
+    return flushed
+
+
+def run(stop):
+    """Сохраняет журнал каждые ``settings.WRITE_BEHIND_INTERVAL`` секунд,
+    пока не установлено событие ``stop``."""
+    while not stop.is_set():
+        _wake.wait(settings.WRITE_BEHIND_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Не удалось сохранить отложенные записи")
+    connections.close_all()
+
+
+def start():
+    """Запускает фоновый поток сохранения; вызывается из yatube/wsgi.py."""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=run, args=(_stop,),
+                                   name="writebehind", daemon=True)
+        _thread.start()
+    # поток перезапускается после fork, а остаток сохраняется один раз
+    atexit.unregister(stop)
+    atexit.register(stop)
+
+
+def stop():
+    """Останавливает поток и сохраняет остаток журнала."""
+    global _thread
+    thread = _thread
+    if thread is not None:
+        _stop.set()
+        _wake.set()
+        thread.join()
+        _thread = None
+    flush()
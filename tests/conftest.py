@@ -1,4 +1,15 @@
+import pytest
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def test_environment():
+    # кэш тестов - во временном каталоге, а не в рабочем memcached/cache
+    from yatube.testing import test_environment
+
+    with test_environment():
+        yield
@@ -0,0 +1,167 @@
+"""Общий для всех процессов кэш проекта.
+
+``FallbackCache`` работает с основным сервером кэша (memcached) и
+переключается на локальную замену - файловый кэш, который тоже общий для
+всех воркеров на машине, - если сервер не отвечает. Раз в
+``RETRY_INTERVAL`` секунд основной сервер проверяется снова; после
+восстановления он очищается, чтобы не отдать записи, которые успели
+устареть, пока работал запасной кэш.
+
+Неверный бэкенд или не установленная клиентская библиотека - ошибка
+настройки, а не сбой сервера: такой кэш не создаётся, вместо того чтобы
+молча работать на замене, где ``add`` и ``incr`` не атомарны между
+процессами.
+
+``get_or_compute`` защищает горячие ключи от одновременного пересчёта:
+значение пересчитывает только один процесс, остальные ждут его или
+отдают предыдущее значение (stale-while-revalidate).
+"""
+import logging
+import time
+import uuid
+
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import BaseCache
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+PING_KEY = "fallback-cache:ping"
+_MISSING = object()
+
+
+def _create(params):
+    params = dict(params)
+    backend = import_string(params.pop("BACKEND"))
+    return backend(params.pop("LOCATION", ""), params)
+
+
+class FallbackCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.retry_interval = options.get("RETRY_INTERVAL", 30)
+        self._fallback = _create(options["FALLBACK"])
+        self._primary = _create(options["PRIMARY"])
+        self._down = False
+        self._next_check = 0
+
+    def _alive(self):
+        token = uuid.uuid4().hex
+        try:
+            self._primary.set(PING_KEY, token, 10)
+            return self._primary.get(PING_KEY) == token
+        except Exception:
+            return False
+
+    def _mark_down(self):
+        logger.warning("Основной кэш не отвечает, работает запасной")
+        self._down = True
+        self._next_check = time.monotonic() + self.retry_interval
+
+    def _backend(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            # клиенты memcached не бросают исключений, когда сервер
+            # недоступен, поэтому он периодически проверяется явно
+            self._next_check = now + self.retry_interval
+            if not self._alive():
+                self._mark_down()
+            elif self._down:
+                # пока работал запасной кэш, поколения ключей менялись там
+                self._primary.clear()
+                self._down = False
+        return self._fallback if self._down else self._primary
+
+    def _call(self, method, *args, **kwargs):
+        backend = self._backend()
+        try:
+            return getattr(backend, method)(*args, **kwargs)
+        except ValueError:
+            # incr/decr отсутствующего ключа - обычная ситуация
+            raise
+        except Exception:
+            if backend is self._fallback:
+                raise
+            self._mark_down()
+            return getattr(self._fallback, method)(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        return self._call("add", *args, **kwargs)
+
+    def get(self, key, default=None, version=None):
+        value = self._call("get", key, _MISSING, version)
+        hit = value is not _MISSING
+        metrics.record_cache(hit, not hit)
+        return value if hit else default
+
+    def set(self, *args, **kwargs):
+        return self._call("set", *args, **kwargs)
+
+    def touch(self, *args, **kwargs):
+        return self._call("touch", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call("delete", *args, **kwargs)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._call("get_many", keys, version)
+        metrics.record_cache(len(found), len(keys) - len(found))
+        return found
+
+    def has_key(self, *args, **kwargs):
+        return self._call("has_key", *args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        return self._call("incr", *args, **kwargs)
+
+    def decr(self, *args, **kwargs):
+        return self._call("decr", *args, **kwargs)
+
+    def set_many(self, *args, **kwargs):
+        return self._call("set_many", *args, **kwargs)
+
+    def delete_many(self, *args, **kwargs):
+        return self._call("delete_many", *args, **kwargs)
+
+    def clear(self):
+        return self._call("clear")
+
+    def close(self, **kwargs):
+        for backend in (self._primary, self._fallback):
+            backend.close(**kwargs)
+
+
+def get_or_compute(key, compute, version=None, timeout=None,
+                   lock_timeout=10, wait=2.0, cache=default_cache):
+    """Возвращает значение ключа, пересчитывая его в одном процессе.
+
+    Значение хранится вместе с ``version``; запись с другой версией
+    считается устаревшей. Пока один процесс пересчитывает значение под
+    блокировкой, остальные отдают устаревшее, а если его нет - ждут
+    результат до ``wait`` секунд и только потом считают сами.
+    """
+    lock_key = f"{key}:lock"
+    entry = cache.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            value = compute()
+            cache.set(key, (version, value), timeout)
+            return value
+        finally:
+            cache.delete(lock_key)
+    if entry is not None:
+        return entry[1]
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+    return compute()
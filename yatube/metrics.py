@@ -0,0 +1,237 @@
+"""Метрики запросов: время, SQL, шаблоны и кэш по каждому представлению.
+
+``MetricsMiddleware`` замеряет каждый запрос и складывает результат в
+гистограммы этого процесса. Представление ``stats_view`` отдаёт их
+сотрудникам в текстовом формате Prometheus. Если
+``settings.METRICS_SLOW_SAMPLE`` больше нуля, процесс помнит столько
+самых медленных запросов и пишет в лог каждый новый из них вместе с его
+SQL.
+"""
+import heapq
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_current = threading.local()
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами, как в Prometheus."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, view, value):
+        counts, total, count = self.series.get(
+            view, ([0] * len(self.buckets), 0, 0))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        self.series[view] = (counts, total + value, count + 1)
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for view, (counts, total, count) in sorted(self.series.items()):
+            bucket = f'{self.name}_bucket{{view="{view}",le='
+            for bound, value in zip(self.buckets, counts):
+                yield f'{bucket}"{bound}"}} {value}'
+            yield f'{bucket}"+Inf"}} {count}'
+            yield f'{self.name}_sum{{view="{view}"}} {total:.6f}'
+            yield f'{self.name}_count{{view="{view}"}} {count}'
+
+
+class Counter:
+    """Счётчик с произвольными метками."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        key = tuple(sorted(labels.items()))
+        self.series[key] = self.series.get(key, 0) + value
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(self.series.items()):
+            labels = ",".join(f'{name}="{label}"' for name, label in key)
+            yield f"{self.name}{{{labels}}} {value}"
+
+
+def _registry():
+    return {
+        "duration": Histogram(
+            "yatube_request_duration_seconds",
+            "Время обработки запроса", TIME_BUCKETS),
+        "queries": Histogram(
+            "yatube_db_queries", "SQL-запросов на запрос", QUERY_BUCKETS),
+        "db": Histogram(
+            "yatube_db_duration_seconds",
+            "Время SQL-запросов за запрос", TIME_BUCKETS),
+        "templates": Histogram(
+            "yatube_template_duration_seconds",
+            "Время отрисовки шаблонов за запрос", TIME_BUCKETS),
+        "requests": Counter(
+            "yatube_requests_total", "Ответы по кодам"),
+        "cache": Counter(
+            "yatube_cache_requests_total", "Чтения из кэша"),
+    }
+
+
+registry = _registry()
+_slowest = []
+
+
+def reset():
+    """Обнуляет накопленные метрики процесса."""
+    global registry
+    with _lock:
+        registry = _registry()
+        _slowest.clear()
+
+
+class RequestStats:
+
+    def __init__(self, keep_sql):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.sql = [] if keep_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        # обёртка connection.execute_wrapper вокруг каждого SQL-запроса
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if self.sql is not None:
+                self.sql.append((elapsed, sql))
+
+
+def current():
+    """Статистика запроса, который обрабатывает этот поток, или None."""
+    return getattr(_current, "stats", None)
+
+
+def record_cache(hits, misses):
+    """Учитывает чтения из кэша; вызывается бэкендом кэша."""
+    stats = current()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+class TimedTemplate(Template):
+    """Шаблон, который учитывает время отрисовки в статистике запроса."""
+
+    def render(self, context=None, request=None):
+        stats = current()
+        if stats is None or stats.template_depth:
+            # вложенная отрисовка уже учтена во внешней
+            return super().render(context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.template_depth -= 1
+
+
+class TimedTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, чьи шаблоны замеряют свою отрисовку."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template,
+                             self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template,
+                             self)
+
+
+class MetricsMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        keep = settings.METRICS_SLOW_SAMPLE
+        stats = _current.stats = RequestStats(keep_sql=keep > 0)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current.stats = None
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unresolved"
+        self.record(view, response.status_code, duration, stats)
+        if keep > 0:
+            self.sample(request, view, duration, stats, keep)
+        return response
+
+    def record(self, view, status, duration, stats):
+        with _lock:
+            registry["duration"].observe(view, duration)
+            registry["queries"].observe(view, stats.queries)
+            registry["db"].observe(view, stats.db_time)
+            registry["templates"].observe(view, stats.template_time)
+            registry["requests"].inc({"view": view, "status": status})
+            for result, count in (("hit", stats.cache_hits),
+                                  ("miss", stats.cache_misses)):
+                if count:
+                    registry["cache"].inc(
+                        {"view": view, "result": result}, count)
+
+    def sample(self, request, view, duration, stats, keep):
+        with _lock:
+            if len(_slowest) >= keep and duration <= _slowest[0]:
+                return
+            if len(_slowest) >= keep:
+                heapq.heapreplace(_slowest, duration)
+            else:
+                heapq.heappush(_slowest, duration)
+        logger.warning(
+            "Медленный запрос %s %s (%s): %.1f мс, %d SQL за %.1f мс\n%s",
+            request.method, request.get_full_path(), view, duration * 1000,
+            stats.queries, stats.db_time * 1000,
+            "\n".join(f"  {elapsed * 1000:.1f} мс  {sql}"
+                      for elapsed, sql in stats.sql))
+
+
+@staff_member_required
+def stats_view(request):
+    with _lock:
+        lines = [line for metric in registry.values()
+                 for line in metric.lines()]
+    return HttpResponse("\n".join(lines) + "\n",
+                        content_type="text/plain; version=0.0.4")
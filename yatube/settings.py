@@ -43,8 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.sqlite.replica.ReplicaMiddleware',
     # 'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'yatube.static.StaticMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,12 +59,27 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
+# без DEBUG шаблоны компилируются один раз на процесс: cached.Loader
+# запоминает и найденный путь, и скомпилированный шаблон
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader',
+                         TEMPLATE_LOADERS)]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [TEMPLATES_DIR, "templates/posts", "templates/about"],
-        'APP_DIRS': True,
+        # бэкенд Django, который учитывает время отрисовки в метриках
+        'BACKEND': 'yatube.metrics.TimedTemplates',
+        # имя движка по умолчанию, его ищут формы и страницы ошибок
+        'NAME': 'django',
+        # абсолютные пути: поиск шаблона не зависит от текущего каталога
+        'DIRS': [TEMPLATES_DIR, os.path.join(TEMPLATES_DIR, "posts"),
+                 os.path.join(TEMPLATES_DIR, "about")],
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -82,11 +99,35 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # соединение живёт между запросами, а не открывается на каждый
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {'timeout': 5},
+    },
+    # тот же файл, открытый только для чтения; см. DATABASE_ROUTERS
+    'readonly': {
+        'ENGINE': 'yatube.sqlite',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {'timeout': 5, 'READ_ONLY': True},
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+# реплика для чтения лент, если задан путь к ней; локально это второй
+# файл SQLite, который обновляет команда replicate
+if os.environ.get('DATABASE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'yatube.sqlite',
+        'NAME': os.environ['DATABASE_REPLICA'],
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {'timeout': 5, 'READ_ONLY': True},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['yatube.sqlite.routers.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -126,6 +167,8 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
+# имена с хэшем содержимого и сжатые копии, см. yatube/static.py
+STATICFILES_STORAGE = "yatube.static.StaticStorage"
 
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index"
@@ -139,10 +182,134 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш общий для всех воркеров: memcached, а если он недоступен -
+# файловый кэш в CACHE_DIR (см. yatube/cache.py)
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.cache.FallbackCache',
+        'OPTIONS': {
+            'PRIMARY': {
+                'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+                'LOCATION': os.environ.get('MEMCACHED_LOCATION',
+                                           '127.0.0.1:11211'),
+            },
+            'FALLBACK': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': CACHE_DIR,
+                'OPTIONS': {'MAX_ENTRIES': 10000},
+            },
+            'RETRY_INTERVAL': 30,
+        },
     }
 }
 
+# manage.py test держит кэш во временном каталоге, см. yatube/testing.py
+TEST_RUNNER = "yatube.testing.TestRunner"
+
 POST_PER_PAGE = 10
+
+# комментариев на странице поста и в каждой подгружаемой пачке
+COMMENTS_PER_PAGE = 20
+
+# сколько последних постов хранится в материализованной ленте подписок
+TIMELINE_SIZE = 500
+
+# до какой страницы работают адреса ?page=N, дальше лента листается курсором
+PAGE_NUMBER_LIMIT = 20
+
+# карточки постов кэшируются по версии, поэтому срок жизни может быть большим
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# миниатюры, которые нарезаются в фоне сразу после загрузки картинки
+POST_THUMBNAILS = {
+    "card": ("960x339", {"crop": "center", "upscale": True}),
+    "card_small": ("480x170", {"crop": "center", "upscale": True}),
+}
+# миниатюры для srcset картинки каждого размера, от меньшей к большей
+POST_IMAGE_SRCSET = {"card": ["card_small", "card"]}
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_KVSTORE = "posts.thumbnails.CacheKVStore"
+
+# вес одного вхождения слова при поиске в зависимости от того, где оно
+SEARCH_WEIGHTS = {"group": 3, "text": 2, "comment": 1}
+
+# сколько самых медленных запросов помнит процесс, записывая их SQL в лог;
+# 0 - выключено
+METRICS_SLOW_SAMPLE = 0
+
+# страницы для анонимов сбрасываются по поколениям, срок - страховка
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# представления, которые только показывают данные и могут читать с реплики
+REPLICA_VIEWS = ["index", "group_posts", "profile", "follow_index", "post",
+                 "post_comments", "trending"]
+# сколько секунд после записи пользователь читает с основной базы; должно
+# быть больше отставания реплики
+REPLICA_STICKY_SECONDS = 10
+
+# лента популярного: рейтинг поста уменьшается вдвое за TRENDING_HALF_LIFE
+# секунд, в ленту попадают посты не старше TRENDING_WINDOW секунд
+TRENDING_HALF_LIFE = 60 * 60 * 6
+TRENDING_WINDOW = 60 * 60 * 24 * 3
+TRENDING_WEIGHTS = {"comment": 1, "follower": 2}
+# сколько лучших постов хранит готовый рейтинг
+TRENDING_SIZE = 200
+
+# загрузки больше этого размера пишутся во временный файл, а не в память
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+# ограничения и формат картинок постов, см. posts.images
+IMAGE_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50 * 10 ** 6
+IMAGE_MAX_SIDE = 2048
+IMAGE_FORMAT = "WEBP"
+
+# чем рисуются карточки в лентах: "python" - posts.cards.render_card,
+# "template" - шаблон post_item.html; разметка у них одна
+POST_CARD_RENDERER = "python"
+# шаблоны, которые воркер компилирует при старте (см. yatube/wsgi.py),
+# чтобы первый запрос к странице не ждал поиска и разбора файлов
+TEMPLATE_PRELOAD = ["index.html", "group.html", "profile.html", "post.html",
+                    "follow.html", "search.html", "trending.html",
+                    "new.html", "post_item.html", "post_image.html",
+                    "comment_list.html"]
+
+# файлы с хэшем в имени кэшируются навсегда, остальная статика - на час
+WHITENOISE_MAX_AGE = 60 * 60
+# минификаторы collectstatic по расширению; пакеты rcssmin и rjsmin
+# необязательны и не входят в requirements.txt: без них файлы собираются
+# несжатыми, а collectstatic пишет предупреждение
+STATIC_MINIFIERS = {".css": "rcssmin.cssmin", ".js": "rjsmin.jsmin"}
+
+# списки подписок в кэше удаляются при подписке и отписке и читаются
+# заново из базы, срок - страховка
+FOLLOW_GRAPH_TIMEOUT = 60 * 60
+
+# рекомендации «Кого почитать» (posts.recommendations): вес за каждого
+# общего подписчика-посредника и за каждое общее сообщество
+SUGGESTION_WEIGHTS = {"follow": 1, "group": 0.5}
+# сколько рекомендаций хранится для пользователя и сколько показывается
+SUGGESTIONS_PER_USER = 20
+SUGGESTIONS_SHOWN = 5
+# сколько самых активных авторов сообщества становятся кандидатами
+SUGGESTION_GROUP_AUTHORS = 50
+
+# отложенная запись комментариев и подписок (posts.writebehind): запрос
+# только дописывает общий журнал, один писатель сохраняет записи пачками
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND") == "1"
+WRITE_BEHIND_DIR = os.path.join(BASE_DIR, "journal")
+# как часто писатель сохраняет журнал и сколько записей в одной транзакции
+WRITE_BEHIND_INTERVAL = 0.2
+WRITE_BEHIND_BATCH = 200
+# после стольких неудач подряд пачка сохраняется по одной записи, а
+# записи с ошибкой уходят в WRITE_BEHIND_DIR/failed
+WRITE_BEHIND_RETRIES = 3
+# сколько несохранённая запись видна автору через кэш (должно быть больше
+# задержки сохранения) и сколько его последних записей проверяется
+WRITE_BEHIND_PENDING_TIMEOUT = 60 * 5
+WRITE_BEHIND_PENDING_LIMIT = 20
+
+# файл, которого нет в манифесте collectstatic, - ошибка страницы, а не
+# адрес без хэша; тесты (yatube.testing) это отключают, как и DEBUG
+STATIC_MANIFEST_STRICT = True
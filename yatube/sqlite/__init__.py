@@ -0,0 +1,6 @@
+"""SQLite для боевой нагрузки: WAL, повторы при блокировке и соединение
+только для чтения.
+
+Пакет подключается как ``ENGINE`` в ``settings.DATABASES``; ``base``
+содержит сам бэкенд, ``routers`` - маршрутизатор чтений.
+"""
@@ -0,0 +1,98 @@
+"""Бэкенд SQLite с настройками для нескольких потоков и процессов.
+
+Каждое новое соединение включает WAL, в котором читатели не блокируют
+писателя и наоборот, и выполняет ``PRAGMA`` из ``DEFAULT_PRAGMAS``,
+дополненные ключом ``PRAGMAS`` в ``OPTIONS``. Транзакции начинаются с
+``BEGIN IMMEDIATE``: блокировка на запись берётся сразу и ждёт по
+``timeout``, а не падает посреди транзакции при попытке повысить
+блокировку чтения. Запрос вне транзакции, получивший «database is
+locked», повторяется ``RETRIES`` раз с растущей паузой. С ``READ_ONLY``
+файл открывается только для чтения.
+"""
+import os
+import random
+import time
+from urllib.request import pathname2url
+
+from django.db.backends.sqlite3 import base
+
+Database = base.Database
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    # в WAL запись с NORMAL не теряет целостность, только последние
+    # транзакции при отключении питания
+    "synchronous": "NORMAL",
+    # отрицательное значение - размер в КиБ, то есть 20 МиБ страниц
+    "cache_size": -20000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+BUSY_MESSAGES = ("database is locked", "database table is locked")
+
+
+def is_busy(error):
+    return str(error).startswith(BUSY_MESSAGES)
+
+
+class RetryingCursor(base.SQLiteCursorWrapper):
+    """Курсор, повторяющий запрос вне транзакции при блокировке базы."""
+
+    retries = 0
+    backoff = 0.0
+
+    def execute(self, query, params=None):
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retry(super().executemany, query, param_list)
+
+    def _retry(self, method, *args):
+        attempt = 0
+        while True:
+            try:
+                return method(*args)
+            except Database.OperationalError as error:
+                # в транзакции повтор одного запроса не поможет: её
+                # откатит atomic, а повторит вызывающий код
+                if (attempt >= self.retries or not is_busy(error)
+                        or self.connection.in_transaction):
+                    raise
+            time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    pragmas = DEFAULT_PRAGMAS
+    read_only = False
+    retries = 5
+    backoff = 0.05
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {**DEFAULT_PRAGMAS, **kwargs.pop("PRAGMAS", {})}
+        self.read_only = kwargs.pop("READ_ONLY", False)
+        self.retries = kwargs.pop("RETRIES", self.retries)
+        self.backoff = kwargs.pop("BACKOFF", self.backoff)
+        if self.read_only and not self.is_in_memory_db():
+            path = pathname2url(os.path.abspath(kwargs["database"]))
+            kwargs["database"] = f"file:{path}?mode=ro"
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            # режим журнала хранится в файле, его задаёт пишущее соединение
+            if not (self.read_only and name == "journal_mode"):
+                conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursor)
+        cursor.retries = self.retries
+        cursor.backoff = self.backoff
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN" if self.read_only else "BEGIN IMMEDIATE")
@@ -0,0 +1,97 @@
+"""Чтение лент с реплики и прилипание к основной базе после записи.
+
+``ReplicaMiddleware`` разрешает читать с реплики только представлениям
+из ``settings.REPLICA_VIEWS`` - страницам, которые лишь показывают
+данные. Если запрос что-то записал, ответ ставит cookie, и следующие
+``settings.REPLICA_STICKY_SECONDS`` секунд этот пользователь читает с
+основной базы: свой пост или комментарий он видит сразу, даже если
+реплика ещё отстаёт.
+
+Для локальной проверки реплика - второй файл SQLite, который функция
+``replicate`` (команда ``replicate``) копирует с основного через backup
+API SQLite.
+"""
+import os
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA_ALIAS = "replica"
+STICKY_COOKIE = "primary_until"
+
+_state = threading.local()
+
+
+def reads_from_replica():
+    """Может ли текущий запрос этого потока читать с реплики."""
+    return getattr(_state, "replica", False)
+
+
+def cache_timeout(timeout):
+    """Срок в кэше для того, что построено из данных этого запроса.
+
+    Данные реплики могут быть старше поколения, которым помечена запись
+    кэша, поэтому такая запись живёт не дольше окна прилипания.
+    """
+    if not reads_from_replica():
+        return timeout
+    window = settings.REPLICA_STICKY_SECONDS
+    return window if timeout is None else min(timeout, window)
+
+
+def wrote():
+    """Отмечает, что текущий запрос записал данные; вызывается
+    маршрутизатором."""
+    _state.wrote = True
+
+
+def is_sticky(request):
+    try:
+        until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.replica, _state.wrote = False, False
+        try:
+            response = self.get_response(request)
+            wrote_data = _state.wrote
+        finally:
+            _state.replica, _state.wrote = False, False
+        if wrote_data:
+            window = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(STICKY_COOKIE, int(time.time() + window),
+                                max_age=window, httponly=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _state.replica = (
+            REPLICA_ALIAS in connections.databases
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+            and not is_sticky(request))
+
+
+def replicate(source, target):
+    """Копирует основную базу ``source`` в файл реплики ``target``."""
+    path = pathname2url(os.path.abspath(source))
+    primary = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    replica = sqlite3.connect(target)
+    try:
+        # в WAL читатели реплики не мешают копированию
+        replica.execute("PRAGMA journal_mode = WAL")
+        # копия согласованная: backup читает один снимок основной базы
+        primary.backup(replica)
+    finally:
+        primary.close()
+        replica.close()
@@ -0,0 +1,58 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import replica
+from .replica import REPLICA_ALIAS
+
+READ_ALIAS = "readonly"
+# сессия и пользователь запроса только что могли записаться при входе,
+# отстающая реплика разлогинила бы пользователя
+PRIMARY_APPS = {"auth", "sessions"}
+
+
+def _primary_only():
+    # внутри транзакции чтения должны видеть её незафиксированные записи
+    default = connections[DEFAULT_DB_ALIAS]
+    return default.in_atomic_block or default.is_in_memory_db()
+
+
+class ReadOnlyRouter:
+    """Отправляет чтения в соединение ``readonly``, записи - в основное.
+
+    Внутри транзакции основного соединения чтения остаются в нём, чтобы
+    видеть собственные незафиксированные изменения. Вне транзакции каждая
+    запись в SQLite сразу зафиксирована, и второе соединение с тем же
+    файлом видит её в следующем же запросе. Базу в памяти (как в тестах)
+    другое соединение не откроет только для чтения, поэтому с ней всё
+    идёт в основное соединение.
+    """
+
+    def db_for_read(self, model, **hints):
+        if READ_ALIAS not in connections.databases or _primary_only():
+            return None
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # все псевдонимы - копии одних и тех же данных
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter(ReadOnlyRouter):
+    """Как ``ReadOnlyRouter``, но представления ленты, которым это
+    разрешил ``ReplicaMiddleware``, читают с реплики, если она настроена.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (model._meta.app_label not in PRIMARY_APPS
+                and replica.reads_from_replica() and not _primary_only()):
+            return REPLICA_ALIAS
+        return super().db_for_read(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        replica.wrote()
+        return super().db_for_write(model, **hints)
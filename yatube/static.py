@@ -0,0 +1,115 @@
+"""Статика и миниатюры с долгим кэшированием в браузере.
+
+``StaticStorage`` при ``collectstatic`` сжимает CSS и JS минификаторами из
+``settings.STATIC_MINIFIERS`` (если они установлены), добавляет к именам
+файлов хэш содержимого и кладёт рядом сжатые gzip (и brotli, если
+установлен пакет Brotli) копии. ``{% static %}`` выдаёт имя с хэшем,
+поэтому файл по такому адресу никогда не меняется и ``StaticMiddleware``
+отдаёт его с ``Cache-Control: immutable`` на год вперёд: повторный показ
+страницы не скачивает статику вовсе.
+
+Миниатюры sorl-thumbnail в ``MEDIA_ROOT`` тоже не меняются после нарезки:
+имя файла - хэш исходной картинки и параметров нарезки. Middleware
+отдаёт их так же, как статику, и находит при первом запросе, потому что
+они появляются уже после запуска процесса.
+"""
+import logging
+import os
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.module_loading import import_string
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+logger = logging.getLogger(__name__)
+
+
+def minifiers():
+    """Минификаторы ``{расширение: функция}``, которые удалось
+    импортировать."""
+    found = {}
+    for extension, path in settings.STATIC_MINIFIERS.items():
+        try:
+            found[extension] = import_string(path)
+        except ImportError:
+            logger.warning("Минификатор %s не установлен, файлы %s "
+                           "собираются без сжатия", path, extension)
+    return found
+
+
+class StaticStorage(CompressedManifestStaticFilesStorage):
+    """Хранилище ``collectstatic``: минификация, хэши в именах, gzip."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = self.minify(paths)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    def minify(self, paths):
+        """Сжимает собранные CSS и JS на месте.
+
+        Хэширование читает файлы из исходных хранилищ ``paths``, поэтому
+        сжатые файлы подменяются копиями в этом хранилище - хэш
+        считается от итогового содержимого.
+        """
+        found = minifiers()
+        paths = dict(paths)
+        for name in list(paths):
+            base, extension = os.path.splitext(name)
+            minify = found.get(extension)
+            # готовые сборки .min.css и .min.js уже сжаты
+            if minify is None or base.endswith(".min"):
+                continue
+            path = self.path(name)
+            with open(path, encoding="utf-8") as source:
+                text = source.read()
+            with open(path, "w", encoding="utf-8") as target:
+                target.write(minify(text))
+            paths[name] = (self, name)
+        return paths
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            # файла нет в манифесте: в рабочем окружении это ошибка
+            # сборки статики, а в тестах collectstatic не запускался, и
+            # там отдаётся адрес без хэша
+            if settings.STATIC_MANIFEST_STRICT:
+                raise
+            return FileSystemStorage.url(self, name)
+
+
+class StaticMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise, который отдаёт ещё и миниатюры из ``MEDIA_ROOT``."""
+
+    def __init__(self, get_response=None, settings=settings):
+        # нужны immutable_file_test уже при сканировании STATIC_ROOT
+        prefix = thumbnail_settings.THUMBNAIL_PREFIX
+        self.thumbnail_prefix = urlparse(settings.MEDIA_URL).path + prefix
+        self.thumbnail_root = os.path.join(
+            os.path.realpath(settings.MEDIA_ROOT), prefix, "")
+        super().__init__(get_response, settings)
+
+    def __call__(self, request):
+        url = request.path_info
+        if url.startswith(self.thumbnail_prefix) and url not in self.files:
+            self.add_thumbnail(url)
+        return super().__call__(request)
+
+    def add_thumbnail(self, url):
+        """Запоминает файл миниатюры по адресу ``url``, если он уже нарезан."""
+        path = os.path.realpath(os.path.join(
+            self.thumbnail_root, url[len(self.thumbnail_prefix):]))
+        # ссылки и ".." не выводят за пределы каталога миниатюр
+        if (self.url_is_canonical(url)
+                and path.startswith(self.thumbnail_root)
+                and os.path.isfile(path)):
+            self.files[url] = self.get_static_file(path, url)
+
+    def immutable_file_test(self, path, url):
+        return (url.startswith(self.thumbnail_prefix)
+                or super().immutable_file_test(path, url))
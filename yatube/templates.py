@@ -0,0 +1,18 @@
+"""Компиляция шаблонов при старте процесса.
+
+Без ``DEBUG`` шаблоны загружает ``cached.Loader``: первый запрос к
+шаблону ищет файл по всем каталогам ``DIRS`` и приложений и компилирует
+его, а следующие берут готовый из памяти процесса. ``preload``
+выполняет эту работу для ``settings.TEMPLATE_PRELOAD`` при запуске
+воркера, а не в первом запросе к каждой странице.
+"""
+from django.conf import settings
+from django.template.loader import get_template
+
+
+def preload(names=None):
+    """Загружает шаблоны ``names``; возвращает число загруженных."""
+    names = settings.TEMPLATE_PRELOAD if names is None else names
+    for name in names:
+        get_template(name)
+    return len(names)
@@ -0,0 +1,60 @@
+"""Окружение тестов: кэш во временном каталоге и нестрогий манифест.
+
+Тесты очищают кэш и пишут в него поколения, поэтому они не должны
+трогать ни memcached, ни файловый кэш ``settings.CACHE_DIR`` рабочей
+копии. ``TestRunner`` (``manage.py test``) и фикстура в
+tests/conftest.py (pytest) подменяют оба бэкенда ``FallbackCache``
+файловыми кэшами во временном каталоге, который удаляется после
+прогона. Статика в тестах не собирается, поэтому ``{% static %}``
+отдаёт адреса без хэша вместо ошибки.
+"""
+import copy
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def test_caches(directory):
+    """Настройка CACHES с бэкендами в каталоге ``directory``."""
+    caches = copy.deepcopy(settings.CACHES)
+    options = caches["default"]["OPTIONS"]
+    options["PRIMARY"] = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(directory, "primary"),
+    }
+    options["FALLBACK"] = dict(options["FALLBACK"],
+                               LOCATION=os.path.join(directory, "fallback"))
+    return caches
+
+
+@contextmanager
+def isolated_caches():
+    directory = tempfile.mkdtemp(prefix="yatube-cache-")
+    try:
+        with override_settings(CACHES=test_caches(directory)):
+            yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def test_environment():
+    with isolated_caches(), override_settings(STATIC_MANIFEST_STRICT=False):
+        yield
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._environment = test_environment()
+        self._environment.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._environment.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -4,6 +4,8 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from . import metrics
+
 handler404 = "posts.views.page_not_found"   # noqa
 handler500 = "posts.views.server_error"     # noqa
 
@@ -11,6 +13,7 @@ urlpatterns = [
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path("admin/", admin.site.urls),
+    path("metrics/", metrics.stats_view, name="metrics"),
     path("", include("posts.urls")),
     path("about/", include("about.urls", namespace="about")),
 ]
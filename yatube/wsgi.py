@@ -14,3 +14,14 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+from yatube import templates  # noqa: E402
+
+templates.preload()
+
+if settings.WRITE_BEHIND:
+    from posts import writebehind
+
+    writebehind.start()